@@ -1,3 +1,4 @@
+import logging
 import firebase_admin
 from firebase_admin import credentials, auth
 from fastapi import Depends, HTTPException, status
@@ -7,6 +8,7 @@ from database import get_database
 
 settings = get_settings()
 security = HTTPBearer()
+logger = logging.getLogger(__name__)
 
 firebase_app = None
 
@@ -18,15 +20,17 @@ def initialize_firebase():
             cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
             firebase_app = firebase_admin.initialize_app(cred)
         except Exception as e:
-            print(f"Firebase initialization error: {e}")
-            print("Running without Firebase - use mock auth for development")
+            logger.warning("Firebase initialization error: %s. Running without Firebase - use mock auth for development", e)
 
 
 async def verify_firebase_token(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> dict:
-    token = credentials.credentials
-    
+    return verify_token(credentials.credentials)
+
+
+def verify_token(token: str) -> dict:
+    """Verify a raw Firebase ID token, for callers without an Authorization header (WebSockets)."""
     try:
         decoded_token = auth.verify_id_token(token)
         return decoded_token
@@ -78,3 +82,12 @@ async def get_current_family_member(current_user: dict = Depends(get_current_use
             detail="Access denied. Family member account required."
         )
     return current_user
+
+
+async def verify_admin(token_data: dict = Depends(verify_firebase_token)) -> dict:
+    if token_data.get("uid") not in settings.admin_uids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin account required."
+        )
+    return token_data
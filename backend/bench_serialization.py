@@ -0,0 +1,155 @@
+"""
+Response serialization benchmark.
+
+Compares FastAPI's default path (response_model validation, jsonable_encoder,
+json.dumps) with services.serialization (orjson, no re-validation) on the
+payloads of the listing and recognition endpoints: a page of conversations,
+a family listing and a RecognitionResult with its last conversation. Each
+payload is timed as a bare encode and as a full in-process request.
+
+Usage (from backend/):
+    uv run python bench_serialization.py --requests 2000 --page-size 100
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+import httpx
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+
+from models import Conversation, RecognitionResult
+from services.serialization import dumps, json_response
+
+
+def conversations(count: int) -> List[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "patient_id": str(ObjectId()),
+            "family_member_id": str(ObjectId()),
+            "summary": "Talked about the garden, the tomatoes coming in and the grandchildren's visit next week.",
+            "topics": ["garden", "family", "visit"],
+            "created_at": now - timedelta(hours=i),
+        }
+        for i in range(count)
+    ]
+
+
+def family_members(count: int) -> List[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "firebase_uid": f"uid-{i}",
+            "name": f"Family Member {i}",
+            "email": f"member{i}@example.com",
+            "phone": "+1 555 0100",
+            "relationship": "daughter",
+            "patient_id": str(ObjectId()),
+            "created_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def recognition_result() -> RecognitionResult:
+    conversation = conversations(1)[0]
+    conversation["_id"] = str(conversation["_id"])
+    return RecognitionResult(
+        recognized=True,
+        family_member_id=str(ObjectId()),
+        family_member_name="Family Member",
+        relationship="daughter",
+        confidence=0.91,
+        last_conversation=Conversation(**conversation),
+    )
+
+
+def stringify_ids(docs: List[dict]) -> List[dict]:
+    # What the handlers had to do before, since jsonable_encoder rejects ObjectId
+    return [{**doc, "_id": str(doc["_id"])} for doc in docs]
+
+
+def build_app(page: List[dict], members: List[dict], result: RecognitionResult) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/default/conversations", response_model=List[dict])
+    async def default_conversations():
+        return stringify_ids(page)
+
+    @app.get("/fast/conversations", response_model=List[dict])
+    async def fast_conversations():
+        return json_response(page)
+
+    @app.get("/default/family", response_model=List[dict])
+    async def default_family():
+        return stringify_ids(members)
+
+    @app.get("/fast/family", response_model=List[dict])
+    async def fast_family():
+        return json_response(members)
+
+    @app.get("/default/recognition", response_model=RecognitionResult)
+    async def default_recognition():
+        return result
+
+    @app.get("/fast/recognition", response_model=RecognitionResult)
+    async def fast_recognition():
+        return json_response(result)
+
+    return app
+
+
+def time_encode(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+async def time_requests(client: httpx.AsyncClient, path: str, repeat: int) -> float:
+    await client.get(path)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        response = await client.get(path)
+        response.raise_for_status()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+async def run(args):
+    page = conversations(args.page_size)
+    members = family_members(args.page_size)
+    result = recognition_result()
+    payloads = {"conversations": page, "family": members, "recognition": result}
+
+    print(f"{'payload':<14} {'encode default':>15} {'encode orjson':>14} {'request default':>16} {'request orjson':>15}")
+    app = build_app(page, members, result)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name, payload in payloads.items():
+            if isinstance(payload, RecognitionResult):
+                default = lambda: json.dumps(jsonable_encoder(payload)).encode()  # noqa: E731
+            else:
+                default = lambda: json.dumps(jsonable_encoder(stringify_ids(payload))).encode()  # noqa: E731
+            encode_default = time_encode(default, args.requests)
+            encode_fast = time_encode(lambda: dumps(payload), args.requests)
+            request_default = await time_requests(client, f"/default/{name}", args.requests)
+            request_fast = await time_requests(client, f"/fast/{name}", args.requests)
+            print(f"{name:<14} {encode_default:>13.1f}us {encode_fast:>12.1f}us "
+                  f"{request_default:>14.1f}us {request_fast:>13.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare default and orjson response serialization")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=100)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
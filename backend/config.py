@@ -12,6 +12,16 @@ class Settings(BaseSettings):
     
     # Google Gemini
     GEMINI_API_KEY: str = ""
+    # Latency budget per call; the greeting falls back to a template past it
+    GEMINI_GREETING_DEADLINE_SECONDS: float = 2.5
+    GEMINI_SUMMARY_DEADLINE_SECONDS: float = 15.0
+    GEMINI_HEDGE_AFTER_SECONDS: float = 0  # send a second request if the first is this slow; 0 disables
+    GEMINI_BREAKER_FAILURES: int = 5  # consecutive failures/timeouts before calls skip Gemini
+    GEMINI_BREAKER_RESET_SECONDS: float = 30.0
+    # Local fake model for tests and load runs: random latency around the mean, injected errors
+    GEMINI_FAKE: bool = False
+    GEMINI_FAKE_LATENCY_SECONDS: float = 0.5
+    GEMINI_FAKE_ERROR_RATE: float = 0.0
     
     # Mapbox
     MAPBOX_ACCESS_TOKEN: str = ""
@@ -19,6 +29,133 @@ class Settings(BaseSettings):
     # App Settings
     FACE_RECOGNITION_THRESHOLD: float = 0.75
     VOICE_RECOGNITION_THRESHOLD: float = 0.75
+    # Load ML models during startup instead of on the first recognition request
+    WARM_MODELS_ON_STARTUP: bool = False
+    
+    # Face embedding backend: "deepface" (TensorFlow) or "onnx" (ONNX Runtime)
+    FACE_EMBEDDING_BACKEND: str = "deepface"
+    FACE_ONNX_MODEL_PATH: str = "models/facenet512.onnx"
+    FACE_ONNX_INTRA_OP_THREADS: int = 0  # 0 lets ONNX Runtime decide
+    
+    # Image ingest: small decode to locate the face, then a face crop for the embedder
+    FACE_INGEST_DETECT_MAX_DIMENSION: int = 640
+    FACE_INGEST_LOCATE_DIMENSION: int = 320
+    FACE_INGEST_EMBED_MAX_DIMENSION: int = 1280  # whole-image fallback and client crops
+    FACE_INGEST_MIN_FACE_PIXELS: int = 320  # face width kept in the crop
+    FACE_INGEST_CROP_MARGIN: float = 0.5  # of the face size, on each side
+    
+    # Voice activity detection: embed only the speech, capped in length
+    VOICE_VAD_ENABLED: bool = True
+    VOICE_MAX_SPEECH_SECONDS: float = 8.0
+    VOICE_DECODE_MARGIN_SECONDS: float = 4.0  # silence and pauses decoded past the speech cap
+    VOICE_VAD_MIN_SPEECH_MS: float = 100.0
+    VOICE_VAD_MAX_GAP_MS: float = 300.0  # pauses shorter than this stay in the segment
+    VOICE_VAD_PADDING_MS: float = 50.0
+    
+    # Model upgrades: keep enrollment media in GridFS so embeddings can be rebuilt
+    RETAIN_SOURCE_MEDIA: bool = False
+    REEMBED_BATCH_SIZE: int = 32
+    REEMBED_MAX_PER_SECOND: float = 20.0  # 0 for no limit
+    
+    # Background jobs (services/jobs.py); every API process runs jobs unless disabled
+    JOB_RUNNER_ENABLED: bool = True
+    JOB_CONCURRENCY: int = 4  # jobs run at once per process
+    JOB_POLL_SECONDS: float = 2.0
+    JOB_LEASE_SECONDS: float = 60.0  # a job is re-queued when its runner stops renewing for this long
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_SECONDS: float = 5.0
+    JOB_RETRY_MAX_SECONDS: float = 300.0
+    JOB_RETENTION_DAYS: int = 7  # finished jobs are deleted after this
+    
+    # Firebase UIDs allowed to call /admin endpoints, comma-separated
+    ADMIN_FIREBASE_UIDS: str = ""
+    
+    # Bulk enrollment (/recognition/face/register/bulk, /recognition/voice/register/bulk)
+    BULK_ENROLL_MAX_FILES: int = 30
+    
+    # Upload size limits, enforced while the body streams in
+    UPLOAD_MAX_IMAGE_BYTES: int = 10 * 1024 * 1024  # per image file
+    UPLOAD_MAX_AUDIO_BYTES: int = 20 * 1024 * 1024  # per audio file
+    UPLOAD_MAX_REQUEST_BYTES: int = 32 * 1024 * 1024  # whole request body
+    UPLOAD_MAX_BULK_BYTES: int = 256 * 1024 * 1024  # whole request body of the bulk register routes
+    
+    # Fused face + voice recognition (/recognition/multimodal)
+    MULTIMODAL_FACE_WEIGHT: float = 0.6
+    MULTIMODAL_VOICE_WEIGHT: float = 0.4
+    MULTIMODAL_THRESHOLD: float = 0.75  # fused score for a match; each modality's own threshold maps onto it
+    
+    # Streaming voice recognition (/recognition/voice/stream)
+    VOICE_STREAM_CONFIDENT_THRESHOLD: float = 0.9  # answer early at or above this
+    VOICE_STREAM_MIN_SPEECH_SECONDS: float = 1.0  # speech heard before answering early
+    VOICE_STREAM_IDLE_TIMEOUT_SECONDS: float = 10.0
+    
+    # Quality gate run before the models
+    QUALITY_GATE_ENABLED: bool = True
+    QUALITY_MIN_SHARPNESS: float = 15.0  # Laplacian variance
+    QUALITY_MIN_BRIGHTNESS: float = 40.0
+    QUALITY_MAX_BRIGHTNESS: float = 220.0
+    QUALITY_MAX_CLIPPED_SHADOWS: float = 0.5  # share of face (or image) pixels crushed to black
+    QUALITY_MAX_CLIPPED_HIGHLIGHTS: float = 0.3  # share blown to white
+    QUALITY_MIN_FACE_SIZE: int = 50  # pixels at full resolution
+    QUALITY_MIN_AUDIO_DBFS: float = -50.0
+    QUALITY_MIN_VOICED_RATIO: float = 0.1
+    
+    # Inference worker (empty socket path runs models inside the API process)
+    INFERENCE_SOCKET_PATH: str = ""
+    INFERENCE_SPAWN: bool = False
+    INFERENCE_PROCESSES: int = 1
+    INFERENCE_TIMEOUT_SECONDS: float = 60.0
+    
+    # Admission control: token buckets per caller and route class, inference concurrency cap
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (per worker) or "mongo" (shared by all workers)
+    RATE_LIMIT_DEFAULT_PER_MINUTE: float = 600
+    RATE_LIMIT_DEFAULT_BURST: int = 60
+    RATE_LIMIT_INFERENCE_PER_MINUTE: float = 30
+    RATE_LIMIT_INFERENCE_BURST: int = 10
+    RATE_LIMIT_LLM_PER_MINUTE: float = 10
+    RATE_LIMIT_LLM_BURST: int = 5
+    INFERENCE_MAX_CONCURRENT: int = 4  # recognition requests processed at once per worker
+    INFERENCE_QUEUE_TIMEOUT_SECONDS: float = 0.5  # wait for a slot before answering 429
+    
+    # Keyset-paginated listings (conversations, family members)
+    LISTING_MAX_LIMIT: int = 100  # per JSON page
+    LISTING_STREAM_MAX_LIMIT: int = 5000  # per NDJSON stream
+    
+    # Patient locations
+    HOME_RADIUS_METERS: float = 200.0  # a fix farther than this from home is "outside home"
+    LOCATIONS_BULK_MAX: int = 500  # latest fixes returned by /patients/locations
+    
+    # Conditional GET and compression
+    CONDITIONAL_VERSION_TTL_SECONDS: float = 2.0  # how long a worker trusts its cached resource versions
+    RESOURCE_VERSION_CACHE_MAX_ENTRIES: int = 50_000
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    
+    # Conversation search index snapshots, one file per patient
+    SEARCH_INDEX_DIR: str = "search_index"
+    SEARCH_INDEX_MAX_BYTES: int = 64 * 1024 * 1024  # in memory, least recently searched dropped first
+    SEARCH_INDEX_SAVE_DELAY_SECONDS: float = 5.0  # changes within this window share one snapshot write
+    
+    # Logging and tracing
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True  # false for plain text lines
+    LOG_QUEUE_SIZE: int = 10000  # lines beyond this are dropped rather than blocking requests
+    TRACE_SAMPLE_RATE: float = 0.05  # share of requests traced, with their DEBUG lines kept
+    TRACING_OTLP_ENDPOINT: str = ""  # e.g. http://localhost:4318; spans go to the log when empty
+    SERVICE_NAME: str = "alzheimers-care-api"
+    
+    # Slow-query capture (see /admin/slow-queries)
+    QUERY_PROFILER_ENABLED: bool = True
+    SLOW_QUERY_MS: float = 100.0
+    QUERY_PROFILER_EXPLAIN_ALL: bool = False  # keep every query shape, to flag collection scans
+    QUERY_PROFILER_MAX_ENTRIES: int = 200
+    
+    # Memory accounting (see /admin/memory)
+    MEMORY_RSS_SOFT_LIMIT_BYTES: int = 0  # over this RSS, caches drop half their entries; 0 to disable
+    MEMORY_CHECK_SECONDS: float = 15.0
+    MEMORY_TRACEMALLOC_FRAMES: int = 1  # stack depth recorded per allocation when tracing
     
     # JWT Settings
     SECRET_KEY: str = "your-secret-key-change-in-production"
@@ -28,6 +165,10 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
         extra = "ignore"
+    
+    @property
+    def admin_uids(self) -> set:
+        return {uid.strip() for uid in self.ADMIN_FIREBASE_UIDS.split(",") if uid.strip()}
 
 
 @lru_cache()
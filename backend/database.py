@@ -1,13 +1,102 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
 from config import get_settings
+from services.query_profiler import query_profiler
+from services.telemetry import mongo_span_listener
+import logging
 import ssl
 import certifi
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 client: AsyncIOMotorClient = None
 db = None
 
+INDEX_OPTIONS_CONFLICT = 85
+
+# One entry per query shape the API runs; keep in step with the routers.
+INDEXES = {
+    "patients": [
+        # auth lookups, /patients/me, location updates
+        IndexModel([("firebase_uid", ASCENDING)], unique=True),
+    ],
+    "family_members": [
+        IndexModel([("firebase_uid", ASCENDING)], unique=True),
+        # family listing by patient
+        IndexModel([("patient_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "face_embeddings": [
+        # recognition gallery: patient_id + model_version $in, projected to family_member_id/embedding
+        IndexModel([("patient_id", ASCENDING), ("model_version", ASCENDING)]),
+        IndexModel([("source_media_id", ASCENDING)], sparse=True),
+    ],
+    "voice_embeddings": [
+        IndexModel([("patient_id", ASCENDING), ("model_version", ASCENDING)]),
+        IndexModel([("source_media_id", ASCENDING)], sparse=True),
+    ],
+    "conversations": [
+        # last conversation with a recognized member (recognition results)
+        IndexModel([("patient_id", ASCENDING), ("family_member_id", ASCENDING), ("created_at", DESCENDING)]),
+        # patient history, newest first
+        IndexModel([("patient_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # family member history and the greeting's last conversation
+        IndexModel([("family_member_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "locations": [
+        IndexModel([("patient_id", ASCENDING)]),
+        # /patients/locations?near_latitude=..: fixes within a radius
+        IndexModel([("location", GEOSPHERE)]),
+        # /patients/locations?outside_home=true across all patients (admins)
+        IndexModel([("outside_home", ASCENDING), ("patient_id", ASCENDING)], partialFilterExpression={"outside_home": True}),
+    ],
+    "rate_limits": [
+        # only written with RATE_LIMIT_BACKEND=mongo; idle buckets are full again and expire
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "jobs": [
+        # claim: next queued job by priority among the types with free slots
+        IndexModel([("status", ASCENDING), ("priority", DESCENDING), ("run_at", ASCENDING)]),
+        # expired leases
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)]),
+        # at most one queued or running job per dedupe key
+        IndexModel([("active_key", ASCENDING)], unique=True, sparse=True),
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=settings.JOB_RETENTION_DAYS * 86400),
+    ],
+}
+
+
+async def _ensure_index(collection, model: IndexModel) -> str:
+    """Create one index; a changed TTL (e.g. JOB_RETENTION_DAYS) is applied to the existing index with collMod."""
+    try:
+        return (await collection.create_indexes([model]))[0]
+    except OperationFailure as e:
+        ttl = model.document.get("expireAfterSeconds")
+        if e.code != INDEX_OPTIONS_CONFLICT or ttl is None:
+            raise
+    await collection.database.command(
+        "collMod", collection.name, index={"keyPattern": model.document["key"], "expireAfterSeconds": ttl}
+    )
+    logger.info("Set expireAfterSeconds=%s on %s.%s", ttl, collection.name, model.document["name"])
+    # Any other option that differs still conflicts here and is reported by the caller
+    return (await collection.create_indexes([model]))[0]
+
+
+async def ensure_indexes(database):
+    """Create every index in INDEXES and report existing ones the spec no longer lists."""
+    for collection, models in INDEXES.items():
+        try:
+            created = set()
+            for model in models:
+                created.add(await _ensure_index(database[collection], model))
+            existing = await database[collection].index_information()
+            unlisted = [name for name in existing if name != "_id_" and name not in created]
+            if unlisted:
+                logger.info("Indexes on %s not in the spec (drop when unused): %s", collection, ", ".join(unlisted))
+        except Exception:
+            logger.exception("Could not ensure indexes on %s", collection)
+
 
 async def connect_to_mongo():
     global client, db
@@ -17,30 +106,28 @@ async def connect_to_mongo():
             settings.MONGODB_URL,
             tls=True,
             tlsAllowInvalidCertificates=True,
-            serverSelectionTimeoutMS=10000
+            serverSelectionTimeoutMS=10000,
+            event_listeners=[mongo_span_listener] + ([query_profiler] if settings.QUERY_PROFILER_ENABLED else [])
         )
         db = client[settings.DATABASE_NAME]
         await client.admin.command('ping')
-        await db.patients.create_index("firebase_uid", unique=True)
-        await db.family_members.create_index("firebase_uid", unique=True)
-        await db.family_members.create_index("patient_id")
-        await db.face_embeddings.create_index("family_member_id")
-        await db.voice_embeddings.create_index("family_member_id")
-        await db.conversations.create_index([("patient_id", 1), ("family_member_id", 1)])
-        await db.locations.create_index("patient_id")
-        
-        print("Connected to MongoDB")
+        logger.info("Connected to MongoDB")
     except Exception as e:
-        print(f"WARNING: Could not connect to MongoDB: {e}")
-        print("Server will start but database operations will fail.")
-        print("Please whitelist your IP in MongoDB Atlas Network Access.")
+        logger.warning(
+            "Could not connect to MongoDB: %s. Server will start but database operations will fail. "
+            "Please whitelist your IP in MongoDB Atlas Network Access.", e
+        )
+        return
+    
+    # Index errors are reported per collection, not as a connection failure
+    await ensure_indexes(db)
 
 
 async def close_mongo_connection():
     global client
     if client:
         client.close()
-        print("Closed MongoDB connection")
+        logger.info("Closed MongoDB connection")
 
 
 def get_database():
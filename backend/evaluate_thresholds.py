@@ -0,0 +1,265 @@
+"""
+Offline threshold calibration for face and voice recognition.
+
+Runs the recognition services over a labeled dataset - one directory per
+person, holding that person's photos or voice clips - and reports:
+
+- extraction latency per sample (what one recognition request spends in
+  the model) and the samples the quality gate rejected
+- the genuine (same person) and impostor (different people) similarity
+  distributions over every pair of samples, scored block by block as matrix
+  products and accumulated into histograms, so memory stays flat in the
+  number of pairs
+- the ROC: false accept and false reject rates at every threshold, the
+  equal error rate and AUC
+- rank-1 identification as /recognition/*/recognize does it (best match
+  among everyone else's samples), and how often the answer would be right,
+  wrong or rejected at the recommended threshold
+- the recommended threshold: the lowest one whose false accept rate is at
+  most --target-far, next to the EER threshold and the configured one
+
+Thresholds depend on the embedding model, so calibrate each backend
+separately (e.g. FACE_EMBEDDING_BACKEND=onnx) and set the result in that
+deployment's environment.
+
+Usage (from backend/):
+    uv run python evaluate_thresholds.py face ~/datasets/family-faces --target-far 0.01
+    uv run python evaluate_thresholds.py voice ~/datasets/family-voices --json voice-report.json
+
+    ~/datasets/family-faces/
+        anna/  1.jpg 2.jpg ...
+        ben/   1.jpg ...
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from config import get_settings
+from services import model_versions
+from services.quality_gate import QualityRejected
+from services.similarity import normalize_rows
+
+settings = get_settings()
+
+EXTENSIONS = {
+    "face": {".jpg", ".jpeg", ".png", ".webp"},
+    "voice": {".wav", ".m4a", ".mp3", ".aac", ".ogg", ".flac"},
+}
+
+
+def load_dataset(root: Path, kind: str, max_per_person: int) -> List[Tuple[str, Path]]:
+    """(person, file) for every sample, people being the subdirectories of root."""
+    samples = []
+    for person_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        files = sorted(f for f in person_dir.iterdir() if f.suffix.lower() in EXTENSIONS[kind])
+        samples.extend((person_dir.name, f) for f in files[:max_per_person or None])
+    return samples
+
+
+def _service(kind: str):
+    if kind == "face":
+        from services.face_recognition import face_recognition_service
+        return face_recognition_service
+    from services.voice_recognition import voice_recognition_service
+    return voice_recognition_service
+
+
+def embed_samples(kind: str, samples: List[Tuple[str, Path]], cropped: bool):
+    """Embeddings and labels of the accepted samples, per-sample latencies and rejection counts."""
+    service = _service(kind)
+    started = time.perf_counter()
+    service.warm_up()
+    warm_up_seconds = time.perf_counter() - started
+
+    embeddings, labels, latencies = [], [], []
+    rejected: Counter = Counter()
+    for i, (person, path) in enumerate(samples, 1):
+        data = path.read_bytes()
+        started = time.perf_counter()
+        try:
+            if kind == "face":
+                embedding = service.extract_embedding(data, cropped)
+            else:
+                embedding = service.extract_embedding(data)
+        except QualityRejected as e:
+            embedding = None
+            rejected[e.reason] += 1
+        else:
+            if embedding is None:
+                rejected["no_embedding"] += 1
+        latencies.append(time.perf_counter() - started)
+        if embedding is not None:
+            embeddings.append(embedding)
+            labels.append(person)
+        if i % 100 == 0:
+            print(f"  embedded {i}/{len(samples)}", file=sys.stderr)
+
+    matrix = normalize_rows(np.array(embeddings, dtype=np.float32)) if embeddings else np.zeros((0, 0), np.float32)
+    return matrix, np.array(labels), np.array(latencies), rejected, warm_up_seconds
+
+
+def score_pairs(embeddings: np.ndarray, labels: np.ndarray, edges: np.ndarray, block_size: int):
+    """
+    Histograms of genuine and impostor pair similarities over `edges`, and for
+    every sample its best match among all other samples (index, similarity).
+    """
+    n = len(labels)
+    bins = len(edges) - 1
+    genuine = np.zeros(bins, dtype=np.int64)
+    impostor = np.zeros(bins, dtype=np.int64)
+    best_index = np.zeros(n, dtype=np.int64)
+    best_score = np.zeros(n, dtype=np.float32)
+    columns = np.arange(n)
+
+    for start in range(0, n, block_size):
+        stop = min(n, start + block_size)
+        rows = np.arange(start, stop)
+        scores = embeddings[start:stop] @ embeddings.T
+
+        scores[rows - start, rows] = -np.inf  # a sample is not its own match
+        best_index[start:stop] = np.argmax(scores, axis=1)
+        best_score[start:stop] = scores[rows - start, best_index[start:stop]]
+
+        upper = columns[None, :] > rows[:, None]  # each pair once
+        same = labels[start:stop, None] == labels[None, :]
+        np.clip(scores, -1.0, 1.0, out=scores)
+        genuine += np.histogram(scores[upper & same], edges)[0]
+        impostor += np.histogram(scores[upper & ~same], edges)[0]
+
+    return genuine, impostor, best_index, best_score
+
+
+def roc(genuine: np.ndarray, impostor: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    False accept and false reject rates when accepting similarities at or
+    above each histogram edge (index k -> edges[k]).
+    """
+    far = np.concatenate([np.cumsum(impostor[::-1])[::-1], [0]]) / max(1, impostor.sum())
+    frr = np.concatenate([[0], np.cumsum(genuine)]) / max(1, genuine.sum())
+    return far, frr
+
+
+def identification(labels: np.ndarray, best_index: np.ndarray, best_score: np.ndarray, threshold: float) -> dict:
+    """Rank-1 outcomes for samples whose person has other samples to be matched against."""
+    _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    enrolled = counts[inverse] > 1
+    if not enrolled.any():
+        return {}
+    correct = (labels[best_index] == labels)[enrolled]
+    accepted = (best_score >= threshold)[enrolled]
+    return {
+        "samples": int(enrolled.sum()),
+        "rank1_accuracy": float(correct.mean()),
+        "at_threshold": {
+            "correct": float((accepted & correct).mean()),
+            "wrong_person": float((accepted & ~correct).mean()),
+            "rejected": float((~accepted).mean()),
+        },
+    }
+
+
+def evaluate(args) -> dict:
+    samples = load_dataset(Path(args.dataset), args.kind, args.max_per_person)
+    people = len({person for person, _ in samples})
+    if people < 2:
+        raise SystemExit(f"Need samples of at least two people under {args.dataset}, found {people}")
+    print(f"Embedding {len(samples)} {args.kind} samples of {people} people...", file=sys.stderr)
+
+    embeddings, labels, latencies, rejected, warm_up_seconds = embed_samples(args.kind, samples, args.cropped)
+    edges = np.linspace(-1.0, 1.0, int(round(2 / args.resolution)) + 1)
+    genuine, impostor, best_index, best_score = score_pairs(embeddings, labels, edges, args.block_size)
+    if not genuine.sum() or not impostor.sum():
+        raise SystemExit("Not enough accepted samples to form both genuine and impostor pairs")
+    far, frr = roc(genuine, impostor)
+
+    eer_index = int(np.argmin(np.abs(far - frr)))
+    # far only falls as the threshold rises: the first edge at or under the target is the lowest threshold
+    target_index = int(np.argmax(far <= args.target_far))
+    configured = settings.FACE_RECOGNITION_THRESHOLD if args.kind == "face" else settings.VOICE_RECOGNITION_THRESHOLD
+    configured_index = int(np.clip(np.searchsorted(edges, configured), 0, len(edges) - 1))
+    recommended = float(edges[target_index])
+
+    def operating_point(index: int) -> dict:
+        return {"threshold": round(float(edges[index]), 4), "far": float(far[index]), "frr": float(frr[index])}
+
+    return {
+        "kind": args.kind,
+        "backend": settings.FACE_EMBEDDING_BACKEND if args.kind == "face" else "mfcc",
+        "model_version": model_versions.CURRENT[args.kind],
+        "dataset": {
+            "people": people,
+            "samples": len(samples),
+            "accepted": int(len(labels)),
+            "rejected": dict(rejected),
+            "genuine_pairs": int(genuine.sum()),
+            "impostor_pairs": int(impostor.sum()),
+        },
+        "latency_ms": {
+            "warm_up": round(warm_up_seconds * 1000, 1),
+            "mean": round(float(latencies.mean()) * 1000, 1),
+            "p50": round(float(np.percentile(latencies, 50)) * 1000, 1),
+            "p95": round(float(np.percentile(latencies, 95)) * 1000, 1),
+            "p99": round(float(np.percentile(latencies, 99)) * 1000, 1),
+            "max": round(float(latencies.max()) * 1000, 1),
+        },
+        # far falls along the edges, so the integral of tpr over far comes out negated
+        "auc": float(-np.trapz(1 - frr, far)),
+        "eer": {**operating_point(eer_index), "rate": float((far[eer_index] + frr[eer_index]) / 2)},
+        "configured": operating_point(configured_index),
+        "recommended": {**operating_point(target_index), "target_far": args.target_far},
+        "identification": identification(labels, best_index, best_score, recommended),
+    }
+
+
+def print_report(report: dict):
+    data, latency = report["dataset"], report["latency_ms"]
+    env = "FACE_RECOGNITION_THRESHOLD" if report["kind"] == "face" else "VOICE_RECOGNITION_THRESHOLD"
+    print(f"\n{report['kind']} recognition, backend {report['backend']} ({report['model_version']})")
+    print(f"  samples     {data['accepted']}/{data['samples']} accepted from {data['people']} people"
+          + (f", rejected: {data['rejected']}" if data["rejected"] else ""))
+    print(f"  pairs       {data['genuine_pairs']} genuine, {data['impostor_pairs']} impostor")
+    print(f"  latency ms  mean {latency['mean']}  p50 {latency['p50']}  p95 {latency['p95']}  "
+          f"p99 {latency['p99']}  max {latency['max']}  (warm-up {latency['warm_up']})")
+    print(f"  AUC         {report['auc']:.4f}")
+    print(f"  {'':<12}{'threshold':>10}{'FAR':>10}{'FRR':>10}")
+    for name in ("eer", "configured", "recommended"):
+        point = report[name]
+        print(f"  {name:<12}{point['threshold']:>10.3f}{point['far']:>10.4f}{point['frr']:>10.4f}")
+    if report["identification"]:
+        ident = report["identification"]
+        outcome = ident["at_threshold"]
+        print(f"  rank-1      {ident['rank1_accuracy']:.4f} over {ident['samples']} samples; at the recommended "
+              f"threshold {outcome['correct']:.4f} correct, {outcome['wrong_person']:.4f} wrong person, "
+              f"{outcome['rejected']:.4f} rejected")
+    print(f"\n  {env}={report['recommended']['threshold']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate recognition thresholds on a labeled dataset")
+    parser.add_argument("kind", choices=("face", "voice"))
+    parser.add_argument("dataset", help="directory with one subdirectory of samples per person")
+    parser.add_argument("--target-far", type=float, default=0.01,
+                        help="false accept rate the recommended threshold must not exceed")
+    parser.add_argument("--cropped", action="store_true", help="face photos are already cropped to the face")
+    parser.add_argument("--max-per-person", type=int, default=0, help="samples per person; 0 for all")
+    parser.add_argument("--resolution", type=float, default=0.001, help="threshold step")
+    parser.add_argument("--block-size", type=int, default=1024, help="rows scored per matrix product")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    report = evaluate(args)
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+from typing import Dict, Optional
+from services.memory import track_memory
+
+# Modules that must never be imported eagerly by the API process. They are
+# pulled in on first use by the services that need them.
+HEAVY_MODULES = [
+    "tensorflow",
+    "deepface",
+    "cv2",
+    "scipy",
+    "librosa",
+    "onnxruntime",
+    "google.generativeai",
+]
+
+_import_costs: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def lazy_import(module_name: str):
+    """Import a module on first use and record how long the import took."""
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+
+    with _lock:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+        started = time.perf_counter()
+        with track_memory(f"import {module_name}"):
+            module = importlib.import_module(module_name)
+        _import_costs[module_name] = time.perf_counter() - started
+        logging.getLogger(__name__).info("Lazy import of %s took %.2fs", module_name, _import_costs[module_name])
+        return module
+
+
+def import_costs() -> Dict[str, float]:
+    return dict(_import_costs)
+
+
+def startup_report(app_import_seconds: Optional[float] = None) -> dict:
+    """Summarize what this worker has paid for imports so far."""
+    return {
+        "app_import_seconds": round(app_import_seconds, 4) if app_import_seconds is not None else None,
+        "lazy_imports": {name: round(seconds, 4) for name, seconds in _import_costs.items()},
+        "heavy_modules_loaded": {name: name in sys.modules for name in HEAVY_MODULES},
+        "modules_loaded": len(sys.modules),
+    }
+
+
+def format_startup_report(report: dict) -> str:
+    lines = []
+    if report["app_import_seconds"] is not None:
+        lines.append(f"App import time: {report['app_import_seconds']:.2f}s ({report['modules_loaded']} modules)")
+    loaded = [name for name, is_loaded in report["heavy_modules_loaded"].items() if is_loaded]
+    lines.append(f"Heavy modules loaded: {', '.join(loaded) if loaded else 'none'}")
+    for name, seconds in report["lazy_imports"].items():
+        lines.append(f"  {name}: {seconds:.2f}s")
+    return "\n".join(lines)
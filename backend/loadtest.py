@@ -0,0 +1,490 @@
+"""
+Load generator for the Alzheimer's Care API.
+
+Seeds a dedicated local MongoDB database with synthetic patients, family
+members, embeddings and conversations, then drives a realistic traffic mix
+against the FastAPI app with Firebase auth replaced by a fake verifier
+(the bearer token *is* the firebase uid).
+
+Usage (from backend/):
+    uv run python loadtest.py seed --patients 2000 --drop
+    uv run python loadtest.py run --users 200 --duration 60
+    uv run python loadtest.py serve --port 8001      # app with fake auth
+    uv run python loadtest.py run --base-url http://127.0.0.1:8001
+
+Without --base-url the app is driven in-process through httpx's ASGI
+transport, which measures the app itself rather than the network stack.
+"""
+import argparse
+import asyncio
+import io
+import math
+import random
+import time
+import wave
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+from bson import ObjectId
+from fastapi import Depends
+from fastapi.security import HTTPAuthorizationCredentials
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import database
+from auth import security, verify_firebase_token
+from services.query_profiler import query_profiler
+
+DEFAULT_MONGODB_URL = "mongodb://localhost:27017"
+DEFAULT_DATABASE = "alzheimer_care_loadtest"
+
+FACE_EMBEDDING_DIM = 512
+VOICE_EMBEDDING_DIM = 240
+
+PATIENT_UID = "lt-patient-{}"
+FAMILY_UID = "lt-family-{}-{}"
+
+RELATIONSHIPS = ["daughter", "son", "spouse", "grandchild", "sibling", "friend", "caregiver"]
+TOPICS = ["garden", "grandchildren", "doctor visit", "lunch", "weather", "old photos", "music", "walk"]
+
+
+# ---------------------------------------------------------------------------
+# Fake auth / database wiring
+# ---------------------------------------------------------------------------
+
+async def fake_verify_firebase_token(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> dict:
+    """Treat the bearer token as the firebase uid, skipping Firebase entirely."""
+    return {"uid": credentials.credentials}
+
+
+def build_app(mongodb_url: str, database_name: str):
+    """Import the real app and rewire auth and the database for load testing."""
+    from main import app
+
+    app.dependency_overrides[verify_firebase_token] = fake_verify_firebase_token
+
+    @asynccontextmanager
+    async def lifespan(_app):
+        client = AsyncIOMotorClient(mongodb_url, event_listeners=[query_profiler])
+        database.client = client
+        database.db = client[database_name]
+        yield
+        client.close()
+
+    app.router.lifespan_context = lifespan
+    return app
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def random_embedding(dim: int) -> List[float]:
+    vector = np.random.standard_normal(dim)
+    vector /= np.linalg.norm(vector)
+    return vector.astype(float).tolist()
+
+
+def synthetic_wav(seconds: float = 2.0, sample_rate: int = 16000) -> bytes:
+    """A voiced-sounding tone with harmonics and noise, encoded as 16-bit PCM WAV."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    f0 = random.uniform(100, 220)
+    signal = sum(np.sin(2 * math.pi * f0 * k * t) / k for k in range(1, 6))
+    signal = signal * (0.5 + 0.5 * np.sin(2 * math.pi * 3 * t)) + 0.05 * np.random.standard_normal(len(t))
+    pcm = np.clip(signal / np.max(np.abs(signal)) * 0.8 * 32767, -32768, 32767).astype(np.int16)
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def synthetic_jpeg(width: int = 1280, height: int = 960) -> bytes:
+    """A face-like drawing; good enough to exercise decode and detection cost."""
+    import cv2
+
+    image = np.full((height, width, 3), 180, dtype=np.uint8)
+    image += np.random.randint(0, 30, image.shape, dtype=np.uint8)
+    cx, cy, r = width // 2, height // 2, min(width, height) // 4
+    cv2.ellipse(image, (cx, cy), (r, int(r * 1.3)), 0, 0, 360, (150, 170, 210), -1)
+    cv2.circle(image, (cx - r // 3, cy - r // 4), r // 10, (40, 40, 40), -1)
+    cv2.circle(image, (cx + r // 3, cy - r // 4), r // 10, (40, 40, 40), -1)
+    cv2.ellipse(image, (cx, cy + r // 2), (r // 3, r // 8), 0, 0, 180, (60, 60, 120), 4)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise RuntimeError("Could not encode synthetic JPEG")
+    return encoded.tobytes()
+
+
+async def seed(
+    mongodb_url: str,
+    database_name: str,
+    patients: int,
+    family_per_patient: int,
+    faces_per_member: int,
+    voices_per_member: int,
+    conversations_per_member: int,
+    drop: bool,
+    batch_size: int = 1000,
+):
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client[database_name]
+
+    if drop:
+        await client.drop_database(database_name)
+        print(f"Dropped database {database_name}")
+
+    # Same indexes the app creates in connect_to_mongo
+    await database.ensure_indexes(db)
+
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    pending: Dict[str, List[dict]] = defaultdict(list)
+
+    async def flush(force: bool = False):
+        for collection, docs in pending.items():
+            if docs and (force or len(docs) >= batch_size):
+                await db[collection].insert_many(docs, ordered=False)
+                docs.clear()
+
+    for p in range(patients):
+        patient_id = ObjectId()
+        home_lat = random.uniform(43.5, 43.9)
+        home_lng = random.uniform(-79.6, -79.2)
+        pending["patients"].append({
+            "_id": patient_id,
+            "firebase_uid": PATIENT_UID.format(p),
+            "name": f"Patient {p}",
+            "email": f"patient{p}@loadtest.local",
+            "phone": None,
+            "home_address": f"{p} Synthetic Street",
+            "home_latitude": home_lat,
+            "home_longitude": home_lng,
+            "created_at": now,
+        })
+        pending["locations"].append({
+            "patient_id": str(patient_id),
+            "latitude": home_lat + random.uniform(-0.01, 0.01),
+            "longitude": home_lng + random.uniform(-0.01, 0.01),
+            "timestamp": now,
+        })
+
+        for f in range(family_per_patient):
+            member_id = ObjectId()
+            pending["family_members"].append({
+                "_id": member_id,
+                "firebase_uid": FAMILY_UID.format(p, f),
+                "name": f"Family {p}-{f}",
+                "email": f"family{p}-{f}@loadtest.local",
+                "phone": None,
+                "relationship": random.choice(RELATIONSHIPS),
+                "patient_id": str(patient_id),
+                "created_at": now,
+            })
+            for _ in range(faces_per_member):
+                pending["face_embeddings"].append({
+                    "family_member_id": str(member_id),
+                    "patient_id": str(patient_id),
+                    "embedding": random_embedding(FACE_EMBEDDING_DIM),
+                    "created_at": now,
+                })
+            for _ in range(voices_per_member):
+                pending["voice_embeddings"].append({
+                    "family_member_id": str(member_id),
+                    "patient_id": str(patient_id),
+                    "embedding": random_embedding(VOICE_EMBEDDING_DIM),
+                    "created_at": now,
+                })
+            for c in range(conversations_per_member):
+                pending["conversations"].append({
+                    "patient_id": str(patient_id),
+                    "family_member_id": str(member_id),
+                    "summary": f"We talked about the {random.choice(TOPICS)} and the {random.choice(TOPICS)}.",
+                    "topics": random.sample(TOPICS, 2),
+                    "created_at": now - timedelta(days=c, minutes=random.randint(0, 1440)),
+                })
+
+        await flush()
+        if (p + 1) % 500 == 0:
+            print(f"Seeded {p + 1}/{patients} patients")
+
+    await flush(force=True)
+    client.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Seeded {patients} patients, {patients * family_per_patient} family members "
+        f"into {database_name} in {elapsed:.1f}s"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Traffic mix
+# ---------------------------------------------------------------------------
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_counts: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, seconds: float, status_code: Optional[int]):
+        self.latencies[endpoint].append(seconds)
+        if status_code is None or status_code >= 400:
+            self.errors[endpoint] += 1
+        self.status_counts[endpoint][status_code or 0] += 1
+
+    def report(self, elapsed: float) -> str:
+        header = f"{'endpoint':<42}{'count':>8}{'rps':>9}{'err%':>8}{'p50ms':>9}{'p90ms':>9}{'p99ms':>9}{'maxms':>9}"
+        lines = [header, "-" * len(header)]
+        total = 0
+        total_errors = 0
+        for endpoint in sorted(self.latencies):
+            samples = np.array(self.latencies[endpoint]) * 1000
+            count = len(samples)
+            errors = self.errors[endpoint]
+            total += count
+            total_errors += errors
+            p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+            lines.append(
+                f"{endpoint:<42}{count:>8}{count / elapsed:>9.1f}{100 * errors / count:>8.1f}"
+                f"{p50:>9.1f}{p90:>9.1f}{p99:>9.1f}{samples.max():>9.1f}"
+            )
+        lines.append("-" * len(header))
+        if total:
+            lines.append(
+                f"{'TOTAL':<42}{total:>8}{total / elapsed:>9.1f}{100 * total_errors / total:>8.1f}"
+            )
+        for endpoint in sorted(self.status_counts):
+            codes = ", ".join(f"{code}: {n}" for code, n in sorted(self.status_counts[endpoint].items()))
+            lines.append(f"  {endpoint}: {codes}")
+        return "\n".join(lines)
+
+
+async def timed(stats: Stats, endpoint: str, request):
+    started = time.perf_counter()
+    status_code = None
+    try:
+        response = await request
+        status_code = response.status_code
+    except httpx.HTTPError as e:
+        print(f"{endpoint}: {type(e).__name__}: {e}")
+    stats.record(endpoint, time.perf_counter() - started, status_code)
+
+
+async def load_identities(mongodb_url: str, database_name: str, users: int) -> List[dict]:
+    """Pick `users` seeded patients along with one family member each."""
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client[database_name]
+    patients = await db.patients.find(
+        {"firebase_uid": {"$regex": "^lt-patient-"}}, {"_id": 1, "firebase_uid": 1}
+    ).to_list(users)
+    identities = []
+    for patient in patients:
+        member = await db.family_members.find_one(
+            {"patient_id": str(patient["_id"])}, {"_id": 1, "firebase_uid": 1}
+        )
+        if member:
+            identities.append({
+                "patient_id": str(patient["_id"]),
+                "patient_uid": patient["firebase_uid"],
+                "member_id": str(member["_id"]),
+                "member_uid": member["firebase_uid"],
+            })
+    client.close()
+    return identities
+
+
+async def family_device(client: httpx.AsyncClient, stats: Stats, who: dict, deadline: float, args):
+    """Family member app: polls the patient's location every few seconds, logs conversations."""
+    headers = {"Authorization": f"Bearer {who['member_uid']}"}
+    next_conversation = time.monotonic() + random.uniform(0, args.conversation_interval)
+    await asyncio.sleep(random.uniform(0, args.poll_interval))
+    while time.monotonic() < deadline:
+        await timed(stats, "GET /patients/{id}/location", client.get(
+            f"/patients/{who['patient_id']}/location", headers=headers
+        ))
+        if time.monotonic() >= next_conversation:
+            next_conversation += args.conversation_interval
+            await timed(stats, "POST /conversations/", client.post("/conversations/", headers=headers, json={
+                "patient_id": who["patient_id"],
+                "family_member_id": who["member_id"],
+                "summary": f"Talked about the {random.choice(TOPICS)}.",
+                "topics": random.sample(TOPICS, 2),
+            }))
+            await timed(stats, "GET /conversations/patient/{id}", client.get(
+                f"/conversations/patient/{who['patient_id']}", headers=headers
+            ))
+        await asyncio.sleep(args.poll_interval)
+
+
+async def patient_device(
+    client: httpx.AsyncClient, stats: Stats, who: dict, deadline: float, args, media: dict
+):
+    """Patient app: pushes location periodically and occasionally fires recognition bursts."""
+    headers = {"Authorization": f"Bearer {who['patient_uid']}"}
+    next_push = time.monotonic() + random.uniform(0, args.push_interval)
+    next_burst = time.monotonic() + random.uniform(0, args.burst_interval)
+    while time.monotonic() < deadline:
+        now = time.monotonic()
+        if now >= next_push:
+            next_push += args.push_interval
+            await timed(stats, "PUT /patients/location", client.put("/patients/location", headers=headers, json={
+                "latitude": 43.7 + random.uniform(-0.05, 0.05),
+                "longitude": -79.4 + random.uniform(-0.05, 0.05),
+            }))
+        if now >= next_burst:
+            next_burst += args.burst_interval
+            for _ in range(args.burst_size):
+                if media.get("face") and random.random() < args.face_ratio:
+                    await timed(stats, "POST /recognition/face/recognize", client.post(
+                        "/recognition/face/recognize", headers=headers,
+                        data={"patient_id": who["patient_id"]},
+                        files={"image": ("face.jpg", media["face"], "image/jpeg")},
+                    ))
+                elif media.get("voice"):
+                    await timed(stats, "POST /recognition/voice/recognize", client.post(
+                        "/recognition/voice/recognize", headers=headers,
+                        data={"patient_id": who["patient_id"]},
+                        files={"audio": ("voice.wav", media["voice"], "audio/wav")},
+                    ))
+            await timed(stats, "POST /recognition/greeting", client.post(
+                "/recognition/greeting", headers=headers, data={"family_member_id": who["member_id"]}
+            ))
+        await asyncio.sleep(max(0.0, min(next_push, next_burst) - time.monotonic()))
+
+
+async def run(args):
+    identities = await load_identities(args.mongodb_url, args.database, args.users)
+    if not identities:
+        raise SystemExit("No seeded patients found; run `loadtest.py seed` first")
+    print(f"Driving {len(identities)} patient/family pairs for {args.duration}s")
+
+    media = {}
+    if args.face_image:
+        with open(args.face_image, "rb") as f:
+            media["face"] = f.read()
+    elif args.face_ratio > 0:
+        media["face"] = synthetic_jpeg()
+    if args.voice_audio:
+        with open(args.voice_audio, "rb") as f:
+            media["voice"] = f.read()
+    else:
+        media["voice"] = synthetic_wav()
+
+    limits = httpx.Limits(max_connections=args.max_connections)
+    timeout = httpx.Timeout(args.timeout)
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout)
+        app_context = None
+    else:
+        app = build_app(args.mongodb_url, args.database)
+        app_context = app.router.lifespan_context(app)
+        await app_context.__aenter__()
+        # Unhandled app errors come back as 500s, as over a socket, instead of
+        # raising out of the request and aborting the run
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://loadtest",
+            limits=limits, timeout=timeout,
+        )
+
+    if args.explain_queries:
+        query_profiler.explain_all = True
+
+    stats = Stats()
+    started = time.monotonic()
+    deadline = started + args.duration
+    scans = []
+    try:
+        async with client:
+            tasks = []
+            for who in identities:
+                tasks.append(family_device(client, stats, who, deadline, args))
+                tasks.append(patient_device(client, stats, who, deadline, args, media))
+            await asyncio.gather(*tasks)
+        if app_context is not None and args.explain_queries:
+            scans = await query_profiler.collection_scans(database.db)
+    finally:
+        if app_context is not None:
+            await app_context.__aexit__(None, None, None)
+
+    print()
+    print(stats.report(time.monotonic() - started))
+    if args.explain_queries:
+        print(format_collection_scans(scans))
+
+
+def format_collection_scans(scans: List[dict]) -> str:
+    if not scans:
+        return "No collection scans in captured queries"
+    lines = [f"{len(scans)} query shape(s) ran as collection scans:"]
+    for entry in scans:
+        lines.append(f"  {entry['collection']}.{entry['command']} x{entry['count']} "
+                     f"(max {entry['max_ms']:.1f}ms): {entry['shape']}")
+    return "\n".join(lines)
+
+
+def serve(args):
+    import uvicorn
+
+    app = build_app(args.mongodb_url, args.database)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongodb-url", default=DEFAULT_MONGODB_URL)
+    parser.add_argument("--database", default=DEFAULT_DATABASE)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="populate the load-test database")
+    seed_parser.add_argument("--patients", type=int, default=2000)
+    seed_parser.add_argument("--family-per-patient", type=int, default=4)
+    seed_parser.add_argument("--faces-per-member", type=int, default=3)
+    seed_parser.add_argument("--voices-per-member", type=int, default=3)
+    seed_parser.add_argument("--conversations-per-member", type=int, default=5)
+    seed_parser.add_argument("--drop", action="store_true", help="drop the database first")
+
+    run_parser = commands.add_parser("run", help="drive the traffic mix and report")
+    run_parser.add_argument("--users", type=int, default=100, help="patient/family pairs to simulate")
+    run_parser.add_argument("--duration", type=float, default=60.0)
+    run_parser.add_argument("--base-url", help="target a running server instead of in-process")
+    run_parser.add_argument("--poll-interval", type=float, default=3.0)
+    run_parser.add_argument("--push-interval", type=float, default=30.0)
+    run_parser.add_argument("--burst-interval", type=float, default=20.0)
+    run_parser.add_argument("--burst-size", type=int, default=3)
+    run_parser.add_argument("--face-ratio", type=float, default=0.5, help="share of recognitions that are face")
+    run_parser.add_argument("--conversation-interval", type=float, default=60.0)
+    run_parser.add_argument("--face-image", help="JPEG to send instead of a synthetic one")
+    run_parser.add_argument("--voice-audio", help="WAV to send instead of a synthetic one")
+    run_parser.add_argument("--max-connections", type=int, default=200)
+    run_parser.add_argument("--timeout", type=float, default=30.0)
+    run_parser.add_argument("--explain-queries", action="store_true",
+                            help="explain every query shape and list collection scans (in-process only)")
+
+    serve_parser = commands.add_parser("serve", help="run the app with fake auth for external drivers")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8001)
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        asyncio.run(seed(
+            args.mongodb_url, args.database, args.patients, args.family_per_patient,
+            args.faces_per_member, args.voices_per_member, args.conversations_per_member, args.drop,
+        ))
+    elif args.command == "run":
+        asyncio.run(run(args))
+    elif args.command == "serve":
+        serve(args)
+
+
+if __name__ == "__main__":
+    main()
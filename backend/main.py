@@ -1,9 +1,37 @@
+import logging
+import time
+
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from database import connect_to_mongo, close_mongo_connection
+from database import connect_to_mongo, close_mongo_connection, get_database
 from auth import initialize_firebase
-from routers import patients, family_members, recognition, conversations, auth
+from config import get_settings
+from lazy_imports import startup_report, format_startup_report
+from routers import patients, family_members, recognition, conversations, auth, admin, bootstrap, jobs
+from services.face_recognition import face_recognition_service
+from services.inference_client import (
+    InferenceError, inference_client, inference_error_handler, start_inference_worker, stop_inference_worker
+)
+from services import job_handlers  # registers the background job types
+from services.conversation_search import conversation_search
+from services.jobs import PRIORITY_BACKGROUND, enqueue, job_runner
+from services.memory import memory_monitor
+from services.admission import AdmissionMiddleware, Overloaded, overloaded_handler
+from services.compression import CompressionMiddleware
+from services.conditional import ConditionalHeadersMiddleware, NotModified, not_modified_handler
+from services.serialization import FastJSONResponse
+from services.telemetry import TracingMiddleware, configure_logging
+from services.uploads import UploadLimitMiddleware
+from services.voice_recognition import voice_recognition_service
+
+APP_IMPORT_SECONDS = time.perf_counter() - _import_started
+
+settings = get_settings()
+configure_logging()
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
@@ -11,8 +39,28 @@ async def lifespan(app: FastAPI):
     # Startup
     initialize_firebase()
     await connect_to_mongo()
+    inference_process = None
+    if inference_client.enabled and settings.INFERENCE_SPAWN:
+        inference_process = await start_inference_worker()
+    elif settings.WARM_MODELS_ON_STARTUP and not inference_client.enabled:
+        face_recognition_service.warm_up()
+        voice_recognition_service.warm_up()
+    if settings.JOB_RUNNER_ENABLED:
+        job_runner.start(get_database())
+        try:
+            # location fixes from before the geo fields; a no-op scan once they are all filled in
+            await enqueue(get_database(), "location_backfill", {},
+                          priority=PRIORITY_BACKGROUND, dedupe_key="location_backfill")
+        except Exception as e:
+            logger.warning("Could not queue the location backfill: %s", e)
+    memory_monitor.start()
+    logger.info(format_startup_report(startup_report(APP_IMPORT_SECONDS)))
     yield
     # Shutdown
+    await memory_monitor.stop()
+    await job_runner.stop()
+    await conversation_search.close()
+    stop_inference_worker(inference_process)
     await close_mongo_connection()
 
 
@@ -20,9 +68,26 @@ app = FastAPI(
     title="Alzheimer's Care API",
     description="API for Alzheimer's patient care app with face/voice recognition",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# An unavailable inference worker answers 503 wherever recognition runs
+app.add_exception_handler(InferenceError, inference_error_handler)
+
+# Conditional GET validators, and compression of larger bodies
+app.add_exception_handler(NotModified, not_modified_handler)
+app.add_middleware(ConditionalHeadersMiddleware)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_BYTES)
+
+# Request body size limits, enforced while the body streams in
+app.add_middleware(UploadLimitMiddleware)
+
+# Rate limits, ahead of any body parsing or auth; the inference concurrency cap
+# is taken around each model call (run_inference) and answers 429 through the handler
+app.add_exception_handler(Overloaded, overloaded_handler)
+app.add_middleware(AdmissionMiddleware)
+
 # CORS middleware for mobile app
 app.add_middleware(
     CORSMiddleware,
@@ -30,14 +95,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", "traceparent", "Retry-After"],
 )
 
+# Outermost, so the request span and access log cover every other layer
+app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(patients.router)
 app.include_router(family_members.router)
 app.include_router(recognition.router)
 app.include_router(conversations.router)
 app.include_router(auth.router)
+app.include_router(admin.router)
+app.include_router(bootstrap.router)
+app.include_router(jobs.router)
 
 
 @app.get("/")
@@ -48,3 +120,8 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/health/startup")
+async def startup_check():
+    return startup_report(APP_IMPORT_SECONDS)
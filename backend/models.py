@@ -28,6 +28,7 @@ class PatientCreate(BaseModel):
     home_address: str
     home_latitude: float
     home_longitude: float
+    home_radius_meters: Optional[float] = None  # defaults to HOME_RADIUS_METERS
 
 
 class Patient(BaseModel):
@@ -39,6 +40,7 @@ class Patient(BaseModel):
     home_address: str
     home_latitude: float
     home_longitude: float
+    home_radius_meters: Optional[float] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
     class Config:
@@ -47,8 +49,8 @@ class Patient(BaseModel):
 
 
 class PatientLocationUpdate(BaseModel):
-    latitude: float
-    longitude: float
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
 
 
 class PatientLocation(BaseModel):
@@ -118,6 +120,13 @@ class ConversationCreate(BaseModel):
     topics: List[str] = []
 
 
+class ConversationTranscript(BaseModel):
+    patient_id: str
+    family_member_id: str
+    transcript: str = Field(..., min_length=1, max_length=50000)
+    topics: List[str] = []
+
+
 class Conversation(BaseModel):
     id: Optional[str] = Field(None, alias="_id")
     patient_id: str
@@ -139,6 +148,14 @@ class RecognitionResult(BaseModel):
     relationship: Optional[str] = None
     confidence: float = 0.0
     last_conversation: Optional[Conversation] = None
+    rejection_reason: Optional[str] = None  # quality gate reason code
+
+
+class MultimodalRecognitionResult(RecognitionResult):
+    face_confidence: Optional[float] = None
+    voice_confidence: Optional[float] = None
+    face_rejection_reason: Optional[str] = None
+    voice_rejection_reason: Optional[str] = None
 
 
 # Auth Models
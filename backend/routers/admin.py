@@ -0,0 +1,205 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from config import get_settings
+from database import get_database
+from auth import verify_admin
+from services import model_versions
+from services.admission import admission
+from services.gemini_service import gemini_service
+from services.jobs import FAILED, PRIORITY_BACKGROUND, enqueue, job_runner
+from services.memory import (
+    memory_report, rss_bytes, shrink_caches, start_tracing, stop_tracing, top_allocations, tracemalloc_status
+)
+from services.query_profiler import query_profiler
+from services.reembed import KINDS
+from services.serialization import json_response
+from services.telemetry import telemetry_stats
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+settings = get_settings()
+
+
+def _check_kind(kind: str):
+    if kind not in KINDS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown embedding kind: {kind}"
+        )
+
+
+@router.get("/embeddings/versions")
+async def embedding_versions(token_data: dict = Depends(verify_admin)):
+    """Stored embedding counts per model version, next to the version in use."""
+    db = get_database()
+    report = {}
+    for kind in KINDS:
+        counts = await db[f"{kind}_embeddings"].aggregate([
+            {"$group": {"_id": "$model_version", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        report[kind] = {
+            "current": model_versions.CURRENT[kind],
+            "compatible": list(model_versions.COMPATIBLE[kind]),
+            "counts": {(c["_id"] or "unversioned"): c["count"] for c in counts},
+        }
+    return json_response(report)
+
+
+@router.get("/reembed")
+async def list_reembed_jobs(token_data: dict = Depends(verify_admin)):
+    db = get_database()
+    jobs = await db.reembed_jobs.find().sort("started_at", -1).to_list(100)
+    active = {
+        job["active_key"]: job for job in await db.jobs.find(
+            {"active_key": {"$in": [f"reembed:{kind}" for kind in KINDS]}}, {"active_key": 1, "status": 1}
+        ).to_list(None)
+    }
+    for job in jobs:
+        queued = active.get(f"reembed:{job['kind']}")
+        job["job_status"] = queued["status"] if queued else None
+    return json_response(jobs)
+
+
+@router.post("/reembed/{kind}", status_code=status.HTTP_202_ACCEPTED)
+async def start_reembed(
+    kind: str,
+    batch_size: Optional[int] = Query(None, ge=1, le=256),
+    max_per_second: Optional[float] = Query(None, ge=0),
+    token_data: dict = Depends(verify_admin)
+):
+    """Queue re-embedding one collection at the current model version (resumes a stopped run, retries failures)."""
+    _check_kind(kind)
+    db = get_database()
+    if await db.jobs.find_one({"active_key": f"reembed:{kind}"}, {"_id": 1}):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"A {kind} re-embedding job is already queued or running"
+        )
+    job_id = await enqueue(
+        db, "reembed", {"kind": kind, "batch_size": batch_size, "max_per_second": max_per_second},
+        priority=PRIORITY_BACKGROUND, dedupe_key=f"reembed:{kind}"
+    )
+    return json_response(
+        {"message": f"Re-embedding {kind} embeddings to {model_versions.CURRENT[kind]}", "job_id": job_id},
+        status_code=status.HTTP_202_ACCEPTED
+    )
+
+
+@router.post("/reembed/{kind}/prune", status_code=status.HTTP_202_ACCEPTED)
+async def prune_reembedded(kind: str, token_data: dict = Depends(verify_admin)):
+    """Queue deleting embeddings superseded by a current-version copy. Run after the rollout."""
+    _check_kind(kind)
+    job_id = await enqueue(
+        get_database(), "embedding_compaction", {"kind": kind},
+        priority=PRIORITY_BACKGROUND, dedupe_key=f"compaction:{kind}"
+    )
+    return json_response({"job_id": job_id}, status_code=status.HTTP_202_ACCEPTED)
+
+
+@router.post("/locations/backfill", status_code=status.HTTP_202_ACCEPTED)
+async def backfill_locations(token_data: dict = Depends(verify_admin)):
+    """Queue adding the geo fields to location fixes stored without them (also queued at startup)."""
+    job_id = await enqueue(
+        get_database(), "location_backfill", {},
+        priority=PRIORITY_BACKGROUND, dedupe_key="location_backfill"
+    )
+    return json_response({"job_id": job_id}, status_code=status.HTTP_202_ACCEPTED)
+
+
+@router.get("/jobs")
+async def job_queue(token_data: dict = Depends(verify_admin)):
+    """Job counts by type and status, failures with their last error, and this process's runner."""
+    db = get_database()
+    counts = await db.jobs.aggregate([
+        {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}}
+    ]).to_list(None)
+    failed = await db.jobs.find(
+        {"status": FAILED}, {"type": 1, "attempts": 1, "last_error": 1, "finished_at": 1}
+    ).sort("finished_at", -1).to_list(20)
+    report = {}
+    for c in counts:
+        report.setdefault(c["_id"]["type"], {})[c["_id"]["status"]] = c["count"]
+    return json_response({"counts": report, "recent_failures": failed, "runner": job_runner.stats()})
+
+
+@router.get("/slow-queries")
+async def slow_queries(collection_scans_only: bool = False, token_data: dict = Depends(verify_admin)):
+    """Captured slow query shapes, slowest first, with their winning plans."""
+    db = get_database()
+    if collection_scans_only:
+        entries = await query_profiler.collection_scans(db)
+    else:
+        entries = await query_profiler.report(db)
+    return json_response(entries)
+
+
+@router.delete("/slow-queries")
+async def reset_slow_queries(token_data: dict = Depends(verify_admin)):
+    query_profiler.reset()
+    return json_response({"message": "Slow query buffer cleared"})
+
+
+@router.get("/admission")
+async def admission_stats(token_data: dict = Depends(verify_admin)):
+    """Requests admitted and rejected (rate limited or no inference slot) by route class."""
+    return json_response(admission.stats())
+
+
+@router.get("/gemini")
+async def gemini_stats(token_data: dict = Depends(verify_admin)):
+    """Gemini call outcomes, fallbacks, hedging, latency and circuit breaker state."""
+    return json_response(gemini_service.stats())
+
+
+@router.get("/telemetry")
+async def telemetry(token_data: dict = Depends(verify_admin)):
+    """Log lines and spans dropped under backpressure, and the tracing setup."""
+    return json_response(telemetry_stats())
+
+
+@router.get("/memory")
+async def memory(token_data: dict = Depends(verify_admin)):
+    """This worker's RSS, what models and imports added to it, and every cache's size and budget."""
+    return json_response(memory_report())
+
+
+@router.post("/memory/shrink")
+async def shrink_memory(
+    fraction: float = Query(0.5, gt=0, le=1),
+    token_data: dict = Depends(verify_admin)
+):
+    """Have every cache in this worker drop `fraction` of what it holds."""
+    return json_response({"dropped": shrink_caches(fraction), "rss_bytes": rss_bytes()})
+
+
+@router.post("/memory/tracemalloc/start")
+async def start_tracemalloc(
+    frames: int = Query(settings.MEMORY_TRACEMALLOC_FRAMES, ge=1, le=50),
+    token_data: dict = Depends(verify_admin)
+):
+    """Trace Python allocations in this worker from now on. Slows the worker down; stop when done."""
+    await run_in_threadpool(start_tracing, frames)
+    return json_response(tracemalloc_status())
+
+
+@router.get("/memory/tracemalloc")
+async def tracemalloc_top(
+    limit: int = Query(20, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    compare: bool = Query(False, description="growth since tracing started instead of current size"),
+    token_data: dict = Depends(verify_admin)
+):
+    """Largest allocation sites in this worker's traced memory."""
+    if not tracemalloc_status()["tracing"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Not tracing; POST /admin/memory/tracemalloc/start first"
+        )
+    top = await run_in_threadpool(top_allocations, limit, group_by, compare)
+    return json_response({**tracemalloc_status(), "top": top})
+
+
+@router.post("/memory/tracemalloc/stop")
+async def stop_tracemalloc(token_data: dict = Depends(verify_admin)):
+    stop_tracing()
+    return json_response(tracemalloc_status())
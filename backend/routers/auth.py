@@ -1,12 +1,23 @@
-from fastapi import APIRouter, HTTPException
+import logging
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
+from starlette.datastructures import UploadFile
+from config import get_settings
 from database import get_database
+from services import model_versions
+from services.admission import Overloaded, run_inference
 from services.face_recognition import FaceRecognitionService
+from services.inference_client import InferenceError
+from services.quality_gate import QualityRejected
+from services.serialization import json_response
+from services.uploads import read_body, read_image
 import firebase_admin
 from firebase_admin import auth as firebase_auth
 import base64
 
 router = APIRouter(prefix="/auth", tags=["auth"])
+logger = logging.getLogger(__name__)
+settings = get_settings()
 
 face_service = FaceRecognitionService()
 
@@ -33,16 +44,16 @@ async def register_user(request: EmailAuthRequest):
         # Create custom token for immediate login
         custom_token = firebase_auth.create_custom_token(user.uid)
         
-        return {
+        return json_response({
             "success": True,
             "firebase_token": custom_token.decode('utf-8'),
             "uid": user.uid,
             "email": user.email
-        }
+        })
     except firebase_admin.exceptions.FirebaseError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Registration error: {e}")
+        logger.exception("Registration error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -58,61 +69,99 @@ async def login_user(request: EmailAuthRequest):
         # The frontend should use signInWithCustomToken
         custom_token = firebase_auth.create_custom_token(user.uid)
         
-        return {
+        return json_response({
             "success": True,
             "firebase_token": custom_token.decode('utf-8'),
             "uid": user.uid,
             "email": user.email
-        }
+        })
     except firebase_auth.UserNotFoundError:
         raise HTTPException(status_code=401, detail="User not found")
     except Exception as e:
-        print(f"Login error: {e}")
+        logger.exception("Login error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/patient-face-login")
 async def patient_face_login(request: PatientFaceLoginRequest):
-    db = get_database()
-    
     try:
         image_data = base64.b64decode(request.image_base64)
-        
-        embedding = face_service.extract_embedding(image_data)
-        
-        if embedding is None:
-            return {"success": False, "message": "No face detected in image"}
-        
-        patients = await db.patients.find().to_list(100)
-        
-        best_match = None
-        best_similarity = 0
-        
-        for patient in patients:
-            patient_embedding = patient.get("face_embedding")
-            if patient_embedding:
-                similarity = face_service.compare_embeddings(embedding, patient_embedding)
-                if similarity > best_similarity and similarity > face_service.threshold:
-                    best_similarity = similarity
-                    best_match = patient
-        
-        if best_match:
-            try:
-                custom_token = firebase_auth.create_custom_token(best_match["firebase_uid"])
-                return {
-                    "success": True,
-                    "firebase_token": custom_token.decode('utf-8'),
-                    "patient_name": best_match.get("name", "Patient"),
-                }
-            except Exception as e:
-                print(f"Error creating custom token: {e}")
-                raise HTTPException(status_code=500, detail="Could not create authentication token")
-        else:
-            return {
-                "success": False,
-                "message": "Face not recognized. Please register first or use email login."
-            }
-            
+        return await _face_login(image_data)
+    except (HTTPException, InferenceError, Overloaded):
+        raise
+    except Exception as e:
+        logger.exception("Face login error: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/patient-face-login/image")
+async def patient_face_login_image(request: Request):
+    """
+    Face login with the photo as the raw request body (image/jpeg,
+    application/octet-stream) or as the `image` field of a multipart form,
+    without the base64 round trip of /patient-face-login.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        image = form.get("image")
+        if not isinstance(image, UploadFile):
+            raise HTTPException(status_code=400, detail="Missing image field")
+        image_data = await read_image(image)
+    else:
+        image_data = await read_body(request, settings.UPLOAD_MAX_IMAGE_BYTES, "Image")
+    if not image_data:
+        raise HTTPException(status_code=400, detail="Empty image")
+    
+    try:
+        return await _face_login(image_data)
+    except (HTTPException, InferenceError, Overloaded):
+        raise
     except Exception as e:
-        print(f"Face login error: {e}")
+        logger.exception("Face login error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _face_login(image_data):
+    db = get_database()
+    
+    try:
+        embedding = await run_inference(face_service.extract_embedding, image_data)
+    except QualityRejected as e:
+        return json_response({"success": False, "message": str(e), "reason": e.reason})
+    
+    if embedding is None:
+        return json_response({"success": False, "message": "No face detected in image"})
+    
+    patients = await db.patients.find(
+        {"face_embedding": {"$exists": True}},
+        {"firebase_uid": 1, "name": 1, "face_embedding": 1, "face_model_version": 1}
+    ).to_list(100)
+    
+    best_match = None
+    best_similarity = 0
+    
+    for patient in patients:
+        patient_embedding = patient.get("face_embedding")
+        if patient_embedding and model_versions.is_compatible("face", patient.get("face_model_version")):
+            similarity = face_service.compare_embeddings(embedding, patient_embedding)
+            if similarity > best_similarity and similarity > face_service.threshold:
+                best_similarity = similarity
+                best_match = patient
+    
+    if best_match:
+        try:
+            custom_token = firebase_auth.create_custom_token(best_match["firebase_uid"])
+            return json_response({
+                "success": True,
+                "firebase_token": custom_token.decode('utf-8'),
+                "patient_name": best_match.get("name", "Patient"),
+            })
+        except Exception as e:
+            logger.warning("Error creating custom token: %s", e)
+            raise HTTPException(status_code=500, detail="Could not create authentication token")
+    else:
+        return json_response({
+            "success": False,
+            "message": "Face not recognized. Please register first or use email login."
+        })
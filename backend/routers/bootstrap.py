@@ -0,0 +1,79 @@
+import asyncio
+from fastapi import APIRouter, Depends
+from bson import ObjectId
+from datetime import datetime
+from database import get_database
+from auth import verify_firebase_token
+from config import get_settings
+from services.pagination import fetch_page
+from services.serialization import json_response
+
+settings = get_settings()
+
+router = APIRouter(tags=["bootstrap"])
+
+# Bump when the bundle layout changes so the app can tell what it received
+BOOTSTRAP_VERSION = 1
+BOOTSTRAP_CONVERSATIONS = 20
+
+# The login embedding is never sent back to the app
+PATIENT_PROJECTION = {"face_embedding": 0}
+HOME_FIELDS = ("home_address", "home_latitude", "home_longitude")
+
+
+async def _none():
+    return None
+
+
+async def _patient_data(db, patient_id: str) -> dict:
+    """Family, recent conversations and last known location of one patient, fetched concurrently."""
+    (members, members_cursor), (conversations, conversations_cursor), location = await asyncio.gather(
+        fetch_page(db.family_members, {"patient_id": patient_id}, None, settings.LISTING_MAX_LIMIT),
+        fetch_page(db.conversations, {"patient_id": patient_id}, None, BOOTSTRAP_CONVERSATIONS),
+        db.locations.find_one({"patient_id": patient_id}),
+    )
+    return {
+        "family_members": members,
+        "conversations": conversations,
+        "location": location,
+        "next_cursors": {"family_members": members_cursor, "conversations": conversations_cursor},
+    }
+
+
+@router.get("/bootstrap")
+async def bootstrap(token_data: dict = Depends(verify_firebase_token)):
+    """
+    Everything the home screen needs on launch, in one round-trip.
+    
+    Resolves the caller as a patient or a family member and returns their
+    profile with the patient's home, family members, recent conversations and
+    location. `role` is null for an account that has not registered yet.
+    Longer lists continue through the regular listing endpoints with the
+    cursors in `next_cursors`.
+    """
+    db = get_database()
+    firebase_uid = token_data.get("uid")
+    
+    patient, member = await asyncio.gather(
+        db.patients.find_one({"firebase_uid": firebase_uid}, PATIENT_PROJECTION),
+        db.family_members.find_one({"firebase_uid": firebase_uid}),
+    )
+    
+    bundle = {"version": BOOTSTRAP_VERSION, "generated_at": datetime.utcnow()}
+    if patient is not None:
+        patient_id = str(patient["_id"])
+        bundle.update(role="patient", profile=patient, **await _patient_data(db, patient_id))
+        bundle["home"] = {field: patient.get(field) for field in ("_id", "name", *HOME_FIELDS)}
+    elif member is not None:
+        patient_id = member["patient_id"]
+        home, data = await asyncio.gather(
+            db.patients.find_one({"_id": ObjectId(patient_id)}, {"name": 1, **{f: 1 for f in HOME_FIELDS}})
+            if ObjectId.is_valid(patient_id) else _none(),
+            _patient_data(db, patient_id),
+        )
+        bundle.update(role="family_member", profile=member, **data)
+        bundle["home"] = home
+    else:
+        bundle["role"] = None
+    
+    return json_response(bundle)
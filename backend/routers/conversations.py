@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from bson import ObjectId
-from datetime import datetime
-from typing import List
+from typing import List, Optional
 from database import get_database
-from models import ConversationCreate, Conversation
+from models import ConversationCreate, ConversationTranscript
 from auth import verify_firebase_token
+from services.conversation_search import conversation_search
+from services.conversation_store import record_conversation
 from services.gemini_service import gemini_service
+from services.jobs import PRIORITY_INTERACTIVE, enqueue
+from services.pagination import limit_for, paginate, parse_fields
+from services.conditional import conditional
+from services.resource_versions import member_conversations_key, patient_conversations_key
+from services.serialization import json_response
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
 
+CONVERSATION_FIELDS = {"patient_id", "family_member_id", "summary", "topics", "created_at"}
+
 
 @router.post("/", response_model=dict)
 async def create_conversation(
@@ -17,18 +25,36 @@ async def create_conversation(
 ):
     db = get_database()
     
-    conv_doc = {
-        "patient_id": conversation.patient_id,
-        "family_member_id": conversation.family_member_id,
-        "summary": conversation.summary,
-        "topics": conversation.topics,
-        "created_at": datetime.utcnow()
-    }
+    conv_doc = await record_conversation(
+        db, conversation.patient_id, conversation.family_member_id, conversation.summary, conversation.topics
+    )
     
-    result = await db.conversations.insert_one(conv_doc)
-    conv_doc["_id"] = str(result.inserted_id)
+    return json_response({"message": "Conversation recorded", "conversation": conv_doc})
+
+
+@router.post("/transcript", status_code=status.HTTP_202_ACCEPTED)
+async def create_conversation_from_transcript(
+    conversation: ConversationTranscript,
+    token_data: dict = Depends(verify_firebase_token)
+):
+    """
+    Record a conversation from its raw transcript.
     
-    return {"message": "Conversation recorded", "conversation": conv_doc}
+    The summary is generated in the background; poll `GET /jobs/{job_id}`
+    for the recorded conversation.
+    """
+    db = get_database()
+    
+    job_id = await enqueue(
+        db, "conversation_summary", conversation.model_dump(),
+        priority=PRIORITY_INTERACTIVE, owner_uid=token_data.get("uid")
+    )
+    
+    return json_response(
+        {"message": "Conversation queued for summarization", "job_id": job_id},
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Location": f"/jobs/{job_id}"}
+    )
 
 
 @router.post("/summarize")
@@ -39,7 +65,7 @@ async def summarize_conversation(
 ):
     db = get_database()
     
-    member = await db.family_members.find_one({"_id": ObjectId(family_member_id)})
+    member = await db.family_members.find_one({"_id": ObjectId(family_member_id)}, {"name": 1, "relationship": 1})
     if not member:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -58,40 +84,56 @@ async def summarize_conversation(
             detail="Could not generate summary"
         )
     
-    return {"summary": summary}
+    return json_response({"summary": summary})
 
 
-@router.get("/patient/{patient_id}", response_model=List[dict])
+@router.get("/patient/{patient_id}", response_model=List[dict],
+            dependencies=[Depends(conditional(patient_conversations_key, "patient_id"))])
 async def get_patient_conversations(
     patient_id: str,
-    limit: int = 20,
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     token_data: dict = Depends(verify_firebase_token)
 ):
+    """Newest first; continue with the X-Next-Cursor value as `cursor`."""
     db = get_database()
     
-    conversations = await db.conversations.find(
-        {"patient_id": patient_id}
-    ).sort("created_at", -1).limit(limit).to_list(limit)
-    
-    for conv in conversations:
-        conv["_id"] = str(conv["_id"])
+    return await paginate(
+        request, db.conversations, {"patient_id": patient_id},
+        cursor, limit_for(request, limit, 20), parse_fields(fields, CONVERSATION_FIELDS)
+    )
+
+
+@router.get("/patient/{patient_id}/search", response_model=List[dict],
+            dependencies=[Depends(conditional(patient_conversations_key, "patient_id"))])
+async def search_patient_conversations(
+    patient_id: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    token_data: dict = Depends(verify_firebase_token)
+):
+    """Conversations matching `q` in their summary or topics, best match first."""
+    db = get_database()
     
-    return conversations
+    return json_response(await conversation_search.search(db, patient_id, q, limit))
 
 
-@router.get("/family-member/{family_member_id}", response_model=List[dict])
+@router.get("/family-member/{family_member_id}", response_model=List[dict],
+            dependencies=[Depends(conditional(member_conversations_key, "family_member_id"))])
 async def get_family_member_conversations(
     family_member_id: str,
-    limit: int = 20,
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     token_data: dict = Depends(verify_firebase_token)
 ):
+    """Newest first; continue with the X-Next-Cursor value as `cursor`."""
     db = get_database()
     
-    conversations = await db.conversations.find(
-        {"family_member_id": family_member_id}
-    ).sort("created_at", -1).limit(limit).to_list(limit)
-    
-    for conv in conversations:
-        conv["_id"] = str(conv["_id"])
-    
-    return conversations
+    return await paginate(
+        request, db.conversations, {"family_member_id": family_member_id},
+        cursor, limit_for(request, limit, 20), parse_fields(fields, CONVERSATION_FIELDS)
+    )
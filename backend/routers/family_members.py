@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from bson import ObjectId
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from database import get_database
 from models import FamilyMemberCreate, FamilyMember
 from auth import verify_firebase_token
+from config import get_settings
+from services.pagination import limit_for, paginate, parse_fields
+from services.conditional import conditional
+from services.resource_versions import family_key, member_key, resource_versions
+from services.serialization import json_response
+
+settings = get_settings()
 
 router = APIRouter(prefix="/family-members", tags=["family-members"])
 
+FAMILY_MEMBER_FIELDS = {"firebase_uid", "name", "email", "phone", "relationship", "patient_id", "created_at"}
+
 
 @router.post("/register", response_model=dict)
 async def register_family_member(
@@ -43,8 +52,9 @@ async def register_family_member(
     
     result = await db.family_members.insert_one(member_doc)
     member_doc["_id"] = str(result.inserted_id)
+    await resource_versions.bump(db, family_key(member_data.patient_id), member_key(member_doc["_id"]))
     
-    return {"message": "Family member registered successfully", "family_member": member_doc}
+    return json_response({"message": "Family member registered successfully", "family_member": member_doc})
 
 
 @router.get("/me", response_model=dict)
@@ -59,25 +69,29 @@ async def get_current_family_member(token_data: dict = Depends(verify_firebase_t
             detail="Family member not found"
         )
     
-    member["_id"] = str(member["_id"])
-    return member
+    return json_response(member)
 
 
-@router.get("/patient/{patient_id}", response_model=List[dict])
+@router.get("/patient/{patient_id}", response_model=List[dict],
+            dependencies=[Depends(conditional(family_key, "patient_id"))])
 async def get_family_members_for_patient(
     patient_id: str,
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     token_data: dict = Depends(verify_firebase_token)
 ):
+    """Newest first; continue with the X-Next-Cursor value as `cursor`."""
     db = get_database()
     
-    members = await db.family_members.find({"patient_id": patient_id}).to_list(100)
-    for member in members:
-        member["_id"] = str(member["_id"])
-    
-    return members
+    return await paginate(
+        request, db.family_members, {"patient_id": patient_id},
+        cursor, limit_for(request, limit, settings.LISTING_MAX_LIMIT), parse_fields(fields, FAMILY_MEMBER_FIELDS)
+    )
 
 
-@router.get("/{member_id}", response_model=dict)
+@router.get("/{member_id}", response_model=dict, dependencies=[Depends(conditional(member_key, "member_id"))])
 async def get_family_member(
     member_id: str,
     token_data: dict = Depends(verify_firebase_token)
@@ -91,5 +105,4 @@ async def get_family_member(
             detail="Family member not found"
         )
     
-    member["_id"] = str(member["_id"])
-    return member
+    return json_response(member)
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from database import get_database
+from auth import verify_firebase_token
+from config import get_settings
+from services.jobs import get_job
+from services.serialization import json_response
+
+settings = get_settings()
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+JOB_FIELDS = ("type", "status", "attempts", "result", "last_error", "created_at", "updated_at", "finished_at")
+
+
+@router.get("/{job_id}")
+async def get_job_status(job_id: str, token_data: dict = Depends(verify_firebase_token)):
+    """Status of a job the caller queued; `result` is set once it has succeeded."""
+    job = await get_job(get_database(), job_id)
+    uid = token_data.get("uid")
+    if job is None or (job.get("owner_uid") != uid and uid not in settings.admin_uids):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    return json_response({"_id": job["_id"], **{field: job.get(field) for field in JOB_FIELDS}})
@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
 from bson import ObjectId
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from database import get_database
 from models import PatientCreate, Patient, PatientLocation, PatientLocationUpdate
 from auth import verify_firebase_token
+from config import get_settings
+from services import geo, model_versions
+from services.admission import run_inference
 from services.face_recognition import FaceRecognitionService
+from services.quality_gate import QualityRejected
+from services.conditional import conditional
+from services.resource_versions import patient_key, resource_versions
+from services.serialization import json_response
+from services.uploads import read_image
 
 router = APIRouter(prefix="/patients", tags=["patients"])
+settings = get_settings()
 
 face_service = FaceRecognitionService()
 
@@ -35,13 +45,15 @@ async def register_patient(
         "home_address": patient_data.home_address,
         "home_latitude": patient_data.home_latitude,
         "home_longitude": patient_data.home_longitude,
+        "home_radius_meters": patient_data.home_radius_meters,
         "created_at": datetime.utcnow()
     }
     
     result = await db.patients.insert_one(patient_doc)
     patient_doc["_id"] = str(result.inserted_id)
+    await resource_versions.bump(db, patient_key(patient_doc["_id"]))
     
-    return {"message": "Patient registered successfully", "patient": patient_doc}
+    return json_response({"message": "Patient registered successfully", "patient": patient_doc})
 
 
 @router.get("/me", response_model=dict)
@@ -56,8 +68,7 @@ async def get_current_patient(token_data: dict = Depends(verify_firebase_token))
             detail="Patient not found"
         )
     
-    patient["_id"] = str(patient["_id"])
-    return patient
+    return json_response(patient)
 
 
 @router.put("/location")
@@ -68,7 +79,10 @@ async def update_patient_location(
     db = get_database()
     firebase_uid = token_data.get("uid")
     
-    patient = await db.patients.find_one({"firebase_uid": firebase_uid})
+    patient = await db.patients.find_one(
+        {"firebase_uid": firebase_uid},
+        {"home_latitude": 1, "home_longitude": 1, "home_radius_meters": 1}
+    )
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -79,6 +93,7 @@ async def update_patient_location(
         "patient_id": str(patient["_id"]),
         "latitude": location.latitude,
         "longitude": location.longitude,
+        **geo.location_fields(patient, location.latitude, location.longitude),
         "timestamp": datetime.utcnow()
     }
     
@@ -88,7 +103,65 @@ async def update_patient_location(
         upsert=True
     )
     
-    return {"message": "Location updated successfully"}
+    return json_response({"message": "Location updated successfully"})
+
+
+async def _authorized_patient_ids(db, firebase_uid: str) -> List[str]:
+    """Patients whose location the caller may see: their own, and those they are family of."""
+    patient, members = await asyncio.gather(
+        db.patients.find_one({"firebase_uid": firebase_uid}, {"_id": 1}),
+        db.family_members.find({"firebase_uid": firebase_uid}, {"patient_id": 1}).to_list(None),
+    )
+    patient_ids = [member["patient_id"] for member in members]
+    if patient:
+        patient_ids.append(str(patient["_id"]))
+    return patient_ids
+
+
+@router.get("/locations")
+async def get_patient_locations(
+    patient_id: Optional[List[str]] = Query(None, description="Only these patients"),
+    outside_home: bool = Query(False, description="Only patients farther than their home radius from home"),
+    near_latitude: Optional[float] = Query(None, ge=-90, le=90),
+    near_longitude: Optional[float] = Query(None, ge=-180, le=180),
+    within_meters: Optional[float] = Query(None, gt=0, description="With near_latitude/near_longitude"),
+    token_data: dict = Depends(verify_firebase_token)
+):
+    """
+    Latest location of every patient the caller can see, in one query.
+    
+    Admins (ADMIN_FIREBASE_UIDS) see all patients; everyone else their own
+    location and those of the patients they are family of. Filters combine:
+    `outside_home=true` keeps patients away from home, and `near_latitude`,
+    `near_longitude` with `within_meters` keeps fixes within that distance.
+    """
+    db = get_database()
+    firebase_uid = token_data.get("uid")
+    
+    query = {}
+    if firebase_uid not in settings.admin_uids:
+        allowed = await _authorized_patient_ids(db, firebase_uid)
+        if patient_id:
+            requested = set(patient_id)
+            allowed = [pid for pid in allowed if pid in requested]
+        query["patient_id"] = {"$in": allowed}
+    elif patient_id:
+        query["patient_id"] = {"$in": patient_id}
+    if outside_home:
+        query["outside_home"] = True
+    near = (near_latitude, near_longitude, within_meters)
+    if any(value is not None for value in near):
+        if any(value is None for value in near):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="near_latitude, near_longitude and within_meters go together"
+            )
+        query.update(geo.within(*near))
+    
+    if "patient_id" in query and not query["patient_id"]["$in"]:
+        return json_response({"locations": []})
+    locations = await db.locations.find(query, {"_id": 0}).to_list(settings.LOCATIONS_BULK_MAX)
+    return json_response({"locations": locations})
 
 
 @router.get("/{patient_id}/location")
@@ -102,7 +175,7 @@ async def get_patient_location(
     family_member = await db.family_members.find_one({
         "firebase_uid": firebase_uid,
         "patient_id": patient_id
-    })
+    }, {"_id": 1})
     
     if not family_member:
         raise HTTPException(
@@ -117,11 +190,10 @@ async def get_patient_location(
             detail="Location not found"
         )
     
-    location["_id"] = str(location["_id"])
-    return location
+    return json_response(location)
 
 
-@router.get("/{patient_id}/home")
+@router.get("/{patient_id}/home", dependencies=[Depends(conditional(patient_key, "patient_id"))])
 async def get_patient_home(
     patient_id: str,
     token_data: dict = Depends(verify_firebase_token)
@@ -135,11 +207,11 @@ async def get_patient_home(
             detail="Patient not found"
         )
     
-    return {
+    return json_response({
         "home_address": patient["home_address"],
         "home_latitude": patient["home_latitude"],
         "home_longitude": patient["home_longitude"]
-    }
+    })
 
 
 @router.post("/register-face")
@@ -157,8 +229,14 @@ async def register_patient_face(
             detail="Patient not found"
         )
     
-    image_data = await image.read()
-    embedding = face_service.extract_embedding(image_data)
+    image_data = await read_image(image)
+    try:
+        embedding = await run_inference(face_service.extract_embedding, image_data)
+    except QualityRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"reason": e.reason, "message": str(e)}
+        )
     
     if embedding is None:
         raise HTTPException(
@@ -168,7 +246,7 @@ async def register_patient_face(
     
     await db.patients.update_one(
         {"_id": patient["_id"]},
-        {"$set": {"face_embedding": embedding}}
+        {"$set": {"face_embedding": embedding, "face_model_version": model_versions.CURRENT["face"]}}
     )
     
-    return {"message": "Face registered successfully for login"}
+    return json_response({"message": "Face registered successfully for login"})
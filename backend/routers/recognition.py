@@ -1,28 +1,131 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from bson import ObjectId
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from database import get_database
-from models import RecognitionResult, ConversationCreate, Conversation
-from auth import verify_firebase_token
+from models import RecognitionResult, MultimodalRecognitionResult, ConversationCreate, Conversation
+from auth import verify_firebase_token, verify_token
+from config import get_settings
 from services.face_recognition import face_recognition_service
 from services.voice_recognition import voice_recognition_service
+from services import model_versions
+from services.admission import run_inference
 from services.gemini_service import gemini_service
+from services.jobs import enqueue
+from services.media_store import save_media
+from services.quality_gate import NO_SPEECH, QualityRejected
+from services.serialization import FastJSONResponse, json_response
+from services.similarity import EmbeddingGallery, fuse_scores
+from services.uploads import read_audio, read_image
+from services.voice_stream import SAMPLE_RATE, StreamingVoiceEmbedder
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/recognition", tags=["recognition"])
 
 
+async def _recognition_result(db, patient_id: str, match_id: Optional[str], confidence: float) -> RecognitionResult:
+    if match_id is None:
+        return RecognitionResult(recognized=False, confidence=confidence)
+    
+    # Get family member info
+    member = await db.family_members.find_one({"_id": ObjectId(match_id)}, {"name": 1, "relationship": 1})
+    if not member:
+        return RecognitionResult(recognized=False, confidence=confidence)
+    
+    # Get last conversation
+    last_conv = await db.conversations.find_one(
+        {"patient_id": patient_id, "family_member_id": match_id},
+        sort=[("created_at", -1)]
+    )
+    
+    last_conversation = None
+    if last_conv:
+        last_conv["_id"] = str(last_conv["_id"])
+        last_conversation = Conversation(**last_conv)
+    
+    return RecognitionResult(
+        recognized=True,
+        family_member_id=match_id,
+        family_member_name=member["name"],
+        relationship=member["relationship"],
+        confidence=confidence,
+        last_conversation=last_conversation
+    )
+
+
+async def _enrollment_member(db, family_member_id: str, files: List[UploadFile]) -> dict:
+    if len(files) > settings.BULK_ENROLL_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BULK_ENROLL_MAX_FILES} files per request"
+        )
+    member = await db.family_members.find_one({"_id": ObjectId(family_member_id)}, {"patient_id": 1})
+    if not member:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Family member not found"
+        )
+    return member
+
+
+async def _embedding_doc(db, kind: str, member: dict, family_member_id: str, embedding: List[float],
+                         data: bytes, filename: Optional[str], created_at: datetime, cropped: bool = False) -> dict:
+    doc = {
+        "family_member_id": family_member_id,
+        "patient_id": member["patient_id"],
+        "embedding": embedding,
+        "model_version": model_versions.CURRENT[kind],
+        "created_at": created_at
+    }
+    media_id = await save_media(db, kind, data, filename, {"family_member_id": family_member_id})
+    if media_id is not None:
+        doc["source_media_id"] = media_id
+        if cropped:
+            doc["cropped"] = True  # re-embed the retained media the same way
+    return doc
+
+
+async def _store_enrollment(db, kind: str, member: dict, family_member_id: str, files: List[UploadFile],
+                            payloads: List[bytes], extracted: list, failure_message: str,
+                            cropped: bool = False) -> FastJSONResponse:
+    """Insert every extracted embedding with one insert_many and report per file."""
+    now = datetime.utcnow()
+    docs = [
+        await _embedding_doc(db, kind, member, family_member_id, embedding, data, upload.filename, now, cropped)
+        for upload, data, (embedding, _) in zip(files, payloads, extracted) if embedding is not None
+    ]
+    inserted_ids = iter((await db[f"{kind}_embeddings"].insert_many(docs)).inserted_ids if docs else [])
+    
+    results = []
+    for upload, (embedding, reason) in zip(files, extracted):
+        if embedding is not None:
+            results.append({"filename": upload.filename, "embedding_id": str(next(inserted_ids))})
+        else:
+            results.append({"filename": upload.filename, "error": failure_message, "reason": reason})
+    return json_response({
+        "message": f"Registered {len(docs)} of {len(files)} files",
+        "registered": len(docs),
+        "results": results
+    })
+
+
 @router.post("/face/register")
 async def register_face(
     image: UploadFile = File(...),
     family_member_id: str = Form(...),
+    cropped: bool = Form(False),
     token_data: dict = Depends(verify_firebase_token)
 ):
-    """Register a face for a family member."""
+    """Register a face for a family member. Set cropped if the app already cut out the face."""
     db = get_database()
     
     # Verify family member exists
-    member = await db.family_members.find_one({"_id": ObjectId(family_member_id)})
+    member = await db.family_members.find_one({"_id": ObjectId(family_member_id)}, {"patient_id": 1})
     if not member:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -30,8 +133,14 @@ async def register_face(
         )
     
     # Read image and extract embedding
-    image_data = await image.read()
-    embedding = face_recognition_service.extract_embedding(image_data)
+    image_data = await read_image(image)
+    try:
+        embedding = await run_inference(face_recognition_service.extract_embedding, image_data, cropped)
+    except QualityRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"reason": e.reason, "message": str(e)}
+        )
     
     if embedding is None:
         raise HTTPException(
@@ -40,77 +149,72 @@ async def register_face(
         )
     
     # Store embedding
-    embedding_doc = {
-        "family_member_id": family_member_id,
-        "patient_id": member["patient_id"],
-        "embedding": embedding,
-        "created_at": datetime.utcnow()
-    }
+    embedding_doc = await _embedding_doc(
+        db, "face", member, family_member_id, embedding, image_data, image.filename, datetime.utcnow(), cropped
+    )
     
     result = await db.face_embeddings.insert_one(embedding_doc)
     
-    return {
+    return json_response({
         "message": "Face registered successfully",
         "embedding_id": str(result.inserted_id)
-    }
+    })
+
+
+@router.post("/face/register/bulk")
+async def register_faces_bulk(
+    images: List[UploadFile] = File(...),
+    family_member_id: str = Form(...),
+    cropped: bool = Form(False),
+    token_data: dict = Depends(verify_firebase_token)
+):
+    """Register many photos of one family member, embedded as a single batch."""
+    db = get_database()
+    member = await _enrollment_member(db, family_member_id, images)
+    
+    image_data = [await read_image(image) for image in images]
+    extracted = await run_inference(face_recognition_service.extract_embeddings, image_data, cropped)
+    return await _store_enrollment(
+        db, "face", member, family_member_id, images, image_data, extracted,
+        "Could not detect a face in the image", cropped
+    )
 
 
 @router.post("/face/recognize", response_model=RecognitionResult)
 async def recognize_face(
     image: UploadFile = File(...),
     patient_id: str = Form(...),
+    cropped: bool = Form(False),
     token_data: dict = Depends(verify_firebase_token)
 ):
-    """Recognize a face and return family member info."""
+    """Recognize a face and return family member info. Set cropped if the app already cut out the face."""
     db = get_database()
     
     # Read image and extract embedding
-    image_data = await image.read()
-    query_embedding = face_recognition_service.extract_embedding(image_data)
+    image_data = await read_image(image)
+    try:
+        query_embedding = await run_inference(face_recognition_service.extract_embedding, image_data, cropped)
+    except QualityRejected as e:
+        return json_response(RecognitionResult(recognized=False, confidence=0.0, rejection_reason=e.reason))
     
     if query_embedding is None:
-        return RecognitionResult(recognized=False, confidence=0.0)
+        return json_response(RecognitionResult(recognized=False, confidence=0.0))
     
     # Get all face embeddings for this patient's family
     stored_embeddings = await db.face_embeddings.find(
-        {"patient_id": patient_id}
+        {"patient_id": patient_id, **model_versions.version_filter("face")},
+        {"family_member_id": 1, "embedding": 1}
     ).to_list(1000)
     
     if not stored_embeddings:
-        return RecognitionResult(recognized=False, confidence=0.0)
+        return json_response(RecognitionResult(recognized=False, confidence=0.0))
     
     # Find best match
     match_id, confidence = face_recognition_service.find_match(
         query_embedding, stored_embeddings
     )
     
-    if match_id is None:
-        return RecognitionResult(recognized=False, confidence=confidence)
-    
-    # Get family member info
-    member = await db.family_members.find_one({"_id": ObjectId(match_id)})
-    if not member:
-        return RecognitionResult(recognized=False, confidence=confidence)
-    
-    # Get last conversation
-    last_conv = await db.conversations.find_one(
-        {"patient_id": patient_id, "family_member_id": match_id},
-        sort=[("created_at", -1)]
-    )
-    
-    last_conversation = None
-    if last_conv:
-        last_conv["_id"] = str(last_conv["_id"])
-        last_conversation = Conversation(**last_conv)
-    
-    return RecognitionResult(
-        recognized=True,
-        family_member_id=match_id,
-        family_member_name=member["name"],
-        relationship=member["relationship"],
-        confidence=confidence,
-        last_conversation=last_conversation
-    )
+    return json_response(await _recognition_result(db, patient_id, match_id, confidence))
 
 
 @router.post("/voice/register")
@@ -123,7 +227,7 @@ async def register_voice(
     db = get_database()
     
     # Verify family member exists
-    member = await db.family_members.find_one({"_id": ObjectId(family_member_id)})
+    member = await db.family_members.find_one({"_id": ObjectId(family_member_id)}, {"patient_id": 1})
     if not member:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -131,8 +235,14 @@ async def register_voice(
         )
     
     # Read audio and extract embedding
-    audio_data = await audio.read()
-    embedding = voice_recognition_service.extract_embedding(audio_data)
+    audio_data = await read_audio(audio)
+    try:
+        embedding = await run_inference(voice_recognition_service.extract_embedding, audio_data)
+    except QualityRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"reason": e.reason, "message": str(e)}
+        )
     
     if embedding is None:
         raise HTTPException(
@@ -141,19 +251,34 @@ async def register_voice(
         )
     
     # Store embedding
-    embedding_doc = {
-        "family_member_id": family_member_id,
-        "patient_id": member["patient_id"],
-        "embedding": embedding,
-        "created_at": datetime.utcnow()
-    }
+    embedding_doc = await _embedding_doc(
+        db, "voice", member, family_member_id, embedding, audio_data, audio.filename, datetime.utcnow()
+    )
     
     result = await db.voice_embeddings.insert_one(embedding_doc)
     
-    return {
+    return json_response({
         "message": "Voice registered successfully",
         "embedding_id": str(result.inserted_id)
-    }
+    })
+
+
+@router.post("/voice/register/bulk")
+async def register_voices_bulk(
+    audios: List[UploadFile] = File(...),
+    family_member_id: str = Form(...),
+    token_data: dict = Depends(verify_firebase_token)
+):
+    """Register many voice clips of one family member in one request."""
+    db = get_database()
+    member = await _enrollment_member(db, family_member_id, audios)
+    
+    audio_data = [await read_audio(audio) for audio in audios]
+    extracted = await run_inference(voice_recognition_service.extract_embeddings, audio_data)
+    return await _store_enrollment(
+        db, "voice", member, family_member_id, audios, audio_data, extracted,
+        "Could not extract voice features from audio"
+    )
 
 
 @router.post("/voice/recognize", response_model=RecognitionResult)
@@ -166,52 +291,184 @@ async def recognize_voice(
     db = get_database()
     
     # Read audio and extract embedding
-    audio_data = await audio.read()
-    query_embedding = voice_recognition_service.extract_embedding(audio_data)
+    audio_data = await read_audio(audio)
+    try:
+        query_embedding = await run_inference(voice_recognition_service.extract_embedding, audio_data)
+    except QualityRejected as e:
+        return json_response(RecognitionResult(recognized=False, confidence=0.0, rejection_reason=e.reason))
     
     if query_embedding is None:
-        return RecognitionResult(recognized=False, confidence=0.0)
+        return json_response(RecognitionResult(recognized=False, confidence=0.0))
     
     # Get all voice embeddings for this patient's family
     stored_embeddings = await db.voice_embeddings.find(
-        {"patient_id": patient_id}
+        {"patient_id": patient_id, **model_versions.version_filter("voice")},
+        {"family_member_id": 1, "embedding": 1}
     ).to_list(1000)
     
     if not stored_embeddings:
-        return RecognitionResult(recognized=False, confidence=0.0)
+        return json_response(RecognitionResult(recognized=False, confidence=0.0))
     
     # Find best match
     match_id, confidence = voice_recognition_service.find_match(
         query_embedding, stored_embeddings
     )
     
-    if match_id is None:
-        return RecognitionResult(recognized=False, confidence=confidence)
-    
-    # Get family member info
-    member = await db.family_members.find_one({"_id": ObjectId(match_id)})
-    if not member:
-        return RecognitionResult(recognized=False, confidence=confidence)
+    return json_response(await _recognition_result(db, patient_id, match_id, confidence))
+
+
+@router.websocket("/voice/stream")
+async def stream_voice(websocket: WebSocket):
+    """
+    Recognize a voice while it is being recorded.
+    
+    1. Client sends {"token": <Firebase ID token>, "patient_id": ..., "sample_rate": 16000}
+    2. Server replies {"type": "ready"}
+    3. Client sends binary frames of 16-bit little-endian mono PCM as it records;
+       the server answers each with {"type": "partial", "speech_seconds", "confidence"}
+    4. The server sends {"type": "result", ...RecognitionResult} and closes once a
+       match is confident, speech reaches VOICE_MAX_SPEECH_SECONDS, or the client
+       sends {"type": "end"}.
+    """
+    await websocket.accept()
+    db = get_database()
     
-    # Get last conversation
-    last_conv = await db.conversations.find_one(
-        {"patient_id": patient_id, "family_member_id": match_id},
-        sort=[("created_at", -1)]
+    try:
+        start = await asyncio.wait_for(websocket.receive_json(), settings.VOICE_STREAM_IDLE_TIMEOUT_SECONDS)
+        verify_token(start.get("token", ""))
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail[:120])
+        return
+    except (asyncio.TimeoutError, ValueError, KeyError, AttributeError, WebSocketDisconnect):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    patient_id = start.get("patient_id")
+    if not patient_id or start.get("sample_rate", SAMPLE_RATE) != SAMPLE_RATE:
+        await websocket.send_json({"type": "error", "message": f"patient_id and {SAMPLE_RATE} Hz PCM required"})
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        return
+    
+    # Load this patient's voices once; every chunk is matched against them in memory
+    gallery = EmbeddingGallery.from_documents(await db.voice_embeddings.find(
+        {"patient_id": patient_id, **model_versions.version_filter("voice")}, {"family_member_id": 1, "embedding": 1}
+    ).to_list(1000))
+    embedder = StreamingVoiceEmbedder()
+    await websocket.send_json({"type": "ready"})
+    
+    match_id, confidence = None, 0.0
+    try:
+        while not embedder.full:
+            message = await asyncio.wait_for(websocket.receive(), settings.VOICE_STREAM_IDLE_TIMEOUT_SECONDS)
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is None:
+                break  # {"type": "end"} or any other text frame finishes the stream
+            
+            await run_in_threadpool(embedder.feed_pcm16, message["bytes"])
+            embedding = embedder.embedding()
+            if embedding is not None:
+                match_id, confidence = gallery.best_match(embedding, voice_recognition_service.threshold)
+            await websocket.send_json({
+                "type": "partial",
+                "speech_seconds": round(embedder.speech_seconds, 2),
+                "confidence": confidence,
+            })
+            if (match_id is not None
+                    and confidence >= settings.VOICE_STREAM_CONFIDENT_THRESHOLD
+                    and embedder.speech_seconds >= settings.VOICE_STREAM_MIN_SPEECH_SECONDS):
+                break
+    except asyncio.TimeoutError:
+        pass
+    except WebSocketDisconnect:
+        return
+    
+    if embedder.embedding() is None:
+        result = RecognitionResult(recognized=False, confidence=0.0, rejection_reason=NO_SPEECH)
+    else:
+        result = await _recognition_result(db, patient_id, match_id, confidence if match_id else 0.0)
+    logger.info("Voice stream: %.2fs received, %.2fs speech, recognized=%s",
+                embedder.total_samples / SAMPLE_RATE, embedder.speech_seconds, result.recognized)
+    await websocket.send_json({"type": "result", **result.model_dump(mode="json")})
+    await websocket.close()
+
+
+async def _empty() -> list:
+    return []
+
+
+async def _extract_or_reject(extract, data: Optional[bytes], *args):
+    """(embedding, rejection_reason) for one modality; (None, None) when it was not sent."""
+    if not data:
+        return None, None
+    try:
+        return await run_inference(extract, data, *args), None
+    except QualityRejected as e:
+        return None, e.reason
+
+
+@router.post("/multimodal", response_model=MultimodalRecognitionResult)
+async def recognize_multimodal(
+    patient_id: str = Form(...),
+    image: Optional[UploadFile] = File(None),
+    audio: Optional[UploadFile] = File(None),
+    cropped: bool = Form(False),
+    token_data: dict = Depends(verify_firebase_token)
+):
+    """
+    Recognize a family member from a photo and/or a voice clip in one request.
+    Face and voice are extracted concurrently and their per-member scores,
+    each taken relative to its own recognition threshold, fused with
+    MULTIMODAL_FACE_WEIGHT / MULTIMODAL_VOICE_WEIGHT. A member missing from
+    a modality the request carries scores a miss there.
+    """
+    if image is None and audio is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Send an image, an audio clip, or both"
+        )
+    db = get_database()
+    image_data = await read_image(image) if image is not None else None
+    audio_data = await read_audio(audio) if audio is not None else None
+    
+    projection = {"family_member_id": 1, "embedding": 1}
+    (face_embedding, face_rejection), (voice_embedding, voice_rejection), face_docs, voice_docs = await asyncio.gather(
+        _extract_or_reject(face_recognition_service.extract_embedding, image_data, cropped),
+        _extract_or_reject(voice_recognition_service.extract_embedding, audio_data),
+        db.face_embeddings.find(
+            {"patient_id": patient_id, **model_versions.version_filter("face")}, projection
+        ).to_list(1000) if image_data else _empty(),
+        db.voice_embeddings.find(
+            {"patient_id": patient_id, **model_versions.version_filter("voice")}, projection
+        ).to_list(1000) if audio_data else _empty(),
     )
     
-    last_conversation = None
-    if last_conv:
-        last_conv["_id"] = str(last_conv["_id"])
-        last_conversation = Conversation(**last_conv)
-    
-    return RecognitionResult(
-        recognized=True,
-        family_member_id=match_id,
-        family_member_name=member["name"],
-        relationship=member["relationship"],
-        confidence=confidence,
-        last_conversation=last_conversation
-    )
+    face_scores = EmbeddingGallery.from_documents(face_docs).member_scores(face_embedding) if face_embedding else {}
+    voice_scores = EmbeddingGallery.from_documents(voice_docs).member_scores(voice_embedding) if voice_embedding else {}
+    # A modality counts when it was extracted and anyone is enrolled in it
+    modalities = [
+        (scores, weight, threshold) for scores, weight, threshold in (
+            (face_scores, settings.MULTIMODAL_FACE_WEIGHT, settings.FACE_RECOGNITION_THRESHOLD),
+            (voice_scores, settings.MULTIMODAL_VOICE_WEIGHT, settings.VOICE_RECOGNITION_THRESHOLD),
+        ) if scores
+    ]
+    fused = fuse_scores(modalities, settings.MULTIMODAL_THRESHOLD)
+    
+    match_id, confidence = None, 0.0
+    if fused:
+        best_id = max(fused, key=fused.get)
+        if fused[best_id] >= settings.MULTIMODAL_THRESHOLD:
+            match_id, confidence = best_id, fused[best_id]
+    
+    result = await _recognition_result(db, patient_id, match_id, confidence)
+    return json_response(MultimodalRecognitionResult(
+        **result.model_dump(exclude={"rejection_reason"}),
+        rejection_reason=None if (face_embedding or voice_embedding) else (face_rejection or voice_rejection),
+        face_confidence=face_scores.get(match_id) if match_id else None,
+        voice_confidence=voice_scores.get(match_id) if match_id else None,
+        face_rejection_reason=face_rejection,
+        voice_rejection_reason=voice_rejection,
+    ))
 
 
 @router.post("/greeting")
@@ -219,22 +476,36 @@ async def get_recognition_greeting(
     family_member_id: str = Form(...),
     token_data: dict = Depends(verify_firebase_token)
 ):
-    """Generate a greeting message for a recognized family member."""
+    """
+    Greeting message for a recognized family member.
+    
+    Served from the greeting precomputed in the background when it is still
+    current (no conversation since); generated live otherwise.
+    """
     db = get_database()
     
-    member = await db.family_members.find_one({"_id": ObjectId(family_member_id)})
+    member, last_conv, precomputed = await asyncio.gather(
+        db.family_members.find_one({"_id": ObjectId(family_member_id)}, {"name": 1, "relationship": 1}),
+        db.conversations.find_one(
+            {"family_member_id": family_member_id},
+            {"summary": 1},
+            sort=[("created_at", -1)]
+        ),
+        db.greetings.find_one({"_id": family_member_id}),
+    )
     if not member:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Family member not found"
         )
     
-    # Get last conversation
-    last_conv = await db.conversations.find_one(
-        {"family_member_id": family_member_id},
-        sort=[("created_at", -1)]
-    )
+    last_conv_id = str(last_conv["_id"]) if last_conv else None
+    if precomputed is not None and precomputed.get("conversation_id") == last_conv_id:
+        return json_response({"greeting": precomputed["greeting"]})
     
+    if gemini_service.available:
+        await enqueue(db, "greeting_precompute", {"family_member_id": family_member_id},
+                      dedupe_key=f"greeting:{family_member_id}")
     last_summary = last_conv["summary"] if last_conv else None
     
     greeting = await gemini_service.generate_recognition_greeting(
@@ -243,4 +514,4 @@ async def get_recognition_greeting(
         last_conversation_summary=last_summary
     )
     
-    return {"greeting": greeting}
+    return json_response({"greeting": greeting})
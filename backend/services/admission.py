@@ -0,0 +1,287 @@
+"""
+Admission control: per-caller rate limits and an inference concurrency cap.
+
+Every request is put in a route class - "inference" (face/voice embedding),
+"llm" (Gemini calls) or "default" - and charged one token from the bucket of
+(caller, class). Buckets refill at RATE_LIMIT_<CLASS>_PER_MINUTE up to
+RATE_LIMIT_<CLASS>_BURST. The caller is a hash of the bearer token, or the
+client address when there is none. The token is not verified here (auth runs
+later, in the route), so its claims cannot be trusted: keying by the uid in
+it would let anyone drain another user's buckets with forged tokens. A
+user's buckets start over when the app refreshes their ID token (hourly).
+Rate limit rejections are immediate 429s with Retry-After, before the body
+is read; a WebSocket is charged once, when it connects.
+
+Embedding extraction additionally needs one of INFERENCE_MAX_CONCURRENT
+slots in this process: routes run it through run_inference, which waits at
+most INFERENCE_QUEUE_TIMEOUT_SECONDS for a slot and answers 429 otherwise.
+The slot covers the model call only - not the upload, which is read first,
+nor a voice stream's whole session.
+
+Buckets live in process memory (RATE_LIMIT_BACKEND=memory), so with several
+workers each one enforces the limit separately; RATE_LIMIT_BACKEND=mongo
+keeps them in the rate_limits collection, shared by all workers, at the cost
+of one round-trip per request.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from fastapi import Request, status
+from fastapi.concurrency import run_in_threadpool
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+from config import get_settings
+from services.memory import deep_sizeof, register_cache
+from services.serialization import dumps, json_response
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+INFERENCE = "inference"
+LLM = "llm"
+DEFAULT = "default"
+
+# (method, path prefix) -> class; first match wins, "*" matches any method
+ROUTE_CLASSES = [
+    ("POST", "/recognition/greeting", LLM),
+    ("POST", "/conversations/summarize", LLM),
+    ("POST", "/conversations/transcript", LLM),
+    ("*", "/recognition/face/", INFERENCE),
+    ("*", "/recognition/voice/", INFERENCE),
+    ("POST", "/recognition/multimodal", INFERENCE),
+    ("POST", "/auth/patient-face-login", INFERENCE),
+]
+EXEMPT_PATHS = ("/", "/health", "/health/startup", "/docs", "/openapi.json")
+
+
+def route_class(method: str, path: str) -> str:
+    for route_method, prefix, cls in ROUTE_CLASSES:
+        if (route_method == "*" or route_method == method) and path.startswith(prefix):
+            return cls
+    return DEFAULT
+
+
+def _limits(cls: str) -> Tuple[float, float]:
+    """(tokens per second, burst) for a route class."""
+    per_minute = getattr(settings, f"RATE_LIMIT_{cls.upper()}_PER_MINUTE")
+    burst = getattr(settings, f"RATE_LIMIT_{cls.upper()}_BURST")
+    return per_minute / 60.0, float(burst)
+
+
+def caller_key(scope: Scope) -> str:
+    """Hash of the bearer token, else the client address."""
+    authorization = Headers(scope=scope).get("authorization", "")
+    token = authorization[7:].strip() if authorization[:7].lower() == "bearer " else ""
+    if token:
+        return "token:" + hashlib.sha256(token.encode()).hexdigest()[:32]
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class MemoryBuckets:
+    """Token buckets in this process, least recently used dropped beyond max_keys."""
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+    
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        """0 if a token was taken, else seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate if rate > 0 else 60.0
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+    
+    def memory_stats(self) -> dict:
+        return {"entries": len(self._buckets), "bytes": deep_sizeof(self._buckets), "budget_bytes": None}
+    
+    def shrink(self, fraction: float) -> int:
+        # A dropped bucket comes back full: shrinking forgives some recent usage
+        drop = int(len(self._buckets) * fraction)
+        for _ in range(drop):
+            self._buckets.popitem(last=False)
+        return drop
+
+
+class MongoBuckets:
+    """Token buckets in the rate_limits collection, updated atomically by one pipeline update."""
+    def __init__(self, get_db):
+        self.get_db = get_db
+    
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        now = datetime.utcnow()
+        elapsed_seconds = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        try:
+            doc = await self.get_db().rate_limits.find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {"tokens": {"$min": [burst, {"$add": [
+                        {"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed_seconds, rate]}
+                    ]}]}}},
+                    {"$set": {"admitted": {"$gte": ["$tokens", 1]}}},
+                    {"$set": {
+                        "tokens": {"$cond": ["$admitted", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                        "updated_at": now,
+                        # a bucket left alone this long is full again and can go
+                        "expires_at": now + timedelta(seconds=burst / rate if rate > 0 else 3600),
+                    }},
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except PyMongoError as e:
+            # Fail open: a database hiccup should not turn into rejected requests
+            logger.warning("Rate limit check failed, admitting: %s", e)
+            return 0.0
+        if doc["admitted"]:
+            return 0.0
+        return (1 - doc["tokens"]) / rate if rate > 0 else 60.0
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: float, detail: str):
+        super().__init__(detail)
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+def _retry_after_header(retry_after: float) -> str:
+    return str(max(1, math.ceil(retry_after)))
+
+
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return json_response(
+        {"detail": exc.detail, "retry_after": round(exc.retry_after, 1)},
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": _retry_after_header(exc.retry_after)},
+    )
+
+
+class AdmissionController:
+    def __init__(self, buckets, inference_slots: int, queue_timeout: float):
+        self.buckets = buckets
+        self.inference_slots = inference_slots
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.admitted: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+    
+    def _count(self, counter: Dict[str, int], label: str):
+        counter[label] = counter.get(label, 0) + 1
+    
+    async def admit(self, key: str, cls: str) -> Optional[Tuple[float, str]]:
+        """None when the request may proceed, else (seconds to retry after, reason)."""
+        rate, burst = _limits(cls)
+        wait = await self.buckets.take(f"{cls}:{key}", rate, burst)
+        if wait > 0:
+            self._count(self.rejected, f"{cls}:rate")
+            return wait, "Too many requests"
+        self._count(self.admitted, cls)
+        return None
+    
+    @asynccontextmanager
+    async def inference_slot(self):
+        """Hold one of the inference slots; raises Overloaded when none frees up in time."""
+        if not settings.RATE_LIMIT_ENABLED:
+            yield
+            return
+        if not await self._acquire_inference():
+            self._count(self.rejected, f"{INFERENCE}:busy")
+            raise Overloaded(1.0, "Server busy, try again shortly")
+        try:
+            yield
+        finally:
+            self.release_inference()
+    
+    async def _acquire_inference(self) -> bool:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.inference_slots)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except TimeoutError:
+            return False
+        self.in_flight += 1
+        return True
+    
+    def release_inference(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+    
+    def stats(self) -> dict:
+        return {
+            "backend": settings.RATE_LIMIT_BACKEND,
+            "inference_in_flight": self.in_flight,
+            "inference_slots": self.inference_slots,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+def _buckets():
+    if settings.RATE_LIMIT_BACKEND == "mongo":
+        from database import get_database
+        return MongoBuckets(get_database)
+    buckets = MemoryBuckets()
+    register_cache("rate_limit_buckets", buckets)
+    return buckets
+
+
+admission = AdmissionController(
+    _buckets(), settings.INFERENCE_MAX_CONCURRENT, settings.INFERENCE_QUEUE_TIMEOUT_SECONDS
+)
+
+
+async def run_inference(func, *args):
+    """Run a blocking embedding extraction in the threadpool while holding an inference slot."""
+    async with admission.inference_slot():
+        return await run_in_threadpool(func, *args)
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def _reject(self, scope: Scope, send: Send, retry_after: float, detail: str):
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1013, "reason": detail})  # Try Again Later
+            return
+        body = dumps({"detail": detail, "retry_after": round(retry_after, 1)})
+        await send({"type": "http.response.start", "status": 429, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", _retry_after_header(retry_after).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            not settings.RATE_LIMIT_ENABLED
+            or scope["type"] not in ("http", "websocket")
+            or scope.get("method") == "OPTIONS"
+            or scope["path"] in EXEMPT_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+    
+        cls = route_class(scope.get("method", "*"), scope["path"])
+        rejection = await admission.admit(caller_key(scope), cls)
+        if rejection is not None:
+            await self._reject(scope, send, *rejection)
+            return
+        await self.app(scope, receive, send)
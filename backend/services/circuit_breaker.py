@@ -0,0 +1,80 @@
+"""
+Circuit breaker for calls to an upstream service.
+
+Closed: calls go through and consecutive failures are counted. After
+`failure_threshold` of them the breaker opens and callers skip the upstream
+(and use their fallback) for `reset_seconds`. Then it is half-open: one probe
+call is let through; its success closes the breaker, its failure opens it
+again for another `reset_seconds`.
+
+Used from the event loop only, so the state needs no lock.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.state_since = datetime.utcnow()
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._probe_in_flight = False
+    
+    def _transition(self, state: str):
+        if state != self.state:
+            logger.warning("Circuit breaker %s: %s -> %s", self.name, self.state, state)
+            self.state = state
+            self.state_since = datetime.utcnow()
+    
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; callers that get False use their fallback."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.short_circuited += 1
+        return False
+    
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        self._transition(CLOSED)
+    
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+    
+    def release(self):
+        """The allowed call ended without an outcome (e.g. the request was cancelled)."""
+        self._probe_in_flight = False
+    
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "state_since": self.state_since,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited,
+        }
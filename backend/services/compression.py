@@ -0,0 +1,130 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+Brotli is preferred when the `brotli` package is installed (the
+`compression` dependency group) and the client accepts it; gzip otherwise.
+Bodies under COMPRESSION_MIN_BYTES, media, 304s and responses that already
+carry a Content-Encoding pass through untouched. Streaming responses
+(NDJSON listings) are compressed chunk by chunk with a flush after each, so
+lines still reach the client as they are produced. Large single bodies are
+compressed on a worker thread. ETags already name the negotiated coding
+(services/conditional.py), so they pass through unchanged.
+"""
+import zlib
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import get_settings
+
+try:
+    import brotli
+except ImportError:  # optional: uv sync --group compression
+    brotli = None
+
+settings = get_settings()
+
+UNCOMPRESSED_TYPES = ("image/", "audio/", "video/", "application/zip", "application/gzip")
+THREAD_MIN_BYTES = 128 * 1024
+
+
+def _accepted(accept_encoding: str) -> set:
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    return accepted
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+    
+        start: Optional[Message] = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+    
+        async def send_compressed(message: Message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    message["status"] < 200 or message["status"] in (204, 206, 304)
+                    or "content-encoding" in headers
+                    or content_type.startswith(UNCOMPRESSED_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message  # held until the first body chunk decides
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+    
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = _Encoder(encoding)
+                headers["Content-Encoding"] = encoding
+                del headers["Content-Length"]
+                await send(start)
+                start = None
+    
+            if len(body) >= THREAD_MIN_BYTES:
+                compressed = await run_in_threadpool(encoder.compress, body, not more_body)
+            else:
+                compressed = encoder.compress(body, not more_body)
+            await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+    
+        await self.app(scope, receive, send_compressed)
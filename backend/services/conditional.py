@@ -0,0 +1,128 @@
+"""
+Conditional GET for versioned read endpoints.
+
+    @router.get("/patient/{patient_id}", dependencies=[Depends(conditional(family_key, "patient_id"))])
+
+The dependency authenticates the caller, looks up the resource's version
+counter and derives a strong ETag from it, the query string and the
+requested representation. A matching If-None-Match (or, without one, an
+If-Modified-Since at or after the last write) raises NotModified, answered
+as a bodiless 304 before the handler queries or serializes anything.
+Otherwise ConditionalHeadersMiddleware adds ETag and Last-Modified to the
+200 response.
+
+Each content coding is a representation of its own with its own strong
+validator: the ETag ends in the coding CompressionMiddleware negotiates for
+the request ("...-gzip", "...-br"), and If-None-Match must name that exact
+tag. The suffix follows the request's Accept-Encoding alone, so a client
+gets the same tag even when a small body goes out uncompressed. `If-None-Match: *`
+only matches a resource that has been written (version > 0); otherwise the
+handler runs and answers for itself (404 for a missing patient).
+"""
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Dict, Optional
+from fastapi import Depends, Request
+from fastapi.responses import Response
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from auth import verify_firebase_token
+from database import get_database
+from services.compression import negotiate
+from services.resource_versions import resource_versions
+
+# Bump when response layouts change so clients drop validators from older releases
+REPRESENTATION_VERSION = 1
+STATE_KEY = "conditional_headers"
+
+
+class NotModified(Exception):
+    def __init__(self, headers: Dict[str, str]):
+        self.headers = headers
+
+
+async def not_modified_handler(request: Request, exc: NotModified) -> Response:
+    return Response(status_code=304, headers=exc.headers)
+
+
+def _etag(key: str, version: int, request: Request) -> str:
+    variant = "&".join(sorted(f"{name}={value}" for name, value in request.query_params.multi_items()))
+    ndjson = "application/x-ndjson" in request.headers.get("accept", "")
+    digest = hashlib.sha1(f"{REPRESENTATION_VERSION}|{key}|{variant}|{ndjson}".encode()).hexdigest()[:16]
+    encoding = negotiate(request.headers.get("accept-encoding", ""))
+    return f'"{version}-{digest}-{encoding}"' if encoding else f'"{version}-{digest}"'
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag  # If-None-Match uses weak comparison
+
+
+def _matches(if_none_match: str, etag: str, written: bool) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags:
+        return written
+    return any(_opaque_tag(tag) == etag for tag in tags)
+
+
+def _not_modified_since(if_modified_since: str, updated_at) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return updated_at.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+
+def conditional(key_for: Callable[[str], str], path_param: str):
+    """Dependency making a GET route conditional on the version of key_for(path_param)."""
+    async def check(request: Request, token_data: dict = Depends(verify_firebase_token)):
+        key = key_for(request.path_params[path_param])
+        version, updated_at = await resource_versions.get(get_database(), key)
+        etag = _etag(key, version, request)
+        # The ETag depends on both negotiations, so caches must key on them for the 200 and the 304 alike
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept, Accept-Encoding"}
+        if updated_at is not None:
+            headers["Last-Modified"] = format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+    
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            if _matches(if_none_match, etag, version > 0):
+                raise NotModified(headers)
+        elif updated_at is not None and request.headers.get("if-modified-since"):
+            if _not_modified_since(request.headers["if-modified-since"], updated_at):
+                raise NotModified(headers)
+    
+        setattr(request.state, STATE_KEY, headers)
+    
+    return check
+
+
+class ConditionalHeadersMiddleware:
+    """Adds the validators computed by `conditional` to successful responses."""
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+    
+        async def send_with_validators(message: Message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                validators: Optional[dict] = scope.get("state", {}).get(STATE_KEY)
+                if validators:
+                    headers = MutableHeaders(raw=message["headers"])
+                    for name, value in validators.items():
+                        if name == "Vary":
+                            present = {token.strip().lower() for token in headers.get("vary", "").split(",")}
+                            for token in value.split(", "):
+                                if token.lower() not in present:
+                                    headers.add_vary_header(token)
+                        else:
+                            headers[name] = value
+            await send(message)
+    
+        await self.app(scope, receive, send_with_validators)
@@ -0,0 +1,326 @@
+"""
+In-memory BM25 search over conversation summaries and topics, per patient.
+
+Each patient's index is built from Mongo the first time it is searched, kept
+in memory, and snapshotted to SEARCH_INDEX_DIR so a restart loads it from
+disk instead of rereading the collection. Snapshots are written in the
+threadpool at most every SEARCH_INDEX_SAVE_DELAY_SECONDS, so a burst of new
+conversations costs one write; a snapshot that lags behind only means a
+longer catch-up read when it is loaded. New conversations are added when
+they are created; before answering, a search also picks up anything newer
+than the last indexed conversation (an index range read on patient_id,
+created_at), which covers conversations written through other workers.
+
+Loaded indexes are kept up to SEARCH_INDEX_MAX_BYTES in total; past that the
+least recently searched are dropped from memory, to be reloaded from their
+snapshot on the next search.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import sys
+import tempfile
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from config import get_settings
+from services.memory import deep_sizeof, register_cache
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Bump when tokenization or the snapshot layout changes; older snapshots are rebuilt
+INDEX_VERSION = 1
+
+K1 = 1.2
+B = 0.75
+TOPIC_WEIGHT = 2  # a topic tag counts as much as two mentions in the summary
+
+# What one more key adds to a dict, averaged over its hash table's growth
+DICT_ENTRY_BYTES = 32
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "did", "do", "for", "from", "had", "has",
+    "have", "he", "her", "his", "i", "in", "is", "it", "its", "me", "my", "of", "on", "or", "our",
+    "she", "so", "that", "the", "their", "them", "they", "this", "to", "was", "we", "were", "what",
+    "when", "with", "you", "your", "about", "talk", "talked", "talking",
+}
+SUFFIXES = ("ing", "ed", "es", "s")
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _stem(word: str) -> str:
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(word) for word in TOKEN.findall(text.lower()) if word not in STOPWORDS]
+
+
+def _term_frequencies(summary: str, topics: List[str]) -> Dict[str, int]:
+    counts = Counter(tokenize(summary))
+    for topic in topics:
+        for term in tokenize(topic):
+            counts[term] += TOPIC_WEIGHT
+    return dict(counts)
+
+
+class PatientIndex:
+    def __init__(self, patient_id: str):
+        self.patient_id = patient_id
+        self.docs: Dict[str, dict] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+        # Newest conversation indexed, as (created_at, _id) - where catch-up reads resume
+        self.watermark: Optional[tuple] = None
+        # Kept up to date by add(); measure() recounts everything
+        self.size_bytes = 0
+
+    def measure(self) -> int:
+        """Estimate the memory held by the index from scratch (walks every object; slow)."""
+        self.size_bytes = deep_sizeof(self.docs) + deep_sizeof(self.postings)
+        return self.size_bytes
+
+    def add(self, conversation: dict) -> bool:
+        doc_id = str(conversation["_id"])
+        if doc_id in self.docs:
+            return False
+        terms = _term_frequencies(conversation.get("summary", ""), conversation.get("topics", []))
+        # Mongo keeps milliseconds; match it so catch-up reads compare equal
+        created_at = conversation["created_at"]
+        created_at = created_at.replace(microsecond=created_at.microsecond // 1000 * 1000)
+        doc = self.docs[doc_id] = {
+            "family_member_id": conversation.get("family_member_id"),
+            "summary": conversation.get("summary", ""),
+            "topics": conversation.get("topics", []),
+            "created_at": created_at,
+            "length": sum(terms.values()),
+            "terms": terms,
+        }
+        size = deep_sizeof(doc) + sys.getsizeof(doc_id) + DICT_ENTRY_BYTES
+        for term, count in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                size += sys.getsizeof(postings) + sys.getsizeof(term) + DICT_ENTRY_BYTES
+            postings[doc_id] = count
+            size += DICT_ENTRY_BYTES
+        self.size_bytes += size
+        self.total_length += doc["length"]
+        if self.watermark is None or (created_at, doc_id) > self.watermark:
+            self.watermark = (created_at, doc_id)
+        return True
+
+    def search(self, query: str, limit: int) -> List[dict]:
+        if not self.docs:
+            return []
+        n = len(self.docs)
+        average_length = self.total_length / n or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                length = self.docs[doc_id]["length"]
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (
+                    tf + K1 * (1 - B + B * length / average_length)
+                )
+        # Best score first; among equal scores the more recent conversation
+        ranked = sorted(scores.items(), key=lambda item: (item[1], self.docs[item[0]]["created_at"]), reverse=True)
+        results = []
+        for doc_id, score in ranked[:limit]:
+            doc = self.docs[doc_id]
+            results.append({
+                "_id": doc_id,
+                "patient_id": self.patient_id,
+                "family_member_id": doc["family_member_id"],
+                "summary": doc["summary"],
+                "topics": doc["topics"],
+                "created_at": doc["created_at"],
+                "score": round(score, 4),
+            })
+        return results
+
+    @staticmethod
+    def to_snapshot(patient_id: str, docs: List[tuple]) -> dict:
+        """Snapshot from a copy of an index's docs.items() (docs are never modified once added)."""
+        return {
+            "version": INDEX_VERSION,
+            "patient_id": patient_id,
+            "docs": {
+                doc_id: {
+                    "family_member_id": doc["family_member_id"],
+                    "summary": doc["summary"],
+                    "topics": doc["topics"],
+                    "created_at": doc["created_at"].isoformat(),
+                }
+                for doc_id, doc in docs
+            },
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict) -> Optional["PatientIndex"]:
+        if snapshot.get("version") != INDEX_VERSION:
+            return None
+        index = cls(snapshot["patient_id"])
+        for doc_id, doc in snapshot["docs"].items():
+            index.add({**doc, "_id": doc_id, "created_at": datetime.fromisoformat(doc["created_at"])})
+        return index
+
+
+class ConversationSearch:
+    def __init__(self, directory: str, max_bytes: int, save_delay: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.save_delay = save_delay
+        # Indexes changed since their last snapshot, by patient id
+        self._dirty: Dict[str, PatientIndex] = {}
+        self._save_task: Optional[asyncio.Task] = None
+        # least recently searched first
+        self._indexes: "OrderedDict[str, PatientIndex]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.evictions = 0
+
+    def _path(self, patient_id: str) -> str:
+        # patient ids are ObjectId hex strings; keep anything else out of the path
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_-]", "_", patient_id) + ".json")
+
+    def _read_snapshot(self, patient_id: str) -> Optional[PatientIndex]:
+        try:
+            with open(self._path(patient_id)) as f:
+                index = PatientIndex.from_snapshot(json.load(f))
+            # Off the event loop here, so the full estimate is affordable
+            if index is not None:
+                index.measure()
+            return index
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning("Rebuilding search index for patient %s: %s", patient_id, e)
+            return None
+
+    def _write_snapshot(self, patient_id: str, docs: List[tuple]):
+        snapshot = PatientIndex.to_snapshot(patient_id, docs)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(patient_id)
+        # A temp file of its own: other workers may be writing the same patient's snapshot
+        tmp = tempfile.NamedTemporaryFile(
+            "w", dir=self.directory, prefix=os.path.basename(path) + ".", suffix=".tmp", delete=False
+        )
+        try:
+            with tmp:
+                json.dump(snapshot, tmp)
+            os.replace(tmp.name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp.name)
+            except OSError:
+                pass
+            raise
+
+    def _schedule_save(self, index: PatientIndex):
+        """Snapshot the index within save_delay; changes in the meantime share the write."""
+        self._dirty[index.patient_id] = index
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        while self._dirty:
+            await asyncio.sleep(self.save_delay)
+            await self.flush()
+
+    async def flush(self):
+        """Write the snapshots of every changed index now."""
+        dirty, self._dirty = self._dirty, {}
+        for index in dirty.values():
+            # Copying the list is all that happens on the event loop; building and writing the JSON does not
+            docs = list(index.docs.items())
+            try:
+                await run_in_threadpool(self._write_snapshot, index.patient_id, docs)
+            except OSError as e:
+                logger.warning("Could not save search index for patient %s: %s", index.patient_id, e)
+
+    async def close(self):
+        if self._save_task is not None:
+            self._save_task.cancel()
+            await asyncio.gather(self._save_task, return_exceptions=True)
+            self._save_task = None
+        await self.flush()
+
+    async def _catch_up(self, db, index: PatientIndex) -> int:
+        """Index conversations newer than the watermark; returns how many were added."""
+        query = {"patient_id": index.patient_id}
+        if index.watermark is not None:
+            query["created_at"] = {"$gte": index.watermark[0]}
+        added = 0
+        async for conversation in db.conversations.find(
+            query, {"family_member_id": 1, "summary": 1, "topics": 1, "created_at": 1}
+        ):
+            added += index.add(conversation)
+        return added
+
+    async def _index_for(self, db, patient_id: str) -> PatientIndex:
+        lock = self._locks.setdefault(patient_id, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(patient_id)
+            if index is None:
+                index = await run_in_threadpool(self._read_snapshot, patient_id) or PatientIndex(patient_id)
+                self._indexes[patient_id] = index
+            self._indexes.move_to_end(patient_id)
+            if await self._catch_up(db, index):
+                self._schedule_save(index)
+            self._evict(self.max_bytes, keep=patient_id)
+            return index
+
+    async def search(self, db, patient_id: str, query: str, limit: int = 20) -> List[dict]:
+        index = await self._index_for(db, patient_id)
+        return index.search(query, limit)
+
+    async def add(self, conversation: dict):
+        """Index a newly created conversation if its patient's index is loaded."""
+        index = self._indexes.get(conversation["patient_id"])
+        if index is not None and index.add(conversation):
+            self._schedule_save(index)
+            self._evict(self.max_bytes, keep=index.patient_id)
+
+    def _evict(self, max_bytes: int, keep: Optional[str] = None) -> int:
+        """Drop least recently searched indexes until the rest fit in max_bytes."""
+        total = sum(index.size_bytes for index in self._indexes.values())
+        dropped = 0
+        for patient_id in list(self._indexes):
+            if total <= max_bytes:
+                break
+            if patient_id == keep:
+                continue
+            total -= self._indexes.pop(patient_id).size_bytes
+            lock = self._locks.get(patient_id)
+            if lock is not None and not lock.locked():
+                del self._locks[patient_id]
+            dropped += 1
+        self.evictions += dropped
+        return dropped
+
+    def memory_stats(self) -> dict:
+        return {
+            "entries": len(self._indexes),
+            "bytes": sum(index.size_bytes for index in self._indexes.values()),
+            "budget_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+    def shrink(self, fraction: float) -> int:
+        return self._evict(int(self.memory_stats()["bytes"] * (1 - fraction)))
+
+
+conversation_search = ConversationSearch(
+    settings.SEARCH_INDEX_DIR, settings.SEARCH_INDEX_MAX_BYTES, settings.SEARCH_INDEX_SAVE_DELAY_SECONDS
+)
+register_cache("conversation_search", conversation_search)
@@ -0,0 +1,56 @@
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from services.conversation_search import conversation_search
+from services.jobs import enqueue
+from services.resource_versions import member_conversations_key, patient_conversations_key, resource_versions
+
+
+async def record_conversation(
+    db,
+    patient_id: str,
+    family_member_id: str,
+    summary: str,
+    topics: List[str],
+    conversation_id: Optional[ObjectId] = None
+) -> dict:
+    """
+    Store a conversation, index it for search, invalidate cached listings and refresh the greeting.
+    
+    With conversation_id the insert is idempotent: recording the same id again
+    returns the conversation stored the first time.
+    """
+    conv_doc = {
+        "patient_id": patient_id,
+        "family_member_id": family_member_id,
+        "summary": summary,
+        "topics": topics,
+        "created_at": datetime.utcnow()
+    }
+    
+    if conversation_id is None:
+        result = await db.conversations.insert_one(conv_doc)
+        conv_doc["_id"] = str(result.inserted_id)
+    else:
+        conv_doc = await db.conversations.find_one_and_update(
+            {"_id": conversation_id},
+            {"$setOnInsert": conv_doc},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        conv_doc["_id"] = str(conv_doc["_id"])
+    await asyncio.gather(
+        conversation_search.add(conv_doc),
+        resource_versions.bump(
+            db,
+            patient_conversations_key(patient_id),
+            member_conversations_key(family_member_id)
+        ),
+        enqueue(
+            db, "greeting_precompute", {"family_member_id": family_member_id},
+            dedupe_key=f"greeting:{family_member_id}"
+        ),
+    )
+    return conv_doc
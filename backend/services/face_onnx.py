@@ -0,0 +1,326 @@
+"""
+ONNX Runtime backend for Facenet512 face embeddings.
+
+Runs the same Facenet512 weights DeepFace uses, exported once to ONNX, so
+the API needs neither TensorFlow nor tf-keras at runtime. Detection and
+alignment reproduce DeepFace's "opencv" detector pipeline (Haar cascades,
+eye-based rotation, 160x160 letterbox) with plain OpenCV and Pillow, which
+keeps embeddings compatible with the ones already stored.
+
+    # one-off export (needs deepface + tf2onnx, i.e. the TensorFlow stack)
+    uv run python -m services.face_onnx export --output models/facenet512.onnx
+
+    # check ONNX embeddings against DeepFace on real photos
+    uv run python -m services.face_onnx parity photos/*.jpg
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+from lazy_imports import lazy_import
+from services.memory import track_memory
+
+logger = logging.getLogger(__name__)
+
+TARGET_SIZE = (160, 160)
+EMBEDDING_DIM = 512
+
+
+class OpenCvFaceDetector:
+    """Haar cascade detector with the same parameters as DeepFace's OpenCvClient."""
+
+    def __init__(self):
+        cv2 = lazy_import("cv2")
+        data_dir = os.path.join(os.path.dirname(cv2.__file__), "data")
+        self.face_cascade = cv2.CascadeClassifier(os.path.join(data_dir, "haarcascade_frontalface_default.xml"))
+        self.eye_cascade = cv2.CascadeClassifier(os.path.join(data_dir, "haarcascade_eye.xml"))
+
+    def find_eyes(self, face_img: np.ndarray) -> Tuple[Optional[tuple], Optional[tuple]]:
+        cv2 = lazy_import("cv2")
+        if face_img.shape[0] == 0 or face_img.shape[1] == 0:
+            return None, None
+
+        gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+        eyes = self.eye_cascade.detectMultiScale(gray, 1.1, 10)
+        # Haar finds spurious eyes; keep the two largest
+        eyes = sorted(eyes, key=lambda v: abs(v[2] * v[3]), reverse=True)
+        if len(eyes) < 2:
+            return None, None
+
+        eye_1, eye_2 = eyes[0], eyes[1]
+        right_eye, left_eye = (eye_1, eye_2) if eye_1[0] < eye_2[0] else (eye_2, eye_1)
+        left_eye = (int(left_eye[0] + left_eye[2] / 2), int(left_eye[1] + left_eye[3] / 2))
+        right_eye = (int(right_eye[0] + right_eye[2] / 2), int(right_eye[1] + right_eye[3] / 2))
+        return left_eye, right_eye
+
+    def detect(self, img: np.ndarray) -> List[dict]:
+        try:
+            faces, _, scores = self.face_cascade.detectMultiScale3(img, 1.1, 10, outputRejectLevels=True)
+        except Exception:
+            return []
+
+        regions = []
+        for (x, y, w, h), score in zip(faces, scores):
+            left_eye, right_eye = self.find_eyes(img[int(y):int(y + h), int(x):int(x + w)])
+            if left_eye is not None:
+                left_eye = (int(x + left_eye[0]), int(y + left_eye[1]))
+            if right_eye is not None:
+                right_eye = (int(x + right_eye[0]), int(y + right_eye[1]))
+            regions.append({
+                "x": int(x), "y": int(y), "w": int(w), "h": int(h),
+                "left_eye": left_eye, "right_eye": right_eye,
+                "confidence": (100 - float(score)) / 100,
+            })
+        return regions
+
+
+def _align_wrt_eyes(img: np.ndarray, left_eye, right_eye) -> Tuple[np.ndarray, float]:
+    if left_eye is None or right_eye is None or img.shape[0] == 0 or img.shape[1] == 0:
+        return img, 0
+    Image = lazy_import("PIL.Image")
+    angle = float(np.degrees(np.arctan2(left_eye[1] - right_eye[1], left_eye[0] - right_eye[0])))
+    return np.array(Image.fromarray(img).rotate(angle, resample=Image.BICUBIC)), angle
+
+
+def _project_facial_area(facial_area: tuple, angle: float, size: tuple) -> tuple:
+    direction = 1 if angle >= 0 else -1
+    angle = abs(angle) % 360
+    if angle == 0:
+        return facial_area
+
+    angle = angle * np.pi / 180
+    height, width = size
+    x = (facial_area[0] + facial_area[2]) / 2 - width / 2
+    y = (facial_area[1] + facial_area[3]) / 2 - height / 2
+    x_new = x * np.cos(angle) + y * direction * np.sin(angle) + width / 2
+    y_new = -x * direction * np.sin(angle) + y * np.cos(angle) + height / 2
+
+    half_w = (facial_area[2] - facial_area[0]) / 2
+    half_h = (facial_area[3] - facial_area[1]) / 2
+    return (
+        max(int(x_new - half_w), 0),
+        max(int(y_new - half_h), 0),
+        min(int(x_new + half_w), width),
+        min(int(y_new + half_h), height),
+    )
+
+
+def extract_faces(img: np.ndarray, detector: OpenCvFaceDetector) -> List[dict]:
+    """
+    Detect and align faces in a BGR image the way DeepFace.extract_faces does
+    with detector_backend="opencv", align=True, enforce_detection=False.
+    """
+    cv2 = lazy_import("cv2")
+    height, width = img.shape[:2]
+
+    # Black border so rotation does not push faces near the edge out of frame
+    height_border, width_border = int(0.5 * height), int(0.5 * width)
+    bordered = cv2.copyMakeBorder(
+        img, height_border, height_border, width_border, width_border, cv2.BORDER_CONSTANT, value=[0, 0, 0]
+    )
+
+    faces = []
+    for region in detector.detect(bordered):
+        x, y, w, h = region["x"], region["y"], region["w"], region["h"]
+        aligned, angle = _align_wrt_eyes(bordered, region["left_eye"], region["right_eye"])
+        x1, y1, x2, y2 = _project_facial_area((x, y, x + w, y + h), angle, (bordered.shape[0], bordered.shape[1]))
+        face = aligned[int(y1):int(y2), int(x1):int(x2)]
+        if face.shape[0] == 0 or face.shape[1] == 0:
+            continue
+
+        x, y = x - width_border, y - height_border
+        x, y = max(0, int(x)), max(0, int(y))
+        faces.append({
+            "face": face / 255,
+            "facial_area": {"x": x, "y": y, "w": min(width - x - 1, int(w)), "h": min(height - y - 1, int(h))},
+            "confidence": round(region["confidence"], 2),
+        })
+
+    if not faces:
+        # Same fallback as enforce_detection=False: the whole image, zero confidence
+        faces.append({
+            "face": img / 255,
+            "facial_area": {"x": 0, "y": 0, "w": width - 1, "h": height - 1},
+            "confidence": 0,
+        })
+    return faces
+
+
+def letterbox(face: np.ndarray, target_size: Tuple[int, int] = TARGET_SIZE) -> np.ndarray:
+    """Resize keeping aspect ratio and pad with black, as DeepFace's resize_image does."""
+    cv2 = lazy_import("cv2")
+    factor = min(target_size[0] / face.shape[0], target_size[1] / face.shape[1])
+    face = cv2.resize(face, (int(face.shape[1] * factor), int(face.shape[0] * factor)))
+
+    diff_0 = target_size[0] - face.shape[0]
+    diff_1 = target_size[1] - face.shape[1]
+    face = np.pad(
+        face,
+        ((diff_0 // 2, diff_0 - diff_0 // 2), (diff_1 // 2, diff_1 - diff_1 // 2), (0, 0)),
+        "constant",
+    )
+    if face.shape[0:2] != target_size:
+        face = cv2.resize(face, target_size)
+
+    face = face.astype(np.float32)
+    if face.max() > 1:
+        face /= 255.0
+    return face
+
+
+class FacenetOnnxEmbedder:
+    def __init__(self, model_path: str, intra_op_threads: int = 0):
+        self.model_path = model_path
+        self.intra_op_threads = intra_op_threads
+        self._session = None
+        self._detector = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._session is None:
+                ort = lazy_import("onnxruntime")
+                options = ort.SessionOptions()
+                if self.intra_op_threads:
+                    options.intra_op_num_threads = self.intra_op_threads
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                with track_memory("model facenet512 (onnx)"):
+                    self._session = ort.InferenceSession(
+                        self.model_path, sess_options=options, providers=["CPUExecutionProvider"]
+                    )
+                self._input_name = self._session.get_inputs()[0].name
+            if self._detector is None:
+                self._detector = OpenCvFaceDetector()
+
+    def embed(self, faces: np.ndarray) -> np.ndarray:
+        """Run a (N, 160, 160, 3) BGR float batch through Facenet512."""
+        self.load()
+        return self._session.run(None, {self._input_name: faces.astype(np.float32, copy=False)})[0]
+
+    def represent(self, img: np.ndarray) -> List[dict]:
+        """Same output shape as DeepFace.represent for the fields the service uses."""
+        self.load()
+        return self._describe(extract_faces(img, self._detector))
+
+    def represent_first(self, imgs: List[np.ndarray]) -> List[Optional[dict]]:
+        """The first face of each image, embedded in a single batch; None where detection failed."""
+        self.load()
+        return represent_first_faces(imgs, lambda img: extract_faces(img, self._detector)[0], self._describe)
+
+    def _describe(self, faces: List[dict]) -> List[dict]:
+        embeddings = self.embed(np.stack([letterbox(f["face"]) for f in faces]))
+        return [
+            {
+                "embedding": embedding.astype(float).tolist(),
+                "facial_area": f["facial_area"],
+                "face_confidence": f["confidence"],
+            }
+            for f, embedding in zip(faces, embeddings)
+        ]
+
+
+def represent_first_faces(
+    imgs: List[np.ndarray],
+    first_face: Callable[[np.ndarray], dict],
+    describe: Callable[[List[dict]], List[dict]],
+) -> List[Optional[dict]]:
+    """
+    Detect each image's first face on its own, so one image that breaks the
+    detector does not fail its batch, then embed the detected faces together.
+    """
+    faces: List[Optional[dict]] = []
+    for i, img in enumerate(imgs):
+        try:
+            faces.append(first_face(img))
+        except Exception:
+            logger.exception("Face detection failed for image %d of %d", i + 1, len(imgs))
+            faces.append(None)
+    detected = [face for face in faces if face is not None]
+    described = iter(describe(detected) if detected else [])
+    return [next(described) if face is not None else None for face in faces]
+
+
+def export_facenet512(output_path: str, opset: int = 13):
+    """Export DeepFace's Facenet512 Keras model to ONNX. Needs TensorFlow and tf2onnx."""
+    DeepFace = lazy_import("deepface.DeepFace")
+    tf = lazy_import("tensorflow")
+
+    keras_model = DeepFace.build_model("Facenet512").model
+    forward = tf.function(
+        lambda x: keras_model(x, training=False),
+        input_signature=[tf.TensorSpec((None, TARGET_SIZE[0], TARGET_SIZE[1], 3), tf.float32, name="input")],
+    )
+    module = tf.Module()
+    module.model = keras_model
+
+    # Going through a SavedModel keeps tf2onnx's peak memory far below converting
+    # the in-memory Keras graph directly.
+    with tempfile.TemporaryDirectory() as saved_model_dir:
+        tf.saved_model.save(module, saved_model_dir, signatures=forward)
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        subprocess.run(
+            [
+                sys.executable, "-m", "tf2onnx.convert",
+                "--saved-model", saved_model_dir,
+                "--opset", str(opset),
+                "--output", output_path,
+            ],
+            check=True,
+        )
+    print(f"Exported Facenet512 to {output_path}")
+
+
+def check_parity(image_paths: List[str], model_path: str, min_similarity: float) -> bool:
+    """Compare ONNX and DeepFace embeddings image by image."""
+    cv2 = lazy_import("cv2")
+    DeepFace = lazy_import("deepface.DeepFace")
+    embedder = FacenetOnnxEmbedder(model_path)
+
+    passed = True
+    for path in image_paths:
+        reference = DeepFace.represent(
+            img_path=path, model_name="Facenet512", enforce_detection=False, detector_backend="opencv"
+        )[0]
+        candidate = embedder.represent(cv2.imread(path))[0]
+
+        a = np.asarray(reference["embedding"])
+        b = np.asarray(candidate["embedding"])
+        similarity = float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+        same_area = reference["facial_area"]["w"] == candidate["facial_area"]["w"]
+        ok = similarity >= min_similarity and same_area
+        passed = passed and ok
+        print(f"{'OK  ' if ok else 'FAIL'} {path}: cosine={similarity:.6f} "
+              f"area={candidate['facial_area']} reference_area={reference['facial_area']}")
+    return passed
+
+
+def main():
+    from config import get_settings
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Facenet512 ONNX export and parity check")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("--output", default=settings.FACE_ONNX_MODEL_PATH)
+    export_parser.add_argument("--opset", type=int, default=13)
+
+    parity_parser = commands.add_parser("parity")
+    parity_parser.add_argument("images", nargs="+")
+    parity_parser.add_argument("--model", default=settings.FACE_ONNX_MODEL_PATH)
+    parity_parser.add_argument("--min-similarity", type=float, default=0.999)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_facenet512(args.output, args.opset)
+    elif args.command == "parity":
+        sys.exit(0 if check_parity(args.images, args.model, args.min_similarity) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,213 @@
+import logging
 import numpy as np
-from deepface import DeepFace
-from scipy.spatial.distance import cosine
 from typing import List, Optional, Tuple
 import base64
-import cv2
-import tempfile
-import os
 from config import get_settings
+from lazy_imports import lazy_import
+from services import image_ingest
+from services.inference_client import inference_client
+from services.memory import track_memory
+from services.quality_gate import QualityRejected, check_image
+from services.telemetry import span
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 
 class FaceRecognitionService:
     def __init__(self):
         self.model_name = "Facenet512"
         self.threshold = settings.FACE_RECOGNITION_THRESHOLD
+        self.backend = settings.FACE_EMBEDDING_BACKEND
+        self._onnx_embedder = None
+        self._deepface_built = False
     
-    def extract_embedding(self, image_data: bytes) -> Optional[List[float]]:
+    def warm_up(self):
+        """Load the embedding backend ahead of the first request."""
+        if self.backend == "onnx":
+            self._get_onnx_embedder().load()
+        else:
+            self._deepface()
+    
+    def _deepface(self):
+        """The DeepFace module, with the Facenet model built (and its memory accounted) on first use."""
+        DeepFace = lazy_import("deepface.DeepFace")
+        if not self._deepface_built:
+            with track_memory(f"model {self.model_name.lower()} (deepface)"):
+                DeepFace.build_model(self.model_name)
+            self._deepface_built = True
+        return DeepFace
+    
+    def _get_onnx_embedder(self):
+        if self._onnx_embedder is None:
+            from services.face_onnx import FacenetOnnxEmbedder
+            self._onnx_embedder = FacenetOnnxEmbedder(
+                settings.FACE_ONNX_MODEL_PATH, settings.FACE_ONNX_INTRA_OP_THREADS
+            )
+        return self._onnx_embedder
+    
+    def _represent(self, img: np.ndarray) -> List[dict]:
+        if self.backend == "onnx":
+            return self._get_onnx_embedder().represent(img)
+        
+        DeepFace = self._deepface()
+        return DeepFace.represent(
+            img_path=img,
+            model_name=self.model_name,
+            enforce_detection=False,
+            detector_backend="opencv"
+        )
+    
+    def _represent_first(self, imgs: List[np.ndarray]) -> List[Optional[dict]]:
+        """First face of each image (None where detection failed), with one batched forward pass through the model."""
+        if self.backend == "onnx":
+            return self._get_onnx_embedder().represent_first(imgs)
+        
+        from services.face_onnx import letterbox, represent_first_faces
+        DeepFace = self._deepface()
+        
+        def first_face(img: np.ndarray) -> dict:
+            return DeepFace.extract_faces(img_path=img, detector_backend="opencv", enforce_detection=False)[0]
+        
+        def describe(faces: List[dict]) -> List[dict]:
+            # Same preprocessing as DeepFace.represent: RGB face back to BGR, letterboxed to 160x160
+            batch = np.stack([letterbox(face["face"][:, :, ::-1]) for face in faces])
+            embeddings = DeepFace.build_model(self.model_name).model(batch, training=False).numpy()
+            return [
+                {
+                    "embedding": embedding.astype(float).tolist(),
+                    "facial_area": face["facial_area"],
+                    "face_confidence": face["confidence"],
+                }
+                for face, embedding in zip(faces, embeddings)
+            ]
+        
+        return represent_first_faces(imgs, first_face, describe)
+    
+    def _prepare(self, image_data: bytes, client_cropped: bool) -> Tuple[np.ndarray, float]:
+        """Locate, quality-check and crop one upload. Raises QualityRejected or ValueError."""
+        with span("face.locate", bytes=len(image_data), cropped=client_cropped):
+            located = image_ingest.locate(image_data, client_cropped)
+        with span("face.quality_gate"):
+            try:
+                check_image(located)
+            except QualityRejected as e:
+                logger.info("Image rejected (%s): %s", e.reason, e)
+                raise
+        
+        with span("face.crop"):
+            crop, scale = image_ingest.crop_face(image_data, located)
+        logger.debug("Face crop %dx%d from %dx%d image", crop.shape[1], crop.shape[0], located.width, located.height)
+        return crop, scale
+    
+    def extract_embedding(self, image_data: bytes, client_cropped: bool = False) -> Optional[List[float]]:
+        """
+        Extract a face embedding, in the inference worker when one is configured.
+        The face is located on a reduced decode and only its crop reaches the model.
+        Raises QualityRejected for images that fail the quality gate and
+        InferenceError when the inference worker cannot answer.
+        """
         try:
-            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
-                tmp.write(image_data)
-                tmp_path = tmp.name
+            crop, scale = self._prepare(image_data, client_cropped)
+        except ValueError as e:
+            logger.warning("Face embedding extraction error: %s", e)
+            return None
+        
+        if inference_client.enabled:
+            return inference_client.extract_face_embedding(crop, scale)
+        return self.extract_embedding_from_array(crop, scale)
+    
+    def extract_embeddings(
+        self,
+        images: List[bytes],
+        client_cropped: bool = False
+    ) -> List[Tuple[Optional[List[float]], Optional[str]]]:
+        """
+        Batch version of extract_embedding for enrollment. Returns an
+        (embedding, rejection reason) pair per image; every image that passes
+        the quality gate goes through the model in a single batch. Raises
+        InferenceError when the inference worker cannot answer.
+        """
+        results: List[Tuple[Optional[List[float]], Optional[str]]] = [(None, None)] * len(images)
+        crops, scales, positions = [], [], []
+        for i, image_data in enumerate(images):
+            try:
+                crop, scale = self._prepare(image_data, client_cropped)
+            except QualityRejected as e:
+                results[i] = (None, e.reason)
+                continue
+            except ValueError as e:
+                logger.warning("Face embedding extraction error: %s", e)
+                continue
+            crops.append(crop)
+            scales.append(scale)
+            positions.append(i)
+        
+        if not crops:
+            return results
+        if inference_client.enabled:
+            embeddings = inference_client.extract_face_embeddings(crops, scales)
+        else:
+            embeddings = self.extract_embeddings_from_arrays(crops, scales)
+        
+        for i, embedding in zip(positions, embeddings):
+            results[i] = (embedding, None)
+        return results
+    
+    def _accept_face(self, face_obj: dict, scale: float) -> Optional[List[float]]:
+        # Check if face detection has reasonable confidence
+        # facial_area should have reasonable dimensions for a real face
+        facial_area = face_obj.get("facial_area", {})
+        face_width = facial_area.get("w", 0) * scale
+        face_height = facial_area.get("h", 0) * scale
+        face_confidence = face_obj.get("face_confidence", 0)
+        
+        logger.debug("Face area: %.0fx%.0f, confidence: %s", face_width, face_height, face_confidence)
+        
+        # Reject if face is too small or confidence is too low
+        if face_width < 50 or face_height < 50:
+            logger.info("Face too small, likely not a real face")
+            return None
+        if face_confidence is not None and face_confidence < 0.5:
+            logger.info("Face confidence too low, likely not a real face")
+            return None
+        
+        return face_obj["embedding"]
+    
+    def extract_embedding_from_array(self, img: np.ndarray, scale: float = 1.0) -> Optional[List[float]]:
+        """Embed a BGR image; scale is original-image pixels per pixel of img."""
+        try:
+            with span("face.embed", backend=self.backend):
+                embedding_objs = self._represent(img)
             
-            print(f"Extracting face embedding from image ({len(image_data)} bytes)")
+            logger.debug("%s result: %d faces found", self.backend, len(embedding_objs))
             
-            try:
-                embedding_objs = DeepFace.represent(
-                    img_path=tmp_path,
-                    model_name=self.model_name,
-                    enforce_detection=False,
-                    detector_backend="opencv"
-                )
-                
-                print(f"DeepFace result: {len(embedding_objs)} faces found")
-                
-                if embedding_objs and len(embedding_objs) > 0:
-                    face_obj = embedding_objs[0]
-                    # Check if face detection has reasonable confidence
-                    # facial_area should have reasonable dimensions for a real face
-                    facial_area = face_obj.get("facial_area", {})
-                    face_width = facial_area.get("w", 0)
-                    face_height = facial_area.get("h", 0)
-                    face_confidence = face_obj.get("face_confidence", 0)
-                    
-                    print(f"Face area: {face_width}x{face_height}, confidence: {face_confidence}")
-                    
-                    # Reject if face is too small or confidence is too low
-                    if face_width < 50 or face_height < 50:
-                        print("Face too small, likely not a real face")
-                        return None
-                    if face_confidence is not None and face_confidence < 0.5:
-                        print("Face confidence too low, likely not a real face")
-                        return None
-                    
-                    return face_obj["embedding"]
-                return None
-            finally:
-                os.unlink(tmp_path)
+            if embedding_objs and len(embedding_objs) > 0:
+                return self._accept_face(embedding_objs[0], scale)
+            return None
                 
-        except Exception as e:
-            print(f"Face embedding extraction error: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Face embedding extraction error")
             return None
     
+    def extract_embeddings_from_arrays(
+        self,
+        imgs: List[np.ndarray],
+        scales: List[float]
+    ) -> List[Optional[List[float]]]:
+        """Embed a batch of BGR face crops in one model call."""
+        try:
+            with span("face.embed_batch", backend=self.backend, images=len(imgs)):
+                embedding_objs = self._represent_first(imgs)
+            logger.debug("%s batch: %d images", self.backend, len(imgs))
+            return [
+                self._accept_face(obj, scale) if obj is not None else None
+                for obj, scale in zip(embedding_objs, scales)
+            ]
+        except Exception:
+            logger.exception("Face embedding extraction error")
+            return [None] * len(imgs)
+    
     def extract_embedding_from_base64(self, base64_image: str) -> Optional[List[float]]:
         try:
             if "," in base64_image:
@@ -72,7 +216,7 @@ class FaceRecognitionService:
             image_data = base64.b64decode(base64_image)
             return self.extract_embedding(image_data)
         except Exception as e:
-            print(f"Base64 decoding error: {e}")
+            logger.warning("Base64 decoding error: %s", e)
             return None
     
     def compare_embeddings(
@@ -81,11 +225,12 @@ class FaceRecognitionService:
         embedding2: List[float]
     ) -> float:
         try:
+            cosine = lazy_import("scipy.spatial.distance").cosine
             distance = cosine(embedding1, embedding2)
             similarity = 1 - distance
             return similarity
         except Exception as e:
-            print(f"Embedding comparison error: {e}")
+            logger.warning("Embedding comparison error: %s", e)
             return 0.0
     
     def find_match(
@@ -93,7 +238,7 @@ class FaceRecognitionService:
         query_embedding: List[float], 
         stored_embeddings: List[dict]
     ) -> Tuple[Optional[str], float]:
-
+    
         best_match_id = None
         best_similarity = 0.0
         
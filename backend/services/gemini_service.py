@@ -1,30 +1,164 @@
-import google.generativeai as genai
+"""
+Gemini text generation with a bounded latency budget.
+
+Every call runs under a deadline (GEMINI_GREETING_DEADLINE_SECONDS for the
+recognition greeting, GEMINI_SUMMARY_DEADLINE_SECONDS for summaries) and
+through a circuit breaker: after GEMINI_BREAKER_FAILURES consecutive
+failures or timeouts, calls skip Gemini for GEMINI_BREAKER_RESET_SECONDS and
+use their fallback straight away (the template greeting; no summary). With
+GEMINI_HEDGE_AFTER_SECONDS set, a second identical request is sent when the
+first has not answered by then, and whichever answers first is used.
+
+GEMINI_FAKE swaps the model for FakeGeminiModel, which answers after a
+random delay and fails at a configured rate, so the policy can be exercised
+locally and under load without a key.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
 from typing import Optional
 from config import get_settings
+from lazy_imports import lazy_import
+from services.circuit_breaker import CircuitBreaker
+from services.telemetry import SPAN_KIND_CLIENT, span
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 512
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """Stand-in for GenerativeModel: exponential latency around a mean, injected errors."""
+    def __init__(self, mean_latency_seconds: float, error_rate: float):
+        self.mean_latency_seconds = mean_latency_seconds
+        self.error_rate = error_rate
+    
+    async def generate_content_async(self, prompt: str, request_options: Optional[dict] = None):
+        if self.mean_latency_seconds > 0:
+            await asyncio.sleep(random.expovariate(1 / self.mean_latency_seconds))
+        if random.random() < self.error_rate:
+            raise RuntimeError("Injected Gemini failure")
+        return _FakeResponse("This is a generated reply from the fake Gemini model.")
+
+
+def _greeting_prompt(family_member_name: str, relationship: str, last_conversation_summary: Optional[str]) -> str:
+    return f"""
+        You are helping an Alzheimer's patient recognize their family member.
+        Generate a warm, reassuring greeting to help them understand who they're seeing.
+        
+        Family member: {family_member_name}
+        Relationship: {relationship}
+        Last conversation: {last_conversation_summary or "No previous conversation recorded"}
+        
+        Keep it brief (1-2 sentences), warm, and reassuring.
+        Start with identifying who the person is.
+        """
+
+
+def _template_greeting(family_member_name: str, relationship: str, last_conversation_summary: Optional[str]) -> str:
+    greeting = f"This is {family_member_name}, your {relationship}."
+    if last_conversation_summary:
+        greeting += f" Last time you talked about: {last_conversation_summary}"
+    return greeting
 
 
 class GeminiService:
     def __init__(self):
         self.model = None
-        
+        self.breaker = CircuitBreaker(
+            "gemini", settings.GEMINI_BREAKER_FAILURES, settings.GEMINI_BREAKER_RESET_SECONDS
+        )
+        self.counters = {
+            "calls": 0, "successes": 0, "failures": 0, "timeouts": 0,
+            "fallbacks": 0, "hedges": 0, "hedge_wins": 0,
+        }
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+    
     def _get_model(self):
-        if self.model is None and settings.GEMINI_API_KEY:
+        if self.model is None and settings.GEMINI_FAKE:
+            self.model = FakeGeminiModel(settings.GEMINI_FAKE_LATENCY_SECONDS, settings.GEMINI_FAKE_ERROR_RATE)
+        elif self.model is None and settings.GEMINI_API_KEY:
+            genai = lazy_import("google.generativeai")
             genai.configure(api_key=settings.GEMINI_API_KEY)
             self.model = genai.GenerativeModel('gemini-pro')
         return self.model
     
+    async def _attempt(self, model, operation: str, prompt: str, deadline: float, hedge: bool) -> Optional[str]:
+        with span("gemini.generate", SPAN_KIND_CLIENT, operation=operation, hedge=hedge):
+            response = await model.generate_content_async(prompt, request_options={"timeout": deadline})
+        try:
+            return response.text
+        except ValueError:
+            # Blocked by safety filters: Gemini answered, there is just no text to use
+            return None
+    
+    async def _hedged(self, model, operation: str, prompt: str, deadline: float) -> Optional[str]:
+        first = asyncio.ensure_future(self._attempt(model, operation, prompt, deadline, hedge=False))
+        tasks = {first}
+        hedge_after = settings.GEMINI_HEDGE_AFTER_SECONDS
+        try:
+            if 0 < hedge_after < deadline:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    self.counters["hedges"] += 1
+                    tasks.add(asyncio.ensure_future(self._attempt(model, operation, prompt, deadline, hedge=True)))
+            while True:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                if not tasks:
+                    raise done.pop().exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _generate(self, operation: str, prompt: str, deadline: float) -> Optional[str]:
+        """Generated text, or None when Gemini is unconfigured, failing, slow or short-circuited."""
+        model = self._get_model()
+        if not model:
+            return None
+        if not self.breaker.allow():
+            return None
+    
+        self.counters["calls"] += 1
+        started = time.monotonic()
+        try:
+            text = await asyncio.wait_for(self._hedged(model, operation, prompt, deadline), deadline)
+        except TimeoutError:
+            self.counters["timeouts"] += 1
+            self.breaker.record_failure()
+            logger.warning("Gemini %s timed out after %.1fs", operation, deadline)
+            return None
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            self.counters["failures"] += 1
+            self.breaker.record_failure()
+            logger.warning("Gemini API error: %s", e)
+            return None
+        self.counters["successes"] += 1
+        self.breaker.record_success()
+        self._latencies.append(time.monotonic() - started)
+        return text
+    
     async def generate_conversation_summary(
-        self, 
+        self,
         conversation_text: str,
         family_member_name: str,
         relationship: str
     ) -> Optional[str]:
-        model = self._get_model()
-        if not model:
-            return None
-        
         prompt = f"""
         You are helping an Alzheimer's patient remember their conversations.
         Summarize the following conversation with their {relationship}, {family_member_name}, 
@@ -40,13 +174,11 @@ class GeminiService:
         Conversation:
         {conversation_text}
         """
-        
-        try:
-            response = model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            print(f"Gemini API error: {e}")
-            return None
+    
+        summary = await self._generate("summary", prompt, settings.GEMINI_SUMMARY_DEADLINE_SECONDS)
+        if summary is None:
+            self.counters["fallbacks"] += 1
+        return summary
     
     async def generate_recognition_greeting(
         self,
@@ -54,35 +186,37 @@ class GeminiService:
         relationship: str,
         last_conversation_summary: Optional[str] = None
     ) -> str:
-        model = self._get_model()
-        
-        if not model:
-            greeting = f"This is {family_member_name}, your {relationship}."
-            if last_conversation_summary:
-                greeting += f" Last time you talked about: {last_conversation_summary}"
-            return greeting
-        
-        prompt = f"""
-        You are helping an Alzheimer's patient recognize their family member.
-        Generate a warm, reassuring greeting to help them understand who they're seeing.
-        
-        Family member: {family_member_name}
-        Relationship: {relationship}
-        Last conversation: {last_conversation_summary or "No previous conversation recorded"}
-        
-        Keep it brief (1-2 sentences), warm, and reassuring.
-        Start with identifying who the person is.
-        """
-        
-        try:
-            response = model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            print(f"Gemini API error: {e}")
-            greeting = f"This is {family_member_name}, your {relationship}."
-            if last_conversation_summary:
-                greeting += f" Last time you talked about: {last_conversation_summary}"
-            return greeting
+        prompt = _greeting_prompt(family_member_name, relationship, last_conversation_summary)
+        greeting = await self._generate("greeting", prompt, settings.GEMINI_GREETING_DEADLINE_SECONDS)
+        if greeting is None:
+            self.counters["fallbacks"] += 1
+            greeting = _template_greeting(family_member_name, relationship, last_conversation_summary)
+        return greeting
+    
+    async def precompute_recognition_greeting(
+        self,
+        family_member_name: str,
+        relationship: str,
+        last_conversation_summary: Optional[str] = None
+    ) -> Optional[str]:
+        """Greeting generated ahead of time, with the background deadline and no template fallback."""
+        prompt = _greeting_prompt(family_member_name, relationship, last_conversation_summary)
+        return await self._generate("greeting_precompute", prompt, settings.GEMINI_SUMMARY_DEADLINE_SECONDS)
+    
+    @property
+    def available(self) -> bool:
+        """Whether a model (real or fake) is configured."""
+        return self._get_model() is not None
+    
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        percentile = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+        return {
+            **self.counters,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)} if latencies else None,
+            "breaker": self.breaker.stats(),
+            "fake": bool(settings.GEMINI_FAKE),
+        }
 
 
 gemini_service = GeminiService()
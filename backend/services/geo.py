@@ -0,0 +1,109 @@
+"""
+GeoJSON helpers for patient locations.
+
+Each patient's latest fix in `locations` carries, next to the plain
+latitude/longitude the app reads, a GeoJSON `location` point (2dsphere
+indexed, for "who is near here" queries) and its distance from the
+patient's home, with `outside_home` set when that is beyond the patient's
+home radius. The flag is computed when the fix is written, so "who is away
+from home" is an indexed equality match rather than a per-patient distance
+computation at read time.
+
+Fixes written before these fields existed are filled in by
+`backfill_location_fields`, run as the `location_backfill` job (queued at
+startup and from POST /admin/locations/backfill).
+"""
+import math
+from typing import Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from config import get_settings
+
+settings = get_settings()
+
+EARTH_RADIUS_METERS = 6_371_008.8
+
+
+def point(latitude: float, longitude: float) -> dict:
+    """GeoJSON point; note GeoJSON puts longitude first."""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def distance_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance, as MongoDB's spherical queries measure it."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(1.0, a)))
+
+
+def home_radius(patient: dict) -> float:
+    return patient.get("home_radius_meters") or settings.HOME_RADIUS_METERS
+
+
+def location_fields(patient: dict, latitude: float, longitude: float) -> dict:
+    """Geo fields stored with a patient's location fix."""
+    fields = {"location": point(latitude, longitude)}
+    if patient.get("home_latitude") is not None and patient.get("home_longitude") is not None:
+        distance = distance_meters(patient["home_latitude"], patient["home_longitude"], latitude, longitude)
+        fields["home_distance_meters"] = round(distance, 1)
+        fields["outside_home"] = distance > home_radius(patient)
+    return fields
+
+
+def within(latitude: float, longitude: float, meters: float) -> dict:
+    """Filter on `location` for fixes within `meters` of a point (uses the 2dsphere index)."""
+    return {"location": {"$geoWithin": {
+        "$centerSphere": [[longitude, latitude], meters / EARTH_RADIUS_METERS]
+    }}}
+
+
+def _object_id(value) -> Optional[ObjectId]:
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+async def backfill_location_fields(db, batch_size: int = 500) -> dict:
+    """
+    Add the geo fields to location fixes stored without them. Each update
+    only applies while the fix still holds the coordinates it was computed
+    from, so a fix written meanwhile is left alone.
+    """
+    updated = orphaned = 0
+    last_id = None
+    while True:
+        query = {"location": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        fixes = await db.locations.find(
+            query, {"patient_id": 1, "latitude": 1, "longitude": 1}
+        ).sort("_id", 1).to_list(batch_size)
+        if not fixes:
+            return {"updated": updated, "orphaned": orphaned}
+        last_id = fixes[-1]["_id"]
+    
+        patient_ids = [oid for oid in (_object_id(fix.get("patient_id")) for fix in fixes) if oid is not None]
+        patients = {
+            str(patient["_id"]): patient
+            for patient in await db.patients.find(
+                {"_id": {"$in": patient_ids}},
+                {"home_latitude": 1, "home_longitude": 1, "home_radius_meters": 1}
+            ).to_list(None)
+        }
+        updates = []
+        for fix in fixes:
+            patient = patients.get(fix.get("patient_id"))
+            if patient is None or fix.get("latitude") is None or fix.get("longitude") is None:
+                orphaned += 1
+                continue
+            updates.append(UpdateOne(
+                {"_id": fix["_id"], "latitude": fix["latitude"], "longitude": fix["longitude"]},
+                {"$set": location_fields(patient, fix["latitude"], fix["longitude"])}
+            ))
+        if updates:
+            result = await db.locations.bulk_write(updates, ordered=False)
+            updated += result.modified_count
@@ -0,0 +1,220 @@
+"""
+Resolution-aware image ingest for face recognition.
+
+Phone uploads are multi-megapixel JPEGs but Facenet only ever sees a
+160x160 face. Ingest works in two passes:
+
+1. locate: decode a small grayscale copy with libjpeg's DCT-domain scaling
+   (IMREAD_REDUCED_*) and find the largest face on it. A coarse pass at
+   FACE_INGEST_LOCATE_DIMENSION finds the usual close-up face; when it finds
+   none, a finer pass at the resolution where a QUALITY_MIN_FACE_SIZE face
+   still covers the cascade's 24px window looks for small faces in large
+   photos. The quality gate runs on a FACE_INGEST_DETECT_MAX_DIMENSION copy.
+2. crop: decode in color at the coarsest reduction that still leaves the
+   face at least FACE_INGEST_MIN_FACE_PIXELS wide, and cut out the face
+   with a margin so the detector and eye alignment have context.
+
+The full-resolution image is only decoded when the face is small. When no
+face is located, the embedder gets the whole image and its own detector
+decides.
+"""
+import io
+import math
+from typing import Optional, Tuple
+import numpy as np
+from config import get_settings
+from lazy_imports import lazy_import
+
+settings = get_settings()
+
+REDUCTIONS = (8, 4, 2, 1)
+
+# The frontal face cascade's training window: the smallest face it can report
+HAAR_WINDOW = 24
+
+EXIF_ORIENTATION = 0x0112
+# Orientations whose upright image is the stored one turned by 90 degrees
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+_face_cascade = None
+
+
+class LocatedImage:
+    def __init__(self, width: int, height: int, gray: Optional[np.ndarray], scale: float,
+                 face_box: Optional[Tuple[int, int, int, int]], client_cropped: bool):
+        self.width = width
+        self.height = height
+        self.gray = gray            # reduced grayscale copy, None if undecodable
+        self.scale = scale          # full-resolution pixels per gray pixel
+        self.face_box = face_box    # (x, y, w, h) of the largest face at full resolution
+        self.client_cropped = client_cropped
+
+
+def _get_face_cascade():
+    global _face_cascade
+    if _face_cascade is None:
+        cv2 = lazy_import("cv2")
+        _face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+    return _face_cascade
+
+
+class _ViewReader(io.RawIOBase):
+    """Seekable file over a bytes-like object, for PIL, without copying it as BytesIO would."""
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        n = max(0, min(len(buffer), len(self._view) - self._pos))
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+    
+    def tell(self) -> int:
+        return self._pos
+
+
+def probe_size(image_data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Read the upright (width, height) from the image header without decoding
+    pixels. cv2.imdecode applies the EXIF orientation, so a phone portrait
+    stored on its side has its dimensions swapped here to match the decode.
+    """
+    Image = lazy_import("PIL.Image")
+    try:
+        # BytesIO shares a bytes object's buffer but copies a memoryview or bytearray
+        stream = io.BytesIO(image_data) if isinstance(image_data, bytes) else _ViewReader(image_data)
+        image = Image.open(stream)
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION, 1) in TRANSPOSED_ORIENTATIONS:
+            return height, width
+        return width, height
+    except Exception:
+        return None
+
+
+def _reduced_flag(reduction: int, color: bool) -> int:
+    cv2 = lazy_import("cv2")
+    if color:
+        return {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                2: cv2.IMREAD_REDUCED_COLOR_2, 1: cv2.IMREAD_COLOR}[reduction]
+    return {8: cv2.IMREAD_REDUCED_GRAYSCALE_8, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+            2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 1: cv2.IMREAD_GRAYSCALE}[reduction]
+
+
+def decode_reduced(image_data: bytes, size: Tuple[int, int], max_dimension: int, color: bool = False):
+    """
+    Decode at the coarsest DCT reduction that keeps the long side at or above
+    max_dimension, then resize down to it. Returns (image, full-res pixels per pixel).
+    """
+    cv2 = lazy_import("cv2")
+    long_side = max(size)
+    reduction = next((r for r in REDUCTIONS if long_side / r >= max_dimension), 1)
+    
+    img = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), _reduced_flag(reduction, color))
+    if img is None:
+        return None, 1.0
+    
+    if max(img.shape[:2]) > max_dimension:
+        factor = max_dimension / max(img.shape[:2])
+        img = cv2.resize(img, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    return img, size[0] / img.shape[1]
+
+
+def _find_face(gray: np.ndarray, scale: float, dimension: int,
+               scale_factor: float) -> Optional[Tuple[int, int, int, int]]:
+    """Largest face on `gray` resized to `dimension`, as a full-resolution box."""
+    cv2 = lazy_import("cv2")
+    check_scale = min(1.0, dimension / max(gray.shape))
+    small = cv2.resize(gray, None, fx=check_scale, fy=check_scale, interpolation=cv2.INTER_AREA)
+    to_full = scale / check_scale
+    # Faces the quality gate would reject as too small are not worth the pyramid levels
+    min_size = max(HAAR_WINDOW, int(settings.QUALITY_MIN_FACE_SIZE / to_full))
+    faces = _get_face_cascade().detectMultiScale(small, scale_factor, 3, minSize=(min_size, min_size))
+    if len(faces) == 0:
+        return None
+    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+    return int(x * to_full), int(y * to_full), int(w * to_full), int(h * to_full)
+
+
+def locate(image_data: bytes, client_cropped: bool = False) -> LocatedImage:
+    """First pass: small grayscale decode and coarse face localization."""
+    cv2 = lazy_import("cv2")
+    size = probe_size(image_data)
+    if size is None:
+        return LocatedImage(0, 0, None, 1.0, None, client_cropped)
+    
+    # Resolution at which the smallest face the quality gate accepts is still HAAR_WINDOW wide
+    long_side = max(size)
+    fine_dimension = min(long_side, math.ceil(long_side * HAAR_WINDOW / settings.QUALITY_MIN_FACE_SIZE))
+    gray, scale = decode_reduced(
+        image_data, size, max(settings.FACE_INGEST_DETECT_MAX_DIMENSION, fine_dimension)
+    )
+    if gray is None:
+        return LocatedImage(size[0], size[1], None, 1.0, None, client_cropped)
+    
+    # Presence and position only: a coarser image and pyramid than the real detector
+    face_box = _find_face(gray, scale, settings.FACE_INGEST_LOCATE_DIMENSION, 1.2)
+    if face_box is None and fine_dimension > settings.FACE_INGEST_LOCATE_DIMENSION:
+        # Denser pyramid: faces near the window size fall between 1.2 steps
+        face_box = _find_face(gray, scale, fine_dimension, 1.1)
+    
+    if max(gray.shape) > settings.FACE_INGEST_DETECT_MAX_DIMENSION:
+        factor = settings.FACE_INGEST_DETECT_MAX_DIMENSION / max(gray.shape)
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        scale /= factor
+    return LocatedImage(size[0], size[1], gray, scale, face_box, client_cropped)
+
+
+def crop_face(image_data: bytes, located: LocatedImage) -> Tuple[np.ndarray, float]:
+    """
+    Second pass: BGR face crop for the embedder plus its full-res pixels per pixel.
+    
+    Falls back to the whole (bounded) image when no face was located or the
+    client already sent a crop.
+    """
+    cv2 = lazy_import("cv2")
+    size = (located.width, located.height)
+    
+    if located.face_box is None or located.client_cropped:
+        img, scale = decode_reduced(image_data, size, settings.FACE_INGEST_EMBED_MAX_DIMENSION, color=True)
+        if img is None:
+            raise ValueError("Could not decode image")
+        return img, scale
+    
+    x, y, w, h = located.face_box
+    reduction = next(
+        (r for r in REDUCTIONS if min(w, h) / r >= settings.FACE_INGEST_MIN_FACE_PIXELS), 1
+    )
+    img = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), _reduced_flag(reduction, True))
+    if img is None:
+        raise ValueError("Could not decode image")
+    scale = located.width / img.shape[1]
+    
+    margin = settings.FACE_INGEST_CROP_MARGIN
+    x1 = max(0, int((x - margin * w) / scale))
+    y1 = max(0, int((y - margin * h) / scale))
+    x2 = min(img.shape[1], int((x + w + margin * w) / scale))
+    y2 = min(img.shape[0], int((y + h + margin * h) / scale))
+    crop = img[y1:y2, x1:x2]
+    
+    # DCT reductions are powers of two; finish the way down with a resize
+    factor = settings.FACE_INGEST_MIN_FACE_PIXELS / (min(w, h) / scale)
+    if factor < 1.0:
+        crop = cv2.resize(crop, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        scale /= factor
+    # Copy so the rest of the decoded frame can be freed right away
+    return np.ascontiguousarray(crop), scale
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Optional, Sequence
+import numpy as np
+from fastapi import Request, status
+from config import get_settings
+from services.inference_protocol import InferenceProtocolError, recv_message, send_message
+from services.quality_gate import QualityRejected
+from services.serialization import json_response
+from services.telemetry import SPAN_KIND_CLIENT, span
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Told to clients when the worker is down; about a worker process restart
+RETRY_AFTER_SECONDS = 5
+
+
+class InferenceError(Exception):
+    pass
+
+
+class InferenceClient:
+    """
+    Thin client for the out-of-process inference worker.
+
+    Each call opens a short-lived Unix socket connection, so any idle worker
+    process in the pool can accept it.
+    """
+
+    def __init__(self, socket_path: str, timeout: float):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.socket_path)
+
+    def call(self, op: str, payloads: Sequence[bytes] = (), **params):
+        try:
+            with span(f"inference.{op}", SPAN_KIND_CLIENT, payloads=len(payloads)), \
+                    socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+                send_message(sock, {"op": op, **params}, payloads)
+                header, _ = recv_message(sock)
+        except (OSError, InferenceProtocolError) as e:
+            raise InferenceError(f"Inference worker unavailable: {e}") from e
+
+        if header.get("rejected"):
+            raise QualityRejected(header["rejected"], header.get("error", ""))
+        if not header.get("ok"):
+            raise InferenceError(header.get("error", "Unknown inference error"))
+        return header.get("result")
+
+    def ping(self) -> bool:
+        try:
+            return self.call("ping") == "pong"
+        except InferenceError:
+            return False
+
+    def extract_face_embedding(self, crop: np.ndarray, scale: float = 1.0) -> Optional[List[float]]:
+        # Raw BGR pixels: the worker neither decodes nor searches the full image again
+        crop = np.ascontiguousarray(crop, dtype=np.uint8)
+        return self.call("face.extract", [memoryview(crop).cast("B")], shape=list(crop.shape), scale=scale)
+
+    def extract_face_embeddings(self, crops: List[np.ndarray], scales: List[float]) -> List[Optional[List[float]]]:
+        crops = [np.ascontiguousarray(crop, dtype=np.uint8) for crop in crops]
+        return self.call(
+            "face.extract_batch",
+            [memoryview(crop).cast("B") for crop in crops],
+            shapes=[list(crop.shape) for crop in crops],
+            scales=scales,
+        )
+
+    def extract_voice_embedding(self, audio_data: bytes) -> Optional[List[float]]:
+        return self.call("voice.extract", [audio_data])
+
+    def extract_voice_embeddings(self, clips: List[bytes]) -> List[list]:
+        """[embedding, rejection reason] per clip."""
+        return self.call("voice.extract_batch", clips)
+
+
+def _lock_owner(socket_path: str) -> Optional[int]:
+    """Pid of the worker holding the socket's lock, as it records there."""
+    try:
+        with open(socket_path + ".lock") as f:
+            return int(f.read().strip() or 0) or None
+    except (OSError, ValueError):
+        return None
+
+
+def owns_pool(process: Optional[subprocess.Popen]) -> bool:
+    """Whether `process` is running and is the worker serving the socket."""
+    return (process is not None and process.poll() is None
+            and _lock_owner(inference_client.socket_path) == process.pid)
+
+
+async def start_inference_worker(ready_timeout: float = 180.0) -> Optional[subprocess.Popen]:
+    """
+    Spawn a local inference worker unless one is already answering on the socket.
+
+    Several API workers may race to spawn; the worker holds a lock file so
+    only one of them binds the socket and the others exit immediately.
+    Returns the process this call spawned if it is the one serving the socket.
+    """
+    if await asyncio.to_thread(inference_client.ping):
+        logger.info("Using running inference worker at %s", inference_client.socket_path)
+        return None
+
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "services.inference_worker",
+            "--socket", inference_client.socket_path,
+            "--processes", str(settings.INFERENCE_PROCESSES),
+        ],
+        cwd=BACKEND_DIR,
+    )
+
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        if await asyncio.to_thread(inference_client.ping):
+            if not owns_pool(process):
+                # Lost the lock race: another API worker's pool answered
+                await asyncio.to_thread(process.wait)
+                logger.info("Using inference worker started by another process at %s", inference_client.socket_path)
+                return None
+            logger.info("Inference worker ready at %s", inference_client.socket_path)
+            return process
+        await asyncio.sleep(0.5)
+
+    logger.warning("Inference worker did not become ready; recognition requests will fail")
+    return process
+
+
+def stop_inference_worker(process: Optional[subprocess.Popen]):
+    """Stop the worker pool `process`, but only while it is the one serving the socket."""
+    if process is None or process.poll() is not None:
+        return
+    if not owns_pool(process):
+        logger.info("Inference worker %d does not own %s; leaving it running", process.pid, inference_client.socket_path)
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def inference_error_handler(request: Request, exc: InferenceError):
+    """An unreachable or failing inference worker is a temporary outage, not a bad request."""
+    logger.warning("Inference failed for %s: %s", request.url.path, exc)
+    return json_response(
+        {"detail": "Recognition is temporarily unavailable", "retry_after": RETRY_AFTER_SECONDS},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+    )
+
+
+inference_client = InferenceClient(settings.INFERENCE_SOCKET_PATH, settings.INFERENCE_TIMEOUT_SECONDS)
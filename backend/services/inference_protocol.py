@@ -0,0 +1,72 @@
+"""
+Wire format shared by the inference worker and its client.
+
+Every message is a 4-byte big-endian header length, a JSON header, then the
+raw payloads back to back. The header lists the payload sizes so the
+receiver can read straight into one preallocated buffer and hand out
+memoryview slices without copying:
+
+    [len][{"op": "face.extract", "sizes": [48213]}][<48213 bytes>]
+"""
+import json
+import socket
+import struct
+from typing import List, Sequence, Tuple
+
+_LENGTH = struct.Struct(">I")
+MAX_HEADER_BYTES = 1 << 20
+
+
+class InferenceProtocolError(Exception):
+    pass
+
+
+def send_message(sock: socket.socket, header: dict, payloads: Sequence[bytes] = ()):
+    header = dict(header, sizes=[len(p) for p in payloads])
+    header_bytes = json.dumps(header).encode("utf-8")
+    buffers = [_LENGTH.pack(len(header_bytes)), header_bytes]
+    buffers.extend(memoryview(p) for p in payloads if len(p))
+
+    # Scatter-gather send: payloads go to the kernel without being concatenated
+    remaining = sum(len(b) for b in buffers)
+    while remaining:
+        sent = sock.sendmsg(buffers)
+        remaining -= sent
+        while sent:
+            if sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                buffers.pop(0)
+            else:
+                buffers[0] = memoryview(buffers[0])[sent:]
+                sent = 0
+
+
+def _recv_exactly(sock: socket.socket, buffer: memoryview):
+    while len(buffer):
+        received = sock.recv_into(buffer)
+        if received == 0:
+            raise InferenceProtocolError("Connection closed mid-message")
+        buffer = buffer[received:]
+
+
+def recv_message(sock: socket.socket) -> Tuple[dict, List[memoryview]]:
+    length_buffer = bytearray(_LENGTH.size)
+    _recv_exactly(sock, memoryview(length_buffer))
+    (header_length,) = _LENGTH.unpack(length_buffer)
+    if header_length > MAX_HEADER_BYTES:
+        raise InferenceProtocolError(f"Header too large: {header_length} bytes")
+
+    header_buffer = bytearray(header_length)
+    _recv_exactly(sock, memoryview(header_buffer))
+    header = json.loads(header_buffer)
+
+    sizes = header.get("sizes", [])
+    body = memoryview(bytearray(sum(sizes)))
+    _recv_exactly(sock, body)
+
+    payloads = []
+    offset = 0
+    for size in sizes:
+        payloads.append(body[offset:offset + size])
+        offset += size
+    return header, payloads
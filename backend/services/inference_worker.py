@@ -0,0 +1,159 @@
+"""
+Out-of-process inference server owning the face and voice models.
+
+Run standalone (from backend/):
+    uv run python -m services.inference_worker --socket /tmp/alzheimer-inference.sock --processes 2
+
+or let the API spawn it by setting INFERENCE_SOCKET_PATH and INFERENCE_SPAWN.
+The parent binds the Unix socket and forks a pool of worker processes that
+all accept() on it, so each request lands on whichever process is idle.
+Models are loaded after the fork, once per worker process.
+"""
+import argparse
+import fcntl
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, List
+import numpy as np
+from services.face_recognition import face_recognition_service
+from services.inference_protocol import InferenceProtocolError, recv_message, send_message
+from services.quality_gate import QualityRejected
+from services.telemetry import configure_logging
+from services.voice_recognition import voice_recognition_service
+
+logger = logging.getLogger(__name__)
+
+
+def _extract_face(header: dict, payloads: List[memoryview]):
+    crop = np.frombuffer(payloads[0], dtype=np.uint8).reshape(header["shape"])
+    return face_recognition_service.extract_embedding_from_array(crop, header.get("scale", 1.0))
+
+
+def _extract_faces(header: dict, payloads: List[memoryview]):
+    crops = [
+        np.frombuffer(payload, dtype=np.uint8).reshape(shape)
+        for payload, shape in zip(payloads, header["shapes"])
+    ]
+    return face_recognition_service.extract_embeddings_from_arrays(crops, header["scales"])
+
+
+OPERATIONS: Dict[str, Callable[[dict, List[memoryview]], object]] = {
+    "ping": lambda header, payloads: "pong",
+    "face.extract": _extract_face,
+    "face.extract_batch": _extract_faces,
+    "voice.extract": lambda header, payloads: voice_recognition_service.extract_embedding_local(payloads[0]),
+    "voice.extract_batch": lambda header, payloads: voice_recognition_service.extract_embeddings_local(payloads),
+}
+
+
+def handle_connection(conn: socket.socket):
+    header, payloads = recv_message(conn)
+    operation = OPERATIONS.get(header.get("op"))
+    if operation is None:
+        send_message(conn, {"ok": False, "error": f"Unknown operation: {header.get('op')}"})
+        return
+
+    try:
+        result = operation(header, payloads)
+    except QualityRejected as e:
+        send_message(conn, {"ok": False, "rejected": e.reason, "error": str(e)})
+        return
+    except Exception as e:
+        logger.exception("Inference operation %s failed", header.get("op"))
+        send_message(conn, {"ok": False, "error": str(e)})
+        return
+    send_message(conn, {"ok": True, "result": result})
+
+
+def serve_forever(server: socket.socket, warm: bool):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    configure_logging()
+    if warm:
+        face_recognition_service.warm_up()
+        voice_recognition_service.warm_up()
+    logger.info("Inference process %s ready", os.getpid())
+
+    while True:
+        conn, _ = server.accept()
+        with conn:
+            try:
+                handle_connection(conn)
+            except (OSError, InferenceProtocolError) as e:
+                logger.warning("Inference connection error: %s", e)
+
+
+def serve(socket_path: str, processes: int = 1, warm: bool = True):
+    # Append mode: a worker losing the race must not truncate the owner's pid
+    lock_file = open(socket_path + ".lock", "a+")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        logger.info("Another inference worker already owns %s", socket_path)
+        return
+    # Whoever spawned this worker checks the pid to know it owns the pool
+    lock_file.truncate(0)
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(128)
+
+    def handle_stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, handle_stop)
+
+    context = multiprocessing.get_context("fork")
+
+    def spawn():
+        process = context.Process(target=serve_forever, args=(server, warm), daemon=True)
+        process.start()
+        return process
+
+    pool = [spawn() for _ in range(processes)]
+    logger.info("Inference worker listening on %s with %s process(es)", socket_path, processes)
+
+    try:
+        while True:
+            time.sleep(1)
+            for i, process in enumerate(pool):
+                if not process.is_alive():
+                    logger.warning("Inference process %s exited (%s); restarting", process.pid, process.exitcode)
+                    pool[i] = spawn()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for process in pool:
+            process.terminate()
+        for process in pool:
+            process.join(timeout=5)
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        lock_file.close()
+
+
+def main():
+    from config import get_settings
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Face/voice inference worker")
+    parser.add_argument("--socket", default=settings.INFERENCE_SOCKET_PATH or "/tmp/alzheimer-inference.sock")
+    parser.add_argument("--processes", type=int, default=settings.INFERENCE_PROCESSES)
+    parser.add_argument("--no-warm", action="store_true", help="load models on first request instead of at start")
+    args = parser.parse_args()
+    configure_logging()
+    serve(args.socket, args.processes, warm=not args.no_warm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Handlers for the background job types; imported once by main.py so they register.
+
+Each returns a small result document stored on the job, or raises to have
+the job retried with backoff.
+"""
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from services.conversation_store import record_conversation
+from services.gemini_service import gemini_service
+from services.geo import backfill_location_fields
+from services.jobs import current_job_id, job_handler
+from services.reembed import prune_superseded, reembed
+
+
+class JobRetry(Exception):
+    """The job could not finish now (e.g. Gemini unavailable) and should be retried."""
+
+
+@job_handler("conversation_summary", concurrency=2)
+async def summarize_conversation(db, payload: dict) -> Optional[dict]:
+    """
+    Summarize a transcript with Gemini and record the conversation, under the
+    job's id so a retried job records it once.
+    """
+    member = await db.family_members.find_one(
+        {"_id": ObjectId(payload["family_member_id"])}, {"name": 1, "relationship": 1}
+    )
+    if member is None:
+        return {"error": "Family member not found"}
+    
+    summary = await gemini_service.generate_conversation_summary(
+        conversation_text=payload["transcript"],
+        family_member_name=member["name"],
+        relationship=member["relationship"]
+    )
+    if summary is None:
+        raise JobRetry("Summary unavailable")
+    
+    conversation = await record_conversation(
+        db, payload["patient_id"], payload["family_member_id"], summary, payload.get("topics", []),
+        conversation_id=current_job_id()
+    )
+    return {"conversation_id": conversation["_id"], "summary": conversation["summary"]}
+
+
+@job_handler("greeting_precompute", concurrency=2)
+async def precompute_greeting(db, payload: dict) -> Optional[dict]:
+    """Generate the recognition greeting for a family member ahead of the next recognition."""
+    if not gemini_service.available:
+        return {"skipped": "Gemini not configured"}
+    family_member_id = payload["family_member_id"]
+    member = await db.family_members.find_one({"_id": ObjectId(family_member_id)}, {"name": 1, "relationship": 1})
+    if member is None:
+        return {"error": "Family member not found"}
+    last_conv = await db.conversations.find_one(
+        {"family_member_id": family_member_id},
+        {"summary": 1},
+        sort=[("created_at", -1)]
+    )
+    
+    greeting = await gemini_service.precompute_recognition_greeting(
+        family_member_name=member["name"],
+        relationship=member["relationship"],
+        last_conversation_summary=last_conv["summary"] if last_conv else None
+    )
+    if greeting is None:
+        raise JobRetry("Greeting unavailable")
+    
+    await db.greetings.replace_one({"_id": family_member_id}, {
+        "greeting": greeting,
+        # the greeting is current while this is still the member's latest conversation
+        "conversation_id": str(last_conv["_id"]) if last_conv else None,
+        "created_at": datetime.utcnow(),
+    }, upsert=True)
+    return {"greeting": greeting}
+
+
+@job_handler("reembed")
+async def reembed_embeddings(db, payload: dict) -> Optional[dict]:
+    """Re-embed one collection at the current model version; resumes from its checkpoint on retry."""
+    state = await reembed(db, payload["kind"], payload.get("batch_size"), payload.get("max_per_second"))
+    return {key: state[key] for key in ("processed", "converted", "skipped_no_media", "failed")}
+
+
+@job_handler("embedding_compaction")
+async def compact_embeddings(db, payload: dict) -> Optional[dict]:
+    """Delete embeddings superseded by a re-embedded copy."""
+    return {"deleted": await prune_superseded(db, payload["kind"])}
+
+
+@job_handler("location_backfill")
+async def backfill_locations(db, payload: dict) -> Optional[dict]:
+    """Add the GeoJSON point and home distance to location fixes stored before they existed."""
+    return await backfill_location_fields(db)
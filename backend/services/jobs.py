@@ -0,0 +1,334 @@
+"""
+Persistent background jobs backed by the `jobs` collection.
+
+Request handlers enqueue work and return; JobRunner, started from the app's
+lifespan in every API process, claims queued jobs and runs them at bounded
+parallelism (JOB_CONCURRENCY per process, and per job type the concurrency
+given to `job_handler`).
+
+    @job_handler("greeting_precompute", concurrency=2)
+    async def precompute_greeting(db, payload: dict) -> Optional[dict]:
+        ...
+    
+    job_id = await enqueue(db, "greeting_precompute", {"family_member_id": member_id})
+
+Claiming is a single find_one_and_update, highest priority first, so any
+number of processes can share the queue. A claim holds a lease of
+JOB_LEASE_SECONDS that the runner renews while the handler works; a job
+whose lease ran out (its process died or stalled) is queued again, and a
+runner that finds its lease gone cancels the handler. A handler that
+raises is retried with exponential backoff until `max_attempts`, then the
+job is marked failed. Whatever the handler returns is stored as the result.
+
+A job's handler can therefore run more than once; handlers whose writes
+must happen once key them by `current_job_id()` and upsert.
+
+`dedupe_key` keeps at most one queued or running job per key. Enqueueing a
+key whose job is already running flags it to run once more when it ends,
+so work enqueued after the running job read its inputs is not lost.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import secrets
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config import get_settings
+from services.telemetry import span
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Higher runs first
+PRIORITY_INTERACTIVE = 10  # someone is waiting on the result
+PRIORITY_DEFAULT = 0
+PRIORITY_BACKGROUND = -10  # maintenance: re-embedding, compaction
+
+
+class JobHandler:
+    def __init__(self, job_type: str, func: Callable[..., Awaitable[Optional[dict]]], concurrency: int, max_attempts: int):
+        self.job_type = job_type
+        self.func = func
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+
+HANDLERS: Dict[str, JobHandler] = {}
+
+_current_job_id: contextvars.ContextVar[Optional[ObjectId]] = contextvars.ContextVar("current_job_id", default=None)
+
+
+def current_job_id() -> Optional[ObjectId]:
+    """Id of the job whose handler is running; the same on every attempt."""
+    return _current_job_id.get()
+
+
+def job_handler(job_type: str, concurrency: int = 1, max_attempts: Optional[int] = None):
+    """Register `func(db, payload) -> result` as the handler for `job_type`."""
+    def register(func):
+        HANDLERS[job_type] = JobHandler(job_type, func, concurrency, max_attempts or settings.JOB_MAX_ATTEMPTS)
+        return func
+    return register
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at JOB_RETRY_MAX_SECONDS."""
+    delay = min(settings.JOB_RETRY_MAX_SECONDS, settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def enqueue(
+    db,
+    job_type: str,
+    payload: dict,
+    priority: int = PRIORITY_DEFAULT,
+    delay_seconds: float = 0,
+    dedupe_key: Optional[str] = None,
+    owner_uid: Optional[str] = None,
+) -> str:
+    """Queue a job and return its id (the existing job's id for a duplicate dedupe_key)."""
+    handler = HANDLERS.get(job_type)
+    if handler is None:
+        raise ValueError(f"No handler registered for job type {job_type}")
+    now = datetime.utcnow()
+    job = {
+        "type": job_type,
+        "payload": payload,
+        "priority": priority,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": handler.max_attempts,
+        "run_at": now + timedelta(seconds=delay_seconds),
+        "created_at": now,
+        "updated_at": now,
+    }
+    if dedupe_key is not None:
+        job["active_key"] = dedupe_key
+    if owner_uid is not None:
+        job["owner_uid"] = owner_uid
+    
+    try:
+        result = await db.jobs.insert_one(job)
+    except DuplicateKeyError:
+        existing = await db.jobs.find_one_and_update(
+            {"active_key": dedupe_key},
+            {"$set": {"rerun": True}},
+            projection={"status": 1},
+        )
+        if existing is None:  # finished in between
+            return await enqueue(db, job_type, payload, priority, delay_seconds, dedupe_key, owner_uid)
+        return str(existing["_id"])
+    job_runner.wake()
+    return str(result.inserted_id)
+
+
+async def get_job(db, job_id: str) -> Optional[dict]:
+    if not ObjectId.is_valid(job_id):
+        return None
+    return await db.jobs.find_one({"_id": ObjectId(job_id)})
+
+
+class JobRunner:
+    def __init__(self, concurrency: int, poll_seconds: float, lease_seconds: float):
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.db = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._running: Dict[ObjectId, asyncio.Task] = {}
+        self._running_types: Dict[ObjectId, str] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._last_requeue = 0.0
+    
+    def start(self, db):
+        self.db = db
+        self._wake = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._loop())
+        logger.info("Job runner %s started with %d slot(s)", self.worker_id, self.concurrency)
+    
+    async def stop(self):
+        """Stop claiming, cancel running handlers and hand their jobs back to the queue."""
+        if self._loop_task is None:
+            return
+        self._loop_task.cancel()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(self._loop_task, *tasks, return_exceptions=True)
+        self._loop_task = None
+    
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+    
+    def _free_types(self) -> list:
+        counts: Dict[str, int] = {}
+        for job_type in self._running_types.values():
+            counts[job_type] = counts.get(job_type, 0) + 1
+        return [t for t, handler in HANDLERS.items() if counts.get(t, 0) < handler.concurrency]
+    
+    async def _loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                await self._requeue_expired()
+                while len(self._running) < self.concurrency:
+                    job = await self._claim()
+                    if job is None:
+                        break
+                    task = asyncio.create_task(self._run(job))
+                    self._running[job["_id"]] = task
+                    self._running_types[job["_id"]] = job["type"]
+                    task.add_done_callback(lambda _, job_id=job["_id"]: self._finished(job_id))
+            except Exception:
+                logger.exception("Job runner poll failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except TimeoutError:
+                pass
+    
+    def _finished(self, job_id: ObjectId):
+        self._running.pop(job_id, None)
+        self._running_types.pop(job_id, None)
+        self.wake()
+    
+    async def _claim(self) -> Optional[dict]:
+        job_types = self._free_types()
+        if not job_types:
+            return None
+        now = datetime.utcnow()
+        return await self.db.jobs.find_one_and_update(
+            {"status": QUEUED, "run_at": {"$lte": now}, "type": {"$in": job_types}},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "lease_owner": f"{self.worker_id}:{secrets.token_hex(4)}",
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", -1), ("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+    
+    async def _requeue_expired(self):
+        """Queue again (or fail, when out of attempts) jobs whose runner stopped renewing the lease."""
+        loop_time = asyncio.get_running_loop().time()
+        if loop_time - self._last_requeue < self.lease_seconds / 2:
+            return
+        self._last_requeue = loop_time
+        now = datetime.utcnow()
+        expired = await self.db.jobs.find(
+            {"status": RUNNING, "lease_until": {"$lt": now}},
+            {"attempts": 1, "max_attempts": 1, "lease_owner": 1},
+        ).to_list(None)
+        for job in expired:
+            owned = {"_id": job["_id"], "status": RUNNING, "lease_owner": job["lease_owner"]}
+            if job["attempts"] >= job["max_attempts"]:
+                await self.db.jobs.update_one(owned, {
+                    "$set": {"status": FAILED, "last_error": "Lease expired", "finished_at": now, "updated_at": now},
+                    "$unset": {"active_key": "", "lease_owner": "", "lease_until": ""},
+                })
+            else:
+                await self.db.jobs.update_one(owned, {
+                    "$set": {"status": QUEUED, "run_at": now, "last_error": "Lease expired", "updated_at": now},
+                    "$unset": {"lease_owner": "", "lease_until": ""},
+                })
+            logger.warning("Job %s lease expired", job["_id"])
+    
+    async def _renew_lease(self, job: dict, handler_task: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            result = await self.db.jobs.update_one(
+                {"_id": job["_id"], "lease_owner": job["lease_owner"]},
+                {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+            )
+            if result.matched_count == 0:
+                # Requeued or finished elsewhere: carrying on would run it twice at once
+                logger.warning("Job %s lost its lease; cancelling its handler", job["_id"])
+                handler_task.cancel()
+                return
+    
+    async def _run(self, job: dict):
+        handler = HANDLERS[job["type"]]
+        owned = {"_id": job["_id"], "lease_owner": job["lease_owner"]}
+        _current_job_id.set(job["_id"])
+        renewer = asyncio.create_task(self._renew_lease(job, asyncio.current_task()))
+        try:
+            with span(f"job.{job['type']}", job_id=str(job["_id"]), attempt=job["attempts"]):
+                result = await handler.func(self.db, job["payload"])
+        except asyncio.CancelledError:
+            # Shutting down, or the lease was lost (then `owned` matches nothing): the attempt does not count
+            await self.db.jobs.update_one(owned, {
+                "$set": {"status": QUEUED, "run_at": datetime.utcnow()},
+                "$inc": {"attempts": -1},
+                "$unset": {"lease_owner": "", "lease_until": ""},
+            })
+            raise
+        except Exception as e:
+            await self._failed(job, owned, e)
+        else:
+            await self._succeeded(job, owned, result)
+        finally:
+            renewer.cancel()
+    
+    async def _succeeded(self, job: dict, owned: dict, result: Optional[dict]):
+        now = datetime.utcnow()
+        rerun = await self.db.jobs.update_one({**owned, "rerun": True}, {
+            "$set": {"status": QUEUED, "run_at": now, "attempts": 0, "result": result, "updated_at": now},
+            "$unset": {"rerun": "", "lease_owner": "", "lease_until": ""},
+        })
+        if rerun.modified_count:
+            return
+        await self.db.jobs.update_one(owned, {
+            "$set": {"status": SUCCEEDED, "result": result, "finished_at": now, "updated_at": now},
+            "$unset": {"active_key": "", "lease_owner": "", "lease_until": ""},
+        })
+    
+    async def _failed(self, job: dict, owned: dict, error: Exception):
+        now = datetime.utcnow()
+        message = f"{type(error).__name__}: {error}"
+        if job["attempts"] >= job["max_attempts"]:
+            logger.error("Job %s (%s) failed after %d attempts: %s", job["_id"], job["type"], job["attempts"], message)
+            await self.db.jobs.update_one(owned, {
+                "$set": {"status": FAILED, "last_error": message, "finished_at": now, "updated_at": now},
+                "$unset": {"active_key": "", "lease_owner": "", "lease_until": ""},
+            })
+            return
+        delay = retry_delay(job["attempts"])
+        logger.warning("Job %s (%s) attempt %d failed, retrying in %.0fs: %s",
+                       job["_id"], job["type"], job["attempts"], delay, message)
+        await self.db.jobs.update_one(owned, {
+            "$set": {
+                "status": QUEUED,
+                "run_at": now + timedelta(seconds=delay),
+                "last_error": message,
+                "updated_at": now,
+            },
+            "$unset": {"lease_owner": "", "lease_until": ""},
+        })
+    
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "slots": self.concurrency,
+            "running": sorted(self._running_types.values()),
+            "handlers": {t: {"concurrency": h.concurrency, "max_attempts": h.max_attempts} for t, h in HANDLERS.items()},
+        }
+
+
+job_runner = JobRunner(settings.JOB_CONCURRENCY, settings.JOB_POLL_SECONDS, settings.JOB_LEASE_SECONDS)
@@ -0,0 +1,29 @@
+"""
+Optional GridFS retention of enrollment photos and voice clips.
+
+With RETAIN_SOURCE_MEDIA enabled, every registered upload is kept in the
+face_media / voice_media buckets and its id stored on the embedding document
+as source_media_id, so the re-embedding job can rebuild vectors after a
+model change.
+"""
+from typing import Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from config import get_settings
+
+settings = get_settings()
+
+
+def _bucket(db, kind: str) -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name=f"{kind}_media")
+
+
+async def save_media(db, kind: str, data: bytes, filename: Optional[str], metadata: dict) -> Optional[ObjectId]:
+    if not settings.RETAIN_SOURCE_MEDIA:
+        return None
+    return await _bucket(db, kind).upload_from_stream(filename or kind, data, metadata=metadata)
+
+
+async def load_media(db, kind: str, media_id: ObjectId) -> bytes:
+    stream = await _bucket(db, kind).open_download_stream(media_id)
+    return await stream.read()
@@ -0,0 +1,220 @@
+"""
+Memory accounting for an API worker.
+
+- Current RSS of the process (from /proc) and its peak.
+- What loaded it: `track_memory(label)` records the RSS growth over a block;
+  lazy imports and model loads are wrapped in it, so /admin/memory can say
+  how much TensorFlow, Facenet or librosa cost. RSS deltas are approximate
+  (other threads allocate meanwhile, freed memory is not always returned to
+  the OS), but model loads are large enough to stand out.
+- In-process caches register themselves with `register_cache`; each reports
+  its entries and an estimate of its bytes, and evicts down to its own
+  budget as it grows.
+- With MEMORY_RSS_SOFT_LIMIT_BYTES set, MemoryMonitor checks RSS every
+  MEMORY_CHECK_SECONDS and, over the limit, has every cache drop half of
+  what it holds, so a worker sheds caches rather than get OOM-killed.
+- tracemalloc snapshots on demand, for finding what Python code allocates.
+
+A cache implements:
+
+    memory_stats() -> {"entries": int, "bytes": int, "budget_bytes": Optional[int]}
+    shrink(fraction: float) -> int   # drop about `fraction` of the bytes held; returns entries dropped
+"""
+import asyncio
+import gc
+import logging
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Optional
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_loaded: Dict[str, int] = {}
+_loaded_lock = threading.Lock()
+_caches: Dict[str, object] = {}
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size, None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KiB on Linux
+
+
+@contextmanager
+def track_memory(label: str):
+    """Attribute the RSS growth over the block to `label`."""
+    before = rss_bytes()
+    try:
+        yield
+    finally:
+        after = rss_bytes()
+        if before is not None and after is not None:
+            with _loaded_lock:
+                _loaded[label] = _loaded.get(label, 0) + max(0, after - before)
+
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """Bytes held by an object and the containers and strings it references."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    return size
+
+
+def register_cache(name: str, cache):
+    _caches[name] = cache
+
+
+def cache_stats() -> Dict[str, dict]:
+    return {name: cache.memory_stats() for name, cache in _caches.items()}
+
+
+def shrink_caches(fraction: float) -> Dict[str, int]:
+    """Have every registered cache drop about `fraction` of its bytes; entries dropped per cache."""
+    dropped = {name: cache.shrink(fraction) for name, cache in _caches.items()}
+    gc.collect()
+    return dropped
+
+
+class MemoryMonitor:
+    def __init__(self, soft_limit_bytes: int, check_seconds: float):
+        self.soft_limit_bytes = soft_limit_bytes
+        self.check_seconds = check_seconds
+        self.pressure_events = 0
+        self.last_shrink: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self.soft_limit_bytes and rss_bytes() is not None:
+            self._task = asyncio.create_task(self._loop())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.check_seconds)
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Memory check failed")
+    
+    def check(self):
+        rss = rss_bytes()
+        if rss is None or rss <= self.soft_limit_bytes:
+            return
+        self.pressure_events += 1
+        dropped = shrink_caches(0.5)
+        self.last_shrink = {"rss_bytes": rss, "dropped": dropped}
+        if any(dropped.values()):
+            logger.warning("RSS %d MB over the %d MB soft limit; shrank caches: %s",
+                           rss // 2**20, self.soft_limit_bytes // 2**20, dropped)
+
+
+memory_monitor = MemoryMonitor(settings.MEMORY_RSS_SOFT_LIMIT_BYTES, settings.MEMORY_CHECK_SECONDS)
+
+
+def memory_report() -> dict:
+    caches = cache_stats()
+    with _loaded_lock:
+        loaded = dict(sorted(_loaded.items(), key=lambda item: -item[1]))
+    return {
+        "rss_bytes": rss_bytes(),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "soft_limit_bytes": memory_monitor.soft_limit_bytes or None,
+        "pressure_events": memory_monitor.pressure_events,
+        "last_shrink": memory_monitor.last_shrink,
+        "loaded": loaded,
+        "caches": caches,
+        "cache_bytes": sum(stats["bytes"] for stats in caches.values()),
+        "tracemalloc": tracemalloc_status(),
+        "gc_objects": len(gc.get_objects()),
+    }
+
+
+# --- tracemalloc ------------------------------------------------------------
+
+_baseline: Optional[tracemalloc.Snapshot] = None
+
+
+def tracemalloc_status() -> dict:
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": True,
+        "frames": tracemalloc.get_traceback_limit(),
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+    }
+
+
+def start_tracing(frames: int):
+    """Start tracing allocations; the snapshot taken now is the baseline for comparisons."""
+    global _baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _baseline = tracemalloc.take_snapshot()
+
+
+def stop_tracing():
+    global _baseline
+    _baseline = None
+    tracemalloc.stop()
+
+
+def _filtered(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    return snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def top_allocations(limit: int, group_by: str = "lineno", compare: bool = False) -> list:
+    """
+    Largest allocation sites now, or with `compare` the largest growth since
+    tracing started. Taking a snapshot walks every traced block; run it off
+    the event loop.
+    """
+    snapshot = _filtered(tracemalloc.take_snapshot())
+    if compare and _baseline is not None:
+        stats = snapshot.compare_to(_filtered(_baseline), group_by)
+        return [
+            {"where": str(stat.traceback), "bytes": stat.size, "growth_bytes": stat.size_diff,
+             "count": stat.count, "growth_count": stat.count_diff}
+            for stat in stats[:limit]
+        ]
+    return [
+        {"where": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+        for stat in snapshot.statistics(group_by)[:limit]
+    ]
@@ -0,0 +1,43 @@
+"""
+Version tags for stored face and voice embeddings.
+
+Every embedding document records the model_version that produced it, and
+matching only compares a query with stored vectors of a compatible version.
+Bump CURRENT when a model or feature recipe change moves the embedding space,
+then run the re-embedding job (services/reembed.py) to convert stored vectors.
+"""
+from typing import Optional
+
+CURRENT = {
+    "face": "facenet512-v1",
+    "voice": "mfcc240-vad-v2",
+}
+
+# Versions whose vectors can still be compared with the current ones.
+# Silence trimming changed which frames feed the voice statistics, not the features.
+# Face crops (image_ingest) keep facenet512-v1: the embedder still runs its own
+# detection and eye alignment on the crop, and the crop keeps the face at least
+# FACE_INGEST_MIN_FACE_PIXELS wide, twice the 160px the face is resized to, so
+# Facenet gets the same aligned face as from the full image.
+COMPATIBLE = {
+    "face": ("facenet512-v1",),
+    "voice": ("mfcc240-vad-v2", "mfcc240-v1"),
+}
+
+# What a document without a model_version field (stored before versioning) holds
+LEGACY = {
+    "face": "facenet512-v1",
+    "voice": "mfcc240-v1",
+}
+
+
+def is_compatible(kind: str, version: Optional[str]) -> bool:
+    return (version or LEGACY[kind]) in COMPATIBLE[kind]
+
+
+def version_filter(kind: str) -> dict:
+    """Mongo filter selecting stored embeddings comparable with the current model."""
+    versions = list(COMPATIBLE[kind])
+    if LEGACY[kind] in versions:
+        versions.append(None)  # matches documents without the field
+    return {"model_version": {"$in": versions}}
@@ -0,0 +1,141 @@
+"""
+Keyset pagination over (created_at, _id) for newest-first listings.
+
+Pages are continued with an opaque cursor naming the last document returned,
+so the next page is an index range scan from that point rather than a skip
+over everything before it. Listings answer either a JSON array (cursor in
+the X-Next-Cursor header) or, for `Accept: application/x-ndjson`, one
+document per line written as the Motor cursor yields them, followed by a
+`{"next_cursor": ...}` line when more remain.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from config import get_settings
+from services.serialization import dumps, json_response
+
+settings = get_settings()
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON = "application/x-ndjson"
+
+
+def encode_cursor(doc: dict) -> str:
+    raw = json.dumps([doc["created_at"].isoformat(), str(doc["_id"])], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, doc_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), ObjectId(doc_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def keyset_query(query: dict, cursor: Optional[str]) -> dict:
+    """Restrict a newest-first query to documents after the cursor."""
+    if not cursor:
+        return query
+    created_at, doc_id = decode_cursor(cursor)
+    return {
+        **query,
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": doc_id}},
+        ],
+    }
+
+
+def parse_fields(fields: Optional[str], allowed: set) -> Optional[dict]:
+    """Projection for a comma-separated field list; _id and created_at are always kept for the cursor."""
+    if not fields:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = names - allowed
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return {name: 1 for name in names | {"_id", "created_at"}}
+
+
+def _line(value) -> bytes:
+    return dumps(value) + b"\n"
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON in request.headers.get("accept", "")
+
+
+def limit_for(request: Request, limit: Optional[int], default: int) -> int:
+    """Page size; JSON pages are capped at LISTING_MAX_LIMIT, NDJSON streams may ask for more."""
+    limit = limit or default
+    maximum = settings.LISTING_STREAM_MAX_LIMIT if wants_ndjson(request) else settings.LISTING_MAX_LIMIT
+    if limit < 1 or limit > maximum:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit must be between 1 and {maximum}"
+        )
+    return limit
+
+
+async def _stream(cursor, limit: int):
+    last = None
+    count = 0
+    async for doc in cursor:
+        if count == limit:
+            # The extra document only tells us another page exists
+            yield _line({"next_cursor": encode_cursor(last)})
+            break
+        count += 1
+        last = doc
+        yield _line(doc)
+    await cursor.close()
+
+
+def _find(collection, query: dict, cursor: Optional[str], limit: int, projection: Optional[dict]):
+    return collection.find(keyset_query(query, cursor), projection).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).limit(limit + 1)
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    cursor: Optional[str],
+    limit: int,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """One newest-first page of `collection` and the cursor for the next one, if any."""
+    docs: List[dict] = await _find(collection, query, cursor, limit, projection).to_list(limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1])
+    return docs, None
+
+
+async def paginate(
+    request: Request,
+    collection,
+    query: dict,
+    cursor: Optional[str],
+    limit: int,
+    projection: Optional[dict] = None,
+):
+    """One newest-first page of `collection`, as a JSON array or an NDJSON stream."""
+    if wants_ndjson(request):
+        return StreamingResponse(_stream(_find(collection, query, cursor, limit, projection), limit), media_type=NDJSON)
+
+    docs, next_cursor = await fetch_page(collection, query, cursor, limit, projection)
+    return json_response(docs, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
@@ -0,0 +1,121 @@
+"""
+Cheap checks that reject unusable images and audio before the models run.
+
+Each check takes a few milliseconds and raises QualityRejected with a
+stable reason code the mobile app can turn into guidance ("hold the phone
+still", "move closer", "speak up").
+"""
+import logging
+import time
+from typing import Tuple
+import numpy as np
+from config import get_settings
+from lazy_imports import lazy_import
+from services.image_ingest import LocatedImage
+from services.voice_activity import frame_energies_db, speech_threshold_db
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+UNDECODABLE_IMAGE = "undecodable_image"
+IMAGE_BLURRY = "image_blurry"
+IMAGE_UNDEREXPOSED = "image_underexposed"
+IMAGE_OVEREXPOSED = "image_overexposed"
+FACE_TOO_SMALL = "face_too_small"
+AUDIO_TOO_SHORT = "audio_too_short"
+AUDIO_TOO_QUIET = "audio_too_quiet"
+NO_SPEECH = "no_speech"
+
+# Gray levels counted as crushed shadows and blown highlights
+CLIPPED_SHADOW = 8
+CLIPPED_HIGHLIGHT = 247
+
+
+class QualityRejected(Exception):
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def clipped_fractions(gray: np.ndarray) -> Tuple[float, float]:
+    """Shares of pixels crushed to black and blown to white."""
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    return (float(histogram[:CLIPPED_SHADOW + 1].sum()) / gray.size,
+            float(histogram[CLIPPED_HIGHLIGHT:].sum()) / gray.size)
+
+
+def _face_region(located: LocatedImage) -> np.ndarray:
+    """The located face on the reduced copy, or the whole copy when no face was located."""
+    if located.face_box is None:
+        return located.gray
+    x, y, w, h = (int(v / located.scale) for v in located.face_box)
+    region = located.gray[y:y + h, x:x + w]
+    return region if region.size else located.gray
+
+
+def check_image(located: LocatedImage):
+    """
+    Raise QualityRejected if the located image is clearly unusable for face recognition.
+
+    A face the coarse locate pass missed is not a rejection: the image goes on
+    whole to the embedder, whose own detector decides.
+    """
+    if located.gray is None:
+        raise QualityRejected(UNDECODABLE_IMAGE, "Image could not be decoded")
+    if not settings.QUALITY_GATE_ENABLED:
+        return
+    cv2 = lazy_import("cv2")
+    started = time.perf_counter()
+    gray = located.gray
+
+    brightness = float(gray.mean())
+    if brightness < settings.QUALITY_MIN_BRIGHTNESS:
+        raise QualityRejected(IMAGE_UNDEREXPOSED, f"Image too dark (mean brightness {brightness:.0f})")
+    if brightness > settings.QUALITY_MAX_BRIGHTNESS:
+        raise QualityRejected(IMAGE_OVEREXPOSED, f"Image too bright (mean brightness {brightness:.0f})")
+
+    # A backlit or flash-blown face can average out fine over the whole frame
+    shadows, highlights = clipped_fractions(_face_region(located))
+    if shadows > settings.QUALITY_MAX_CLIPPED_SHADOWS:
+        raise QualityRejected(IMAGE_UNDEREXPOSED, f"Image too dark ({shadows:.0%} of pixels black)")
+    if highlights > settings.QUALITY_MAX_CLIPPED_HIGHLIGHTS:
+        raise QualityRejected(IMAGE_OVEREXPOSED, f"Image too bright ({highlights:.0%} of pixels white)")
+
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    if sharpness < settings.QUALITY_MIN_SHARPNESS:
+        raise QualityRejected(IMAGE_BLURRY, f"Image too blurry (sharpness {sharpness:.1f})")
+
+    face_size = None
+    if located.face_box is not None:
+        face_size = min(located.face_box[2], located.face_box[3])
+        if face_size < settings.QUALITY_MIN_FACE_SIZE:
+            raise QualityRejected(FACE_TOO_SMALL, f"Face too small ({face_size}px)")
+
+    logger.debug("Image passed quality gate in %.1fms (brightness %.0f, clipped %.2f/%.2f, sharpness %.1f, face %s)",
+                 (time.perf_counter() - started) * 1000, brightness, shadows, highlights, sharpness,
+                 f"{face_size}px" if face_size is not None else "not located")
+
+
+def voiced_ratio(energies_db: np.ndarray) -> float:
+    """Share of frames well above the recording's noise floor."""
+    return float(np.mean(energies_db > speech_threshold_db(energies_db)))
+
+
+def check_audio(audio: np.ndarray, sample_rate: int):
+    """Raise QualityRejected if decoded audio is too short, too quiet or has no speech."""
+    if len(audio) < sample_rate // 10:  # Less than 0.1 seconds
+        raise QualityRejected(AUDIO_TOO_SHORT, "Audio too short")
+    if not settings.QUALITY_GATE_ENABLED:
+        return
+    started = time.perf_counter()
+
+    rms_db = float(20 * np.log10(np.sqrt(np.mean(audio.astype(np.float64) ** 2)) + 1e-10))
+    if rms_db < settings.QUALITY_MIN_AUDIO_DBFS:
+        raise QualityRejected(AUDIO_TOO_QUIET, f"Audio too quiet ({rms_db:.1f} dBFS)")
+
+    ratio = voiced_ratio(frame_energies_db(audio, sample_rate))
+    if ratio < settings.QUALITY_MIN_VOICED_RATIO:
+        raise QualityRejected(NO_SPEECH, f"No speech detected (voiced ratio {ratio:.2f})")
+
+    logger.debug("Audio passed quality gate in %.1fms (%.1f dBFS, voiced ratio %.2f)",
+                 (time.perf_counter() - started) * 1000, rms_db, ratio)
@@ -0,0 +1,188 @@
+"""
+Slow-query capture for MongoDB, built on pymongo command monitoring.
+
+The listener sees every command the Motor client sends. Reads and writes
+slower than SLOW_QUERY_MS are kept in a bounded buffer; with
+QUERY_PROFILER_EXPLAIN_ALL every distinct query shape is kept once, which is
+how the load test flags collection scans. Plans are fetched lazily with
+`explain` (queryPlanner verbosity, so nothing is re-executed) when the
+buffer is inspected through /admin/slow-queries or collection_scans().
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+from pymongo import monitoring
+from config import get_settings
+from services.memory import deep_sizeof, register_cache
+
+settings = get_settings()
+
+PROFILED_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Driver bookkeeping that explain does not accept inside the wrapped command
+DRIVER_FIELDS = {"lsid", "txnNumber", "readConcern", "writeConcern", "apiVersion", "apiStrict",
+                 "apiDeprecationErrors", "autocommit", "startTransaction", "comment"}
+
+
+def _shape(value):
+    """Replace literals with '?' so queries that differ only in values group together."""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) for item in value):
+            return [_shape(item) for item in value]  # pipelines, $or branches
+        return ["?"]
+    return "?"
+
+
+def _summarize(command_name: str, command: dict) -> dict:
+    if command_name == "find":
+        return {"filter": command.get("filter", {}), "sort": command.get("sort"),
+                "projection": command.get("projection"), "limit": command.get("limit")}
+    if command_name == "aggregate":
+        return {"pipeline": command.get("pipeline", [])}
+    if command_name in ("count", "distinct"):
+        return {"filter": command.get("query", {}), "key": command.get("key")}
+    if command_name == "findAndModify":
+        return {"filter": command.get("query", {}), "sort": command.get("sort")}
+    statements = command.get("updates") or command.get("deletes") or [{}]
+    return {"filter": statements[0].get("q", {})}
+
+
+def _collection_scans(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_collection_scans(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_collection_scans(value) for value in plan)
+    return False
+
+
+def _indexes_used(plan, found: Optional[set] = None) -> set:
+    found = set() if found is None else found
+    if isinstance(plan, dict):
+        if plan.get("indexName"):
+            found.add(plan["indexName"])
+        for value in plan.values():
+            _indexes_used(value, found)
+    elif isinstance(plan, list):
+        for value in plan:
+            _indexes_used(value, found)
+    return found
+
+
+class QueryProfiler(monitoring.CommandListener):
+    def __init__(self, slow_ms: float, max_entries: int, explain_all: bool = False):
+        self.slow_ms = slow_ms
+        self.max_entries = max_entries
+        self.explain_all = explain_all
+        self._pending: Dict[int, tuple] = {}
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # pymongo calls these from whichever thread runs the command
+
+    def started(self, event):
+        if event.command_name in PROFILED_COMMANDS:
+            with self._lock:
+                self._pending[event.request_id] = (event.command_name, event.database_name, event.command)
+
+    def succeeded(self, event):
+        with self._lock:
+            pending = self._pending.pop(event.request_id, None)
+        if pending is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.slow_ms and not self.explain_all:
+            return
+        self._record(*pending, duration_ms)
+
+    def failed(self, event):
+        with self._lock:
+            self._pending.pop(event.request_id, None)
+
+    def _record(self, command_name: str, database_name: str, command: dict, duration_ms: float):
+        collection = command.get(command_name)
+        summary = _summarize(command_name, command)
+        # Sort, projection and grouping keys are part of the shape; only filter values vary
+        shape = {key: _shape(value) if key in ("filter", "pipeline") else value for key, value in summary.items()}
+        key = json.dumps([command_name, collection, shape], sort_keys=True, default=str)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                entry = {
+                    "command": command_name,
+                    "collection": collection,
+                    "database": database_name,
+                    "shape": shape,
+                    "example": summary,
+                    "explain_command": {k: v for k, v in command.items()
+                                        if k not in DRIVER_FIELDS and not k.startswith("$")},
+                    "count": 0,
+                    "slow_count": 0,
+                    "max_ms": 0.0,
+                    "plan": None,
+                }
+            entry["count"] += 1
+            if duration_ms >= self.slow_ms:
+                entry["slow_count"] += 1
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_seen"] = datetime.utcnow()
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def _explain(self, db, entry: dict):
+        started = time.perf_counter()
+        try:
+            result = await db.client[entry["database"]].command(
+                {"explain": entry["explain_command"], "verbosity": "queryPlanner"}
+            )
+        except Exception as e:
+            entry["plan"] = {"error": str(e)}
+            return
+        winning = result.get("queryPlanner", result).get("winningPlan", result)
+        entry["plan"] = {
+            "collection_scan": _collection_scans(winning),
+            "indexes": sorted(_indexes_used(winning)),
+            "explain_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    async def report(self, db) -> List[dict]:
+        """Captured query shapes, slowest first, with their plans."""
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            if entry["plan"] is None:
+                await self._explain(db, entry)
+        entries = sorted(entries, key=lambda e: e["max_ms"], reverse=True)
+        return [{k: v for k, v in entry.items() if k != "explain_command"} for entry in entries]
+
+    async def collection_scans(self, db) -> List[dict]:
+        return [entry for entry in await self.report(db) if (entry["plan"] or {}).get("collection_scan")]
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+    def memory_stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": deep_sizeof(self._entries), "budget_bytes": None}
+
+    def shrink(self, fraction: float) -> int:
+        with self._lock:
+            drop = int(len(self._entries) * fraction)
+            for _ in range(drop):
+                self._entries.popitem(last=False)
+        return drop
+
+
+query_profiler = QueryProfiler(
+    settings.SLOW_QUERY_MS,
+    settings.QUERY_PROFILER_MAX_ENTRIES,
+    settings.QUERY_PROFILER_EXPLAIN_ALL,
+)
+register_cache("query_profiler", query_profiler)
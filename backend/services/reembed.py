@@ -0,0 +1,210 @@
+"""
+Resumable re-embedding of stored face/voice embeddings after a model change.
+
+Walks a collection in _id order, reloads the retained source media of every
+embedding that is not at the current model version, re-runs extraction in
+batches and inserts the new vectors as separate documents. Old documents stay
+in place so API workers still on the previous release keep matching them;
+once the rollout is done, --prune deletes the superseded ones.
+
+Progress is checkpointed in the reembed_jobs collection after every batch,
+so an interrupted run picks up where it stopped. Documents whose extraction
+fails are kept in the job's failed_ids; every later run (including one
+started on a completed job) retries them before it finishes.
+
+    uv run python -m services.reembed face --batch-size 32 --max-per-second 20
+    uv run python -m services.reembed voice --prune
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from config import get_settings
+from services import model_versions
+from services.media_store import load_media
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+KINDS = ("face", "voice")
+
+
+def _extract(kind: str, media: list, cropped: bool) -> list:
+    if kind == "face":
+        from services.face_recognition import face_recognition_service
+        return face_recognition_service.extract_embeddings(media, cropped)
+    from services.voice_recognition import voice_recognition_service
+    return voice_recognition_service.extract_embeddings(media)
+
+
+async def _embed_batch(db, kind: str, docs: list) -> list:
+    """(source doc, embedding or None) for docs that have retained media."""
+    media = await asyncio.gather(*(load_media(db, kind, doc["source_media_id"]) for doc in docs))
+    cropped = [bool(doc.get("cropped")) for doc in docs]
+
+    results = [None] * len(docs)
+    for flag in set(cropped):
+        positions = [i for i, c in enumerate(cropped) if c == flag]
+        extracted = await run_in_threadpool(_extract, kind, [media[i] for i in positions], flag)
+        for i, (embedding, _) in zip(positions, extracted):
+            results[i] = embedding
+    return list(zip(docs, results))
+
+
+async def _convert(db, kind: str, collection, target: str, batch: list) -> Tuple[int, list]:
+    """
+    Re-embed a batch of source documents and insert the new ones. Returns how
+    many were inserted and the _ids of the documents whose extraction failed.
+    """
+    # The same media may already have a current-version embedding (resumed run,
+    # or a document that was itself re-embedded earlier)
+    media_ids = [doc["source_media_id"] for doc in batch if doc.get("source_media_id")]
+    done = {
+        doc["source_media_id"]
+        for doc in await collection.find(
+            {"source_media_id": {"$in": media_ids}, "model_version": target}, {"source_media_id": 1}
+        ).to_list(None)
+    }
+    todo = [doc for doc in batch if doc.get("source_media_id") and doc["source_media_id"] not in done]
+
+    now = datetime.utcnow()
+    new_docs, failed_ids = [], []
+    for source, embedding in await _embed_batch(db, kind, todo) if todo else []:
+        if embedding is None:
+            failed_ids.append(source["_id"])
+            continue
+        new_doc = {
+            "family_member_id": source["family_member_id"],
+            "patient_id": source["patient_id"],
+            "embedding": embedding,
+            "model_version": target,
+            "source_media_id": source["source_media_id"],
+            "reembedded_from": source["_id"],
+            "created_at": source.get("created_at", now),
+            "reembedded_at": now,
+        }
+        if source.get("cropped"):
+            new_doc["cropped"] = True
+        new_docs.append(new_doc)
+    if new_docs:
+        await collection.insert_many(new_docs)
+    return len(new_docs), failed_ids
+
+
+async def reembed(db, kind: str, batch_size: Optional[int] = None, max_per_second: Optional[float] = None) -> dict:
+    """
+    Re-embed every convertible document of one kind; returns the job state.
+    Documents that failed in an earlier run are retried after the new ones.
+    """
+    batch_size = batch_size or settings.REEMBED_BATCH_SIZE
+    max_per_second = max_per_second if max_per_second is not None else settings.REEMBED_MAX_PER_SECOND
+    target = model_versions.CURRENT[kind]
+    collection = db[f"{kind}_embeddings"]
+    job_id = f"{kind}:{target}"
+    projection = {"embedding": 0}
+
+    state = await db.reembed_jobs.find_one({"_id": job_id})
+    if state is None:
+        state = {
+            "_id": job_id, "kind": kind, "target_version": target, "status": "running",
+            "last_id": None, "processed": 0, "converted": 0, "skipped_no_media": 0, "failed": 0,
+            "failed_ids": [],
+            "total": await collection.count_documents({"model_version": {"$ne": target}}),
+            "started_at": datetime.utcnow(),
+        }
+    elif state["status"] == "completed" and not state.get("failed_ids"):
+        return state
+    # Failures carried over from earlier runs; ones failing in this run wait for the next
+    retry_ids = list(state.get("failed_ids", []))
+    state["status"] = "running"
+
+    async def checkpoint(attempted: list, failed_ids: list, started: float):
+        """Save progress: `attempted` ids leave failed_ids unless they are among `failed_ids`."""
+        attempted = set(attempted)
+        state["failed_ids"] = [i for i in state["failed_ids"] if i not in attempted] + failed_ids
+        state["failed"] = len(state["failed_ids"])
+        state["updated_at"] = datetime.utcnow()
+        await db.reembed_jobs.replace_one({"_id": job_id}, state, upsert=True)
+        logger.info("Re-embed %s: %d/%d processed, %d converted, %d without media, %d failed",
+                    job_id, state["processed"], state["total"], state["converted"],
+                    state["skipped_no_media"], state["failed"])
+        if max_per_second:
+            await asyncio.sleep(max(0.0, len(attempted) / max_per_second - (time.monotonic() - started)))
+
+    while True:
+        query = {"model_version": {"$ne": target}}
+        if state["last_id"] is not None:
+            query["_id"] = {"$gt": state["last_id"]}
+        batch = await collection.find(query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        started = time.monotonic()
+        converted, failed_ids = await _convert(db, kind, collection, target, batch)
+
+        state["last_id"] = batch[-1]["_id"]
+        state["processed"] += len(batch)
+        state["converted"] += converted
+        state["skipped_no_media"] += sum(1 for doc in batch if not doc.get("source_media_id"))
+        await checkpoint([doc["_id"] for doc in batch], failed_ids, started)
+
+    for start in range(0, len(retry_ids), batch_size):
+        started = time.monotonic()
+        chunk = retry_ids[start:start + batch_size]
+        # Documents deleted meanwhile drop out of failed_ids here
+        batch = await collection.find({"_id": {"$in": chunk}}, projection).to_list(None)
+        converted, failed_ids = await _convert(db, kind, collection, target, batch) if batch else (0, [])
+        state["converted"] += converted
+        await checkpoint(chunk, failed_ids, started)
+
+    state["status"] = "completed"
+    state["updated_at"] = datetime.utcnow()
+    await db.reembed_jobs.replace_one({"_id": job_id}, state, upsert=True)
+    logger.info("Re-embed %s completed, %d failed", job_id, state["failed"])
+    return state
+
+
+async def prune_superseded(db, kind: str) -> int:
+    """Delete older-version documents whose media now has a current-version embedding."""
+    target = model_versions.CURRENT[kind]
+    collection = db[f"{kind}_embeddings"]
+    converted = await collection.distinct("source_media_id", {"model_version": target})
+    result = await collection.delete_many({
+        "model_version": {"$ne": target},
+        "source_media_id": {"$in": converted},
+    })
+    logger.info("Pruned %d superseded %s embeddings", result.deleted_count, kind)
+    return result.deleted_count
+
+
+def main():
+    from database import close_mongo_connection, connect_to_mongo, get_database
+    from services.telemetry import configure_logging
+
+    parser = argparse.ArgumentParser(description="Re-embed stored face/voice embeddings at the current model version")
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("--batch-size", type=int, default=settings.REEMBED_BATCH_SIZE)
+    parser.add_argument("--max-per-second", type=float, default=settings.REEMBED_MAX_PER_SECOND,
+                        help="documents per second; 0 for no limit")
+    parser.add_argument("--prune", action="store_true", help="delete superseded documents instead of re-embedding")
+    args = parser.parse_args()
+    configure_logging()
+
+    async def run():
+        await connect_to_mongo()
+        db = get_database()
+        try:
+            if args.prune:
+                await prune_superseded(db, args.kind)
+            else:
+                await reembed(db, args.kind, args.batch_size, args.max_per_second)
+        finally:
+            await close_mongo_connection()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
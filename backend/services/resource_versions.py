@@ -0,0 +1,94 @@
+"""
+Version counters for cacheable read endpoints.
+
+Every write that changes what a read endpoint returns bumps the counter of
+the resource it touched in the resource_versions collection. The
+conditional-request layer derives ETags and Last-Modified from these
+counters, so it can answer If-None-Match without loading the resource
+itself. Counters are cached in-process for CONDITIONAL_VERSION_TTL_SECONDS;
+writes from this worker update the cache immediately, writes from other
+workers become visible when the entry expires. The cache keeps the
+RESOURCE_VERSION_CACHE_MAX_ENTRIES most recently used counters.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from pymongo import ReturnDocument
+from config import get_settings
+from services.memory import deep_sizeof, register_cache
+
+settings = get_settings()
+
+
+def patient_key(patient_id: str) -> str:
+    return f"patient:{patient_id}"
+
+
+def family_key(patient_id: str) -> str:
+    return f"family:{patient_id}"
+
+
+def member_key(member_id: str) -> str:
+    return f"member:{member_id}"
+
+
+def patient_conversations_key(patient_id: str) -> str:
+    return f"conversations:patient:{patient_id}"
+
+
+def member_conversations_key(member_id: str) -> str:
+    return f"conversations:member:{member_id}"
+
+
+class ResourceVersions:
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # key -> (version, updated_at, expires_at), least recently written first
+        self._cache: Dict[str, Tuple[int, Optional[datetime], float]] = {}
+    
+    def _remember(self, key: str, version: int, updated_at: Optional[datetime]):
+        self._cache.pop(key, None)
+        self._cache[key] = (version, updated_at, time.monotonic() + self.ttl_seconds)
+        if len(self._cache) > self.max_entries:
+            self._drop(len(self._cache) - self.max_entries)
+    
+    def _drop(self, count: int) -> int:
+        for key in list(self._cache)[:count]:
+            del self._cache[key]
+        return count
+    
+    async def get(self, db, key: str) -> Tuple[int, Optional[datetime]]:
+        """(version, updated_at); (0, None) for a resource never written since versioning started."""
+        cached = self._cache.get(key)
+        if cached is not None and cached[2] > time.monotonic():
+            return cached[0], cached[1]
+        doc = await db.resource_versions.find_one({"_id": key})
+        version, updated_at = (doc["version"], doc["updated_at"]) if doc else (0, None)
+        self._remember(key, version, updated_at)
+        return version, updated_at
+    
+    async def _bump_one(self, db, key: str):
+        doc = await db.resource_versions.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._remember(key, doc["version"], doc["updated_at"])
+    
+    async def bump(self, db, *keys: str):
+        await asyncio.gather(*(self._bump_one(db, key) for key in keys))
+    
+    def memory_stats(self) -> dict:
+        return {"entries": len(self._cache), "bytes": deep_sizeof(self._cache), "budget_bytes": None}
+    
+    def shrink(self, fraction: float) -> int:
+        return self._drop(int(len(self._cache) * fraction))
+
+
+resource_versions = ResourceVersions(
+    settings.CONDITIONAL_VERSION_TTL_SECONDS, settings.RESOURCE_VERSION_CACHE_MAX_ENTRIES
+)
+register_cache("resource_versions", resource_versions)
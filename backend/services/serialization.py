@@ -0,0 +1,37 @@
+"""
+orjson-backed JSON responses.
+
+Handlers return `json_response(...)` with the Mongo documents and models they
+already built. Returning a Response skips FastAPI's response_model validation
+and jsonable_encoder pass, which re-walk data the handler produced itself;
+`response_model` stays on the routes for the OpenAPI schema. ObjectId,
+datetime, numpy values and pydantic models are encoded directly by orjson.
+"""
+from typing import Any, Mapping, Optional
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None) -> FastJSONResponse:
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
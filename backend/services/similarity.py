@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class EmbeddingGallery:
+    """
+    Stored embeddings of one patient's family held as a single normalized
+    matrix, so matching a query is one matrix-vector product instead of a
+    Python loop of scipy cosine calls.
+    """
+
+    def __init__(self, member_ids: List[str], matrix: np.ndarray):
+        self.member_ids = member_ids
+        self.matrix = normalize_rows(matrix.astype(np.float32)) if len(member_ids) else matrix
+
+    @classmethod
+    def from_documents(cls, stored_embeddings: List[dict]) -> "EmbeddingGallery":
+        if not stored_embeddings:
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+        return cls(
+            [doc["family_member_id"] for doc in stored_embeddings],
+            np.array([doc["embedding"] for doc in stored_embeddings], dtype=np.float32),
+        )
+
+    def __len__(self) -> int:
+        return len(self.member_ids)
+
+    def similarities(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query against every stored embedding."""
+        return self.matrix @ normalize_rows(np.asarray(query, dtype=np.float32))
+
+    def best_match(self, query: np.ndarray, threshold: float) -> Tuple[Optional[str], float]:
+        """(family_member_id, similarity) of the closest embedding, id None below threshold."""
+        if not self.member_ids:
+            return None, 0.0
+        scores = self.similarities(query)
+        best = int(np.argmax(scores))
+        similarity = float(scores[best])
+        if similarity < threshold:
+            return None, similarity
+        return self.member_ids[best], similarity
+
+    def member_scores(self, query: np.ndarray) -> Dict[str, float]:
+        """Best similarity per family member across all of their stored embeddings."""
+        scores: Dict[str, float] = {}
+        if not self.member_ids:
+            return scores
+        for member_id, similarity in zip(self.member_ids, self.similarities(query).tolist()):
+            if similarity > scores.get(member_id, -1.0):
+                scores[member_id] = similarity
+        return scores
+
+
+MISS_SIMILARITY = 0.0  # a member not enrolled in a modality the query carries
+
+
+def fuse_scores(modalities: List[Tuple[Dict[str, float], float, float]], threshold: float) -> Dict[str, float]:
+    """
+    Weighted average of per-member similarities over (scores, weight,
+    modality_threshold) triples. Each modality is first shifted so that its
+    own calibrated threshold lands on `threshold`, so a member exactly at
+    every modality's threshold fuses to `threshold`. Every member
+    scored in any modality is scored in all of them: one who is not enrolled
+    in a modality the query carries counts as a miss there (MISS_SIMILARITY).
+    """
+    members = {member_id for scores, _, _ in modalities for member_id in scores}
+    total_weight = sum(weight for _, weight, _ in modalities)
+    if not members or total_weight <= 0:
+        return {}
+    fused = dict.fromkeys(members, 0.0)
+    for scores, weight, modality_threshold in modalities:
+        for member_id in members:
+            similarity = scores.get(member_id, MISS_SIMILARITY)
+            fused[member_id] += weight * (similarity - modality_threshold + threshold)
+    return {member_id: total / total_weight for member_id, total in fused.items()}
@@ -0,0 +1,443 @@
+"""
+Structured logging and request tracing.
+
+Logging: modules log through `logging.getLogger(__name__)`. Records are put
+on a bounded queue by the request thread and written as JSON lines (or plain
+text with LOG_JSON=false) by a background listener thread, so a slow stdout
+never stalls a request; when the queue is full records are dropped and
+counted. Every line carries the trace and span id of the code that logged
+it. Verbose per-request lines are logged at DEBUG and kept only for sampled
+traces (TRACE_SAMPLE_RATE), unless LOG_LEVEL is DEBUG.
+
+Tracing: `span(name, **attributes)` is a context manager usable from async
+handlers and from threadpool code alike (the current span lives in a
+contextvar). TracingMiddleware opens a root span per HTTP request, honouring
+an incoming W3C `traceparent` and returning one; MongoSpanListener records a
+span per Mongo command. Finished spans of sampled traces are batched by
+another background thread and sent as OTLP/JSON to TRACING_OTLP_ENDPOINT
+(an OpenTelemetry collector's HTTP receiver, e.g. http://localhost:4318), or
+written to the log when no endpoint is set.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import secrets
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import httpx
+from pymongo import monitoring
+from config import get_settings
+
+settings = get_settings()
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "trace_id", "span_id"}
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+
+# ---------------------------------------------------------------------------
+# Spans
+# ---------------------------------------------------------------------------
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        attributes: Optional[dict] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        parent: Optional["Span"] = None,
+        trace_id: Optional[str] = None,
+        parent_id: Optional[str] = None,
+        sampled: Optional[bool] = None,
+    ):
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.trace_id = parent.trace_id if parent else (trace_id or secrets.token_hex(16))
+        self.parent_id = parent.span_id if parent else parent_id
+        self.span_id = secrets.token_hex(8)
+        if parent is not None:
+            self.sampled = parent.sampled
+        else:
+            self.sampled = sampled if sampled is not None else random.random() < settings.TRACE_SAMPLE_RATE
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        self._token = None
+    
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+    
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+    
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.sampled:
+                span_exporter.submit(self)
+    
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.end()
+        _current_span.reset(self._token)
+        return False
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Span:
+    """Child of the current span (or a new trace outside any request)."""
+    return Span(name, attributes, kind, parent=_current_span.get())
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent, or None."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def traceparent(current: Span) -> str:
+    return f"00-{current.trace_id}-{current.span_id}-{'01' if current.sampled else '00'}"
+
+
+# ---------------------------------------------------------------------------
+# Span export
+# ---------------------------------------------------------------------------
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(finished: Span) -> dict:
+    otlp = {
+        "traceId": finished.trace_id,
+        "spanId": finished.span_id,
+        "name": finished.name,
+        "kind": finished.kind,
+        "startTimeUnixNano": str(finished.start_ns),
+        "endTimeUnixNano": str(finished.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in finished.attributes.items()],
+        "status": {"code": 2, "message": finished.error} if finished.error else {"code": 1},
+    }
+    if finished.parent_id:
+        otlp["parentSpanId"] = finished.parent_id
+    return otlp
+
+
+class SpanExporter:
+    """Batches finished spans off the request path and ships them from a daemon thread."""
+    def __init__(self, endpoint: str, service_name: str, max_queue: int = 10000, batch_size: int = 256):
+        self.endpoint = endpoint.rstrip("/") + "/v1/traces" if endpoint else ""
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    def submit(self, finished: Span):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+    
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+    
+    def _run(self):
+        client = httpx.Client(timeout=5.0) if self.endpoint else None
+        logger = logging.getLogger("trace")
+        while True:
+            batch: List[Span] = [self._queue.get()]
+            deadline = time.monotonic() + 1.0
+            while len(batch) < self.batch_size and time.monotonic() < deadline:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stop = None in batch
+            batch = [item for item in batch if item is not None]
+            if batch:
+                if client is not None:
+                    self._post(client, batch)
+                else:
+                    for finished in batch:
+                        logger.info("span", extra={
+                            "span": finished.name,
+                            "trace_id": finished.trace_id,
+                            "span_id": finished.span_id,
+                            "parent_id": finished.parent_id,
+                            "duration_ms": round(finished.duration_ms, 2),
+                            "error": finished.error,
+                            **finished.attributes,
+                        })
+            if stop:
+                return
+    
+    def _post(self, client: httpx.Client, batch: List[Span]):
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "backend"}, "spans": [_otlp_span(s) for s in batch]}],
+        }]}
+        try:
+            client.post(self.endpoint, json=payload).raise_for_status()
+        except httpx.HTTPError as e:
+            self.dropped += len(batch)
+            logging.getLogger(__name__).warning("Span export to %s failed: %s", self.endpoint, e)
+    
+    def shutdown(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5.0)
+
+
+span_exporter = SpanExporter(settings.TRACING_OTLP_ENDPOINT, settings.SERVICE_NAME)
+
+
+# ---------------------------------------------------------------------------
+# Logging
+# ---------------------------------------------------------------------------
+
+class _ContextFilter(logging.Filter):
+    """Runs in the caller's thread: stamps trace ids and drops lines below LOG_LEVEL outside sampled traces."""
+    def __init__(self, level: int):
+        super().__init__()
+        self.level = level
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = _current_span.get()
+        if record.levelno < self.level and not (current and current.sampled):
+            return False
+        if not hasattr(record, "trace_id"):
+            record.trace_id = current.trace_id if current else None
+            record.span_id = current.span_id if current else None
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Format the message and traceback here, so the listener gets plain data
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+            entry["span_id"] = record.span_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[_DroppingQueueHandler] = None
+
+
+def configure_logging():
+    """Route all logging through the queue; safe to call more than once."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    level = logging.getLevelName(settings.LOG_LEVEL.upper())
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if settings.LOG_JSON else logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s: %(message)s"
+    ))
+    
+    log_queue: queue.Queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    _queue_handler = _DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(_ContextFilter(level))
+    
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    # Verbose lines reach the filter, which keeps them for sampled traces only
+    root.setLevel(logging.DEBUG if settings.TRACE_SAMPLE_RATE > 0 else level)
+    for noisy in ("pymongo", "httpx", "httpcore", "urllib3", "asyncio", "multipart", "numba", "matplotlib", "PIL"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown_telemetry)
+
+
+def _forget_listener_after_fork():
+    # The listener thread does not survive fork(); a forked child calls
+    # configure_logging() again to get its own queue and listener
+    global _listener
+    _listener = None
+
+
+os.register_at_fork(after_in_child=_forget_listener_after_fork)
+
+
+def shutdown_telemetry():
+    """Flush queued log lines and spans."""
+    global _listener
+    span_exporter.shutdown()
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def telemetry_stats() -> dict:
+    return {
+        "log_lines_dropped": _queue_handler.dropped if _queue_handler else 0,
+        "spans_dropped": span_exporter.dropped,
+        "trace_sample_rate": settings.TRACE_SAMPLE_RATE,
+        "otlp_endpoint": span_exporter.endpoint or None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Integrations
+# ---------------------------------------------------------------------------
+
+class TracingMiddleware:
+    """Root span and one access-log line per HTTP request."""
+    def __init__(self, app):
+        self.app = app
+        self.logger = logging.getLogger("access")
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+    
+        headers = dict(scope.get("headers") or [])
+        incoming = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        trace_id, parent_id, sampled = incoming if incoming else (None, None, None)
+        root = Span(
+            f"{scope['method']} {scope['path']}", {"http.method": scope["method"], "http.target": scope["path"]},
+            SPAN_KIND_SERVER, trace_id=trace_id, parent_id=parent_id, sampled=sampled,
+        )
+        status_code = 500
+    
+        async def send_with_trace(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", []).append((b"traceparent", traceparent(root).encode()))
+            await send(message)
+    
+        with root:
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                route = scope.get("route")
+                path = getattr(route, "path", scope["path"])
+                root.name = f"{scope['method']} {path}"
+                root.set_attribute("http.route", path)
+                root.set_attribute("http.status_code", status_code)
+                if status_code >= 500:
+                    root.error = root.error or f"HTTP {status_code}"
+                self.logger.info("request", extra={
+                    "method": scope["method"],
+                    "route": path,
+                    "status": status_code,
+                    "duration_ms": round(root.duration_ms, 2),
+                })
+
+
+class MongoSpanListener(monitoring.CommandListener):
+    """A client span per Mongo command, parented to the span that issued it."""
+    def __init__(self):
+        self._open: Dict[int, Span] = {}
+        self._lock = threading.Lock()
+    
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            return
+        collection = event.command.get(event.command_name)
+        child = Span(f"mongo.{event.command_name}", {
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+            "db.collection": collection if isinstance(collection, str) else "",
+        }, SPAN_KIND_CLIENT, parent=parent)
+        with self._lock:
+            self._open[event.request_id] = child
+    
+    def _finish(self, event, error: Optional[str] = None):
+        with self._lock:
+            child = self._open.pop(event.request_id, None)
+        if child is not None:
+            child.error = error
+            child.end()
+    
+    def succeeded(self, event):
+        self._finish(event)
+    
+    def failed(self, event):
+        self._finish(event, str(event.failure))
+
+
+mongo_span_listener = MongoSpanListener()
@@ -0,0 +1,137 @@
+"""
+Bounded reads of request bodies and uploaded files.
+
+UploadLimitMiddleware caps every request body: a Content-Length over the
+route's limit is answered with 413 before anything is read, and a body that
+turns out longer (chunked, or a lying Content-Length) is cut off with 413 as
+soon as the limit is crossed, so an oversized upload never ends up in
+memory or in a spooled temp file.
+
+Routes then read through read_image / read_audio, which hold each file to
+its own limit, or, for raw bodies, read_body, which streams the body into a
+buffer preallocated from Content-Length and returns a memoryview of it. The
+decoders (np.frombuffer, the inference worker's framing) take the view as
+is, so the image bytes are copied once, off the socket.
+"""
+from typing import Optional
+from fastapi import HTTPException, Request, UploadFile, status
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import get_settings
+from services.serialization import dumps
+
+settings = get_settings()
+
+# Path prefixes with a larger whole-request limit than UPLOAD_MAX_REQUEST_BYTES
+BULK_PATHS = ("/recognition/face/register/bulk", "/recognition/voice/register/bulk")
+
+
+def request_limit(path: str) -> int:
+    if path.startswith(BULK_PATHS):
+        return settings.UPLOAD_MAX_BULK_BYTES
+    return settings.UPLOAD_MAX_REQUEST_BYTES
+
+
+def _format_size(size: int) -> str:
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):g} MB"
+    return f"{size // 1024} KB"
+
+
+def _too_large(limit: int, what: str = "Request body") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"{what} is larger than {_format_size(limit)}"
+    )
+
+
+def _content_length(headers: Headers) -> Optional[int]:
+    value = headers.get("content-length")
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Content-Length")
+
+
+async def read_body(request: Request, limit: int, what: str = "Request body") -> memoryview:
+    """The whole request body, at most `limit` bytes, as a view over one buffer."""
+    expected = _content_length(request.headers)
+    if expected is not None and expected > limit:
+        raise _too_large(limit, what)
+    buffer = bytearray(expected or 0)
+    size = 0
+    async for chunk in request.stream():
+        end = size + len(chunk)
+        if end > limit:
+            raise _too_large(limit, what)
+        if end <= len(buffer):
+            buffer[size:end] = chunk
+        else:
+            # No or short Content-Length: grow as chunks arrive
+            del buffer[size:]
+            buffer += chunk
+        size = end
+    return memoryview(buffer)[:size]
+
+
+async def read_upload(upload: UploadFile, limit: int, what: str) -> bytes:
+    """Contents of an uploaded file, rejected with 413 when over `limit`."""
+    if upload.size is not None and upload.size > limit:
+        raise _too_large(limit, what)
+    data = await upload.read(limit + 1)
+    if len(data) > limit:
+        raise _too_large(limit, what)
+    return data
+
+
+async def read_image(upload: UploadFile) -> bytes:
+    return await read_upload(upload, settings.UPLOAD_MAX_IMAGE_BYTES, "Image")
+
+
+async def read_audio(upload: UploadFile) -> bytes:
+    return await read_upload(upload, settings.UPLOAD_MAX_AUDIO_BYTES, "Audio")
+
+
+class UploadLimitMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS", "DELETE"):
+            await self.app(scope, receive, send)
+            return
+    
+        limit = request_limit(scope["path"])
+        try:
+            expected = _content_length(Headers(scope=scope))
+        except HTTPException as e:
+            await self._reject(send, e)
+            return
+        if expected is not None and expected > limit:
+            await self._reject(send, _too_large(limit))
+            return
+    
+        received = 0
+    
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the route's body read; the exception handler answers 413
+                    raise _too_large(limit)
+            return message
+    
+        await self.app(scope, limited_receive, send)
+    
+    async def _reject(self, send: Send, error: HTTPException):
+        body = dumps({"detail": error.detail})
+        await send({"type": "http.response.start", "status": error.status_code, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"connection", b"close"),
+        ]})
+        await send({"type": "http.response.body", "body": body})
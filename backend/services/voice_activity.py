@@ -0,0 +1,89 @@
+"""
+Energy-based voice activity detection for voice embeddings.
+
+The mobile recorder captures silence before and after the speaker talks.
+Those frames pull the MFCC mean/std toward the room noise, so the embedder
+only sees the voiced segments found here, capped at VOICE_MAX_SPEECH_SECONDS.
+"""
+from typing import List, Tuple
+import numpy as np
+from config import get_settings
+
+settings = get_settings()
+
+FRAME_MS = 25.0
+HOP_MS = 10.0
+
+
+def frame_energies_db(audio: np.ndarray, sample_rate: int, frame_ms: float = FRAME_MS, hop_ms: float = HOP_MS) -> np.ndarray:
+    """Per-frame RMS energy in dBFS."""
+    frame_length = int(sample_rate * frame_ms / 1000)
+    hop_length = int(sample_rate * hop_ms / 1000)
+    if len(audio) < frame_length:
+        return np.array([20 * np.log10(np.sqrt(np.mean(audio ** 2)) + 1e-10)])
+    frames = np.lib.stride_tricks.sliding_window_view(audio, frame_length)[::hop_length]
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    return 20 * np.log10(rms + 1e-10)
+
+
+def speech_threshold_db(energies_db: np.ndarray) -> float:
+    """Frames this loud count as speech: well above the recording's noise floor."""
+    noise_floor = np.percentile(energies_db, 10)
+    return max(noise_floor + 10.0, settings.QUALITY_MIN_AUDIO_DBFS)
+
+
+def _frame_runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, end) frame index pairs of consecutive True values."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def speech_segments(audio: np.ndarray, sample_rate: int) -> List[Tuple[int, int]]:
+    """
+    (start, end) sample ranges of speech. Short pauses inside a phrase are
+    bridged, blips shorter than VOICE_VAD_MIN_SPEECH_MS are dropped and each
+    segment is padded so word onsets are not clipped.
+    """
+    energies = frame_energies_db(audio, sample_rate)
+    runs = _frame_runs(energies > speech_threshold_db(energies))
+    if not runs:
+        return []
+
+    max_gap = settings.VOICE_VAD_MAX_GAP_MS / HOP_MS
+    merged = [list(runs[0])]
+    for start, end in runs[1:]:
+        if start - merged[-1][1] <= max_gap:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    hop = int(sample_rate * HOP_MS / 1000)
+    frame = int(sample_rate * FRAME_MS / 1000)
+    padding = int(sample_rate * settings.VOICE_VAD_PADDING_MS / 1000)
+    min_frames = settings.VOICE_VAD_MIN_SPEECH_MS / HOP_MS
+
+    segments = []
+    for start, end in merged:
+        if end - start < min_frames:
+            continue
+        segments.append((
+            max(0, start * hop - padding),
+            min(len(audio), (end - 1) * hop + frame + padding),
+        ))
+    return segments
+
+
+def voiced_audio(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Speech segments joined end to end, at most VOICE_MAX_SPEECH_SECONDS long."""
+    budget = int(settings.VOICE_MAX_SPEECH_SECONDS * sample_rate)
+    parts = []
+    for start, end in speech_segments(audio, sample_rate):
+        end = min(end, start + budget)
+        parts.append(audio[start:end])
+        budget -= end - start
+        if budget <= 0:
+            break
+    if not parts:
+        return audio[:int(settings.VOICE_MAX_SPEECH_SECONDS * sample_rate)]
+    return np.concatenate(parts)
@@ -1,64 +1,112 @@
+import logging
 import numpy as np
-from scipy.spatial.distance import cosine
 from typing import List, Optional, Tuple
 import tempfile
 import os
 import base64
-import traceback
 from config import get_settings
+from lazy_imports import lazy_import
+from services.inference_client import inference_client
+from services.quality_gate import QualityRejected, check_audio
+from services.telemetry import span
+from services.voice_activity import voiced_audio
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 
 class VoiceRecognitionService:
     def __init__(self):
         self.threshold = settings.VOICE_RECOGNITION_THRESHOLD
     
+    def warm_up(self):
+        """Import librosa (and its numba-compiled kernels) ahead of the first request."""
+        lazy_import("librosa")
+    
     def extract_embedding(self, audio_data: bytes) -> Optional[List[float]]:
+        """
+        Extract voice embedding, in the inference worker when one is configured.
+        Raises QualityRejected for audio that fails the quality gate and
+        InferenceError when the inference worker cannot answer.
+        """
+        if inference_client.enabled:
+            return inference_client.extract_voice_embedding(audio_data)
+        return self.extract_embedding_local(audio_data)
+    
+    def extract_embeddings(self, clips: List[bytes]) -> List[Tuple[Optional[List[float]], Optional[str]]]:
+        """
+        Batch version of extract_embedding for enrollment: one inference worker
+        round-trip for all clips. Returns an (embedding, rejection reason) pair per clip;
+        raises InferenceError when the inference worker cannot answer.
+        """
+        if inference_client.enabled:
+            return [tuple(item) for item in inference_client.extract_voice_embeddings(clips)]
+        return self.extract_embeddings_local(clips)
+    
+    def extract_embeddings_local(self, clips: List[bytes]) -> List[Tuple[Optional[List[float]], Optional[str]]]:
+        results = []
+        for audio_data in clips:
+            try:
+                results.append((self.extract_embedding_local(audio_data), None))
+            except QualityRejected as e:
+                results.append((None, e.reason))
+        return results
+    
+    def extract_embedding_local(self, audio_data: bytes) -> Optional[List[float]]:
         """Extract voice embedding from audio bytes using MFCC features."""
         tmp_path = None
         try:
-            print(f"Received audio data: {len(audio_data)} bytes")
+            logger.debug("Received audio data: %d bytes", len(audio_data))
             
             # Save as WAV (mobile app now records in WAV format)
             with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
                 tmp.write(audio_data)
                 tmp_path = tmp.name
             
-            print(f"Saved to: {tmp_path}")
+            # Load audio with librosa; VAD keeps at most VOICE_MAX_SPEECH_SECONDS of speech,
+            # so decoding (and resampling) stops once that plus some silence is in
+            librosa = lazy_import("librosa")
+            duration = None
+            if settings.VOICE_VAD_ENABLED:
+                duration = settings.VOICE_MAX_SPEECH_SECONDS + settings.VOICE_DECODE_MARGIN_SECONDS
+            with span("voice.decode", bytes=len(audio_data)):
+                audio, sr = librosa.load(tmp_path, sr=16000, duration=duration)
+            logger.debug("Loaded audio: %d samples at %dHz", len(audio), sr)
             
-            # Load audio with librosa
-            import librosa
-            audio, sr = librosa.load(tmp_path, sr=16000)
-            print(f"Loaded audio: {len(audio)} samples at {sr}Hz")
+            with span("voice.quality_gate"):
+                check_audio(audio, sr)
             
-            if len(audio) < 1600:  # Less than 0.1 seconds
-                print("Audio too short")
-                return None
+            if settings.VOICE_VAD_ENABLED:
+                with span("voice.vad"):
+                    audio = voiced_audio(audio, sr)
+                logger.debug("Voiced audio: %.2fs", len(audio) / sr)
             
             # Extract MFCC features (simple but effective for voice)
-            mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=40)
-            
-            # Create a fixed-size embedding by taking statistics
-            embedding = []
-            for i in range(mfccs.shape[0]):
-                embedding.append(float(np.mean(mfccs[i])))
-                embedding.append(float(np.std(mfccs[i])))
-                embedding.append(float(np.min(mfccs[i])))
-                embedding.append(float(np.max(mfccs[i])))
-            
-            # Add delta features for more robustness
-            delta_mfccs = librosa.feature.delta(mfccs)
-            for i in range(delta_mfccs.shape[0]):
-                embedding.append(float(np.mean(delta_mfccs[i])))
-                embedding.append(float(np.std(delta_mfccs[i])))
+            with span("voice.embed", seconds=round(len(audio) / sr, 2)):
+                mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=40)
+                
+                # Create a fixed-size embedding by taking statistics
+                embedding = []
+                for i in range(mfccs.shape[0]):
+                    embedding.append(float(np.mean(mfccs[i])))
+                    embedding.append(float(np.std(mfccs[i])))
+                    embedding.append(float(np.min(mfccs[i])))
+                    embedding.append(float(np.max(mfccs[i])))
+                
+                # Add delta features for more robustness
+                delta_mfccs = librosa.feature.delta(mfccs)
+                for i in range(delta_mfccs.shape[0]):
+                    embedding.append(float(np.mean(delta_mfccs[i])))
+                    embedding.append(float(np.std(delta_mfccs[i])))
             
-            print(f"Generated embedding with {len(embedding)} dimensions")
+            logger.debug("Generated embedding with %d dimensions", len(embedding))
             return embedding
                 
-        except Exception as e:
-            print(f"Voice embedding extraction error: {e}")
-            traceback.print_exc()
+        except QualityRejected as e:
+            logger.info("Audio rejected (%s): %s", e.reason, e)
+            raise
+        except Exception:
+            logger.exception("Voice embedding extraction error")
             return None
         finally:
             if tmp_path and os.path.exists(tmp_path):
@@ -74,7 +122,7 @@ class VoiceRecognitionService:
             audio_data = base64.b64decode(base64_audio)
             return self.extract_embedding(audio_data)
         except Exception as e:
-            print(f"Base64 decoding error: {e}")
+            logger.warning("Base64 decoding error: %s", e)
             return None
     
     def compare_embeddings(
@@ -84,11 +132,12 @@ class VoiceRecognitionService:
     ) -> float:
         """Compare two embeddings and return similarity score (0-1)."""
         try:
+            cosine = lazy_import("scipy.spatial.distance").cosine
             distance = cosine(embedding1, embedding2)
             similarity = 1 - distance
             return similarity
         except Exception as e:
-            print(f"Embedding comparison error: {e}")
+            logger.warning("Embedding comparison error: %s", e)
             return 0.0
     
     def find_match(
@@ -0,0 +1,155 @@
+"""
+Incremental voice embedding for streamed PCM audio.
+
+Produces the same 240-value MFCC statistics as
+VoiceRecognitionService.extract_embedding_local, but updates them chunk by
+chunk: each new STFT frame is computed once, gated by energy (the streaming
+counterpart of services.voice_activity) and folded into running
+sum/sum-of-squares/min/max accumulators. Nothing is recomputed over the
+growing recording, so the embedding can be matched after every chunk.
+"""
+from collections import deque
+from typing import List, Optional
+import numpy as np
+from config import get_settings
+from lazy_imports import lazy_import
+from services.voice_activity import speech_threshold_db
+
+settings = get_settings()
+
+SAMPLE_RATE = 16000
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+N_MFCC = 40
+TOP_DB = 80.0
+DELTA_WIDTH = 9
+# Frames this loud are speech even before a noise floor has been observed
+LOUD_SPEECH_DBFS = -30.0
+NOISE_HISTORY_FRAMES = 1000
+
+_mel_basis = None
+_window = None
+
+
+def _get_filters():
+    global _mel_basis, _window
+    if _mel_basis is None:
+        librosa = lazy_import("librosa")
+        _mel_basis = librosa.filters.mel(sr=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS)
+        _window = librosa.filters.get_window("hann", N_FFT, fftbins=True)
+    return _mel_basis, _window
+
+
+class RunningStats:
+    """Per-coefficient count, mean, std, min and max over a stream of frames."""
+
+    def __init__(self, size: int):
+        self.count = 0
+        self.total = np.zeros(size)
+        self.total_sq = np.zeros(size)
+        self.minimum = np.full(size, np.inf)
+        self.maximum = np.full(size, -np.inf)
+
+    def add(self, frames: np.ndarray, weight: int = 1):
+        frames = np.atleast_2d(frames)
+        self.count += len(frames) * weight
+        self.total += frames.sum(axis=0) * weight
+        self.total_sq += (frames ** 2).sum(axis=0) * weight
+        self.minimum = np.minimum(self.minimum, frames.min(axis=0))
+        self.maximum = np.maximum(self.maximum, frames.max(axis=0))
+
+    def mean_std(self, extra: Optional[np.ndarray] = None, extra_weight: int = 0):
+        count, total, total_sq = self.count, self.total, self.total_sq
+        if extra is not None and extra_weight:
+            count += extra_weight
+            total = total + extra * extra_weight
+            total_sq = total_sq + extra ** 2 * extra_weight
+        mean = total / count
+        return mean, np.sqrt(np.maximum(total_sq / count - mean ** 2, 0.0))
+
+
+class StreamingVoiceEmbedder:
+    def __init__(self):
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._energies = deque(maxlen=NOISE_HISTORY_FRAMES)
+        self._max_db = -np.inf
+        self._recent = deque(maxlen=DELTA_WIDTH)
+        self._last_delta = None
+        self.mfcc_stats = RunningStats(N_MFCC)
+        self.delta_stats = RunningStats(N_MFCC)
+        self.voiced_frames = 0
+        self.total_samples = 0
+
+    @property
+    def speech_seconds(self) -> float:
+        return self.voiced_frames * HOP_LENGTH / SAMPLE_RATE
+
+    @property
+    def full(self) -> bool:
+        return self.speech_seconds >= settings.VOICE_MAX_SPEECH_SECONDS
+
+    def feed_pcm16(self, chunk: bytes):
+        """Add little-endian 16-bit mono PCM at 16 kHz."""
+        samples = np.frombuffer(chunk[:len(chunk) - len(chunk) % 2], dtype="<i2")
+        self.feed(samples.astype(np.float32) / 32768.0)
+
+    def feed(self, samples: np.ndarray):
+        self.total_samples += len(samples)
+        if self.full:
+            return
+        buffer = np.concatenate([self._pending, samples])
+        if len(buffer) < N_FFT:
+            self._pending = buffer
+            return
+
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, N_FFT)[::HOP_LENGTH]
+        self._pending = buffer[len(frames) * HOP_LENGTH:]
+
+        rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+        energies = 20 * np.log10(rms + 1e-10)
+        self._energies.extend(energies)
+        threshold = min(speech_threshold_db(np.fromiter(self._energies, dtype=np.float64)), LOUD_SPEECH_DBFS)
+        voiced = frames[energies > max(threshold, settings.QUALITY_MIN_AUDIO_DBFS)]
+        if len(voiced) == 0:
+            return
+
+        budget = int(np.ceil((settings.VOICE_MAX_SPEECH_SECONDS - self.speech_seconds) * SAMPLE_RATE / HOP_LENGTH))
+        for mfcc in self._mfcc(voiced[:budget]):
+            self._add_frame(mfcc)
+
+    def _mfcc(self, frames: np.ndarray) -> np.ndarray:
+        scipy_fft = lazy_import("scipy.fft")
+        mel_basis, window = _get_filters()
+        power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+        mel_db = 10.0 * np.log10(np.maximum(power @ mel_basis.T, 1e-10))
+        # librosa clips at top_db below the clip's maximum; use the maximum so far
+        self._max_db = max(self._max_db, float(mel_db.max()))
+        mel_db = np.maximum(mel_db, self._max_db - TOP_DB)
+        return scipy_fft.dct(mel_db, type=2, norm="ortho", axis=1)[:, :N_MFCC]
+
+    def _add_frame(self, mfcc: np.ndarray):
+        self.voiced_frames += 1
+        self.mfcc_stats.add(mfcc)
+        self._recent.append(mfcc)
+        if len(self._recent) < DELTA_WIDTH:
+            return
+
+        # Savitzky-Golay first derivative (order 1), as librosa.feature.delta
+        half = DELTA_WIDTH // 2
+        offsets = np.arange(-half, half + 1)
+        delta = offsets @ np.array(self._recent) / float(np.sum(offsets ** 2))
+        # librosa's "interp" edges reuse the first full window's slope for the leading frames
+        self.delta_stats.add(delta, weight=half + 1 if self._last_delta is None else 1)
+        self._last_delta = delta
+
+    def embedding(self) -> Optional[List[float]]:
+        """Current embedding, or None until enough speech has been heard."""
+        if self._last_delta is None:
+            return None
+        mfcc_mean, mfcc_std = self.mfcc_stats.mean_std()
+        # ...and for the trailing frames, which have no full window yet
+        tail = DELTA_WIDTH // 2
+        delta_mean, delta_std = self.delta_stats.mean_std(self._last_delta, tail)
+        statistics = np.stack([mfcc_mean, mfcc_std, self.mfcc_stats.minimum, self.mfcc_stats.maximum], axis=1)
+        return statistics.ravel().tolist() + np.stack([delta_mean, delta_std], axis=1).ravel().tolist()
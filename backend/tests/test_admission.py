@@ -0,0 +1,60 @@
+"""Admission control: caller keys and the inference slot."""
+import asyncio
+import base64
+import json
+import pytest
+from services.admission import AdmissionController, MemoryBuckets, Overloaded, caller_key
+
+
+def _scope(token: str) -> dict:
+    return {"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())], "client": ("10.0.0.1", 1)}
+
+
+def _unsigned_jwt(uid: str, signature: str) -> str:
+    claims = base64.urlsafe_b64encode(json.dumps({"user_id": uid}).encode()).decode().rstrip("=")
+    return f"e30.{claims}.{signature}"
+
+
+def test_forged_token_does_not_share_the_victims_bucket():
+    victim = _unsigned_jwt("victim", "real-signature")
+    forged = _unsigned_jwt("victim", "forged")
+    
+    assert caller_key(_scope(victim)) != caller_key(_scope(forged))
+    assert caller_key(_scope(victim)) == caller_key(_scope(victim))
+
+
+def test_caller_without_token_is_keyed_by_address():
+    assert caller_key({"type": "http", "headers": [], "client": ("10.0.0.1", 1)}) == "ip:10.0.0.1"
+
+
+@pytest.mark.asyncio
+async def test_inference_slot_is_held_only_inside_the_block():
+    controller = AdmissionController(MemoryBuckets(), inference_slots=1, queue_timeout=0.01)
+    
+    async with controller.inference_slot():
+        assert controller.in_flight == 1
+        with pytest.raises(Overloaded):
+            async with controller.inference_slot():
+                pass
+    assert controller.in_flight == 0
+    
+    async with controller.inference_slot():
+        pass
+    assert controller.rejected == {"inference:busy": 1}
+
+
+@pytest.mark.asyncio
+async def test_waiter_gets_the_slot_when_it_frees_up():
+    controller = AdmissionController(MemoryBuckets(), inference_slots=1, queue_timeout=1.0)
+    released = asyncio.Event()
+    
+    async def hold():
+        async with controller.inference_slot():
+            await released.wait()
+    
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    asyncio.get_running_loop().call_later(0.05, released.set)
+    async with controller.inference_slot():
+        assert controller.in_flight == 1
+    await holder
@@ -0,0 +1,107 @@
+"""Conditional GET: ETags per content coding and If-None-Match matching."""
+from datetime import datetime
+import httpx
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from auth import verify_firebase_token
+from services import conditional as conditional_module
+from services.compression import CompressionMiddleware
+from services.conditional import ConditionalHeadersMiddleware, NotModified, conditional, not_modified_handler
+
+PATIENTS = {"p1": {"name": "Ada " * 400}}  # over the compression threshold
+VERSIONS = {"patient:p1": (3, datetime(2026, 1, 1))}
+
+
+def _vary(response) -> set:
+    return {token.strip() for token in response.headers["vary"].split(",")}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def get_version(db, key):
+        return VERSIONS.get(key, (0, None))
+    
+    monkeypatch.setattr(conditional_module.resource_versions, "get", get_version)
+    monkeypatch.setattr(conditional_module, "get_database", lambda: None)
+    
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    app.add_middleware(ConditionalHeadersMiddleware)
+    app.add_exception_handler(NotModified, not_modified_handler)
+    app.dependency_overrides[verify_firebase_token] = lambda: {"uid": "u1"}
+    
+    @app.get("/patients/{patient_id}", dependencies=[Depends(
+        conditional(lambda pid: f"patient:{pid}", "patient_id"))])
+    async def get_patient(patient_id: str):
+        if patient_id not in PATIENTS:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        return PATIENTS[patient_id]
+    
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_each_coding_has_its_own_etag(client):
+    async with client:
+        gzip = await client.get("/patients/p1", headers={"Accept-Encoding": "gzip"})
+        identity = await client.get("/patients/p1", headers={"Accept-Encoding": "identity"})
+    
+    assert gzip.headers["content-encoding"] == "gzip"
+    assert gzip.headers["etag"].endswith('-gzip"')
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["etag"] != gzip.headers["etag"]
+
+
+@pytest.mark.asyncio
+async def test_not_modified_carries_the_etag_of_the_requested_coding(client):
+    async with client:
+        first = await client.get("/patients/p1", headers={"Accept-Encoding": "gzip"})
+        again = await client.get("/patients/p1", headers={
+            "Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]})
+    
+    assert again.status_code == 304
+    assert again.headers["etag"] == first.headers["etag"]
+    assert _vary(again) == _vary(first)
+
+
+@pytest.mark.asyncio
+async def test_gzip_etag_does_not_validate_an_identity_request(client):
+    async with client:
+        gzip = await client.get("/patients/p1", headers={"Accept-Encoding": "gzip"})
+        identity = await client.get("/patients/p1", headers={
+            "Accept-Encoding": "identity", "If-None-Match": gzip.headers["etag"]})
+    
+    assert identity.status_code == 200
+    assert identity.json() == PATIENTS["p1"]
+
+
+@pytest.mark.asyncio
+async def test_weak_form_of_the_etag_still_matches(client):
+    async with client:
+        first = await client.get("/patients/p1", headers={"Accept-Encoding": "gzip"})
+        again = await client.get("/patients/p1", headers={
+            "Accept-Encoding": "gzip", "If-None-Match": "W/" + first.headers["etag"]})
+    
+    assert again.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_star_matches_only_a_written_resource(client):
+    async with client:
+        existing = await client.get("/patients/p1", headers={"If-None-Match": "*"})
+        missing = await client.get("/patients/nobody", headers={"If-None-Match": "*"})
+    
+    assert existing.status_code == 304
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_vary_covers_every_response(client):
+    async with client:
+        identity = await client.get("/patients/p1", headers={"Accept-Encoding": "identity"})
+        gzip = await client.get("/patients/p1", headers={"Accept-Encoding": "gzip"})
+        again = await client.get("/patients/p1", headers={
+            "Accept-Encoding": "gzip", "If-None-Match": gzip.headers["etag"]})
+    
+    for response in (identity, gzip, again):
+        assert _vary(response) == {"Accept", "Accept-Encoding"}
@@ -0,0 +1,45 @@
+"""Batched first-face embedding keeps going past images that break detection; ONNX matches DeepFace."""
+import os
+import numpy as np
+import pytest
+from config import get_settings
+from services.face_onnx import check_parity, represent_first_faces
+
+FACE_IMAGE = os.path.join(os.path.dirname(__file__), "data", "face.jpg")
+
+
+def _first_face(img: np.ndarray) -> dict:
+    if img.size == 0:
+        raise ValueError("empty image")
+    return {"face": img, "facial_area": {"w": img.shape[1], "h": img.shape[0]}, "confidence": 1.0}
+
+
+def test_detection_failure_only_drops_its_own_image():
+    described = []
+    
+    def describe(faces):
+        described.append(len(faces))
+        return [{"embedding": [float(face["face"].shape[0])]} for face in faces]
+    
+    imgs = [np.zeros((60, 60, 3)), np.zeros((0, 0, 3)), np.zeros((80, 80, 3))]
+    results = represent_first_faces(imgs, _first_face, describe)
+    
+    assert results == [{"embedding": [60.0]}, None, {"embedding": [80.0]}]
+    assert described == [2]  # the detected faces still go through the model as one batch
+
+
+def test_no_detected_faces_skips_the_model():
+    def describe(faces):
+        raise AssertionError("model called without faces")
+    
+    assert represent_first_faces([np.zeros((0, 0, 3))], _first_face, describe) == [None]
+
+
+def test_onnx_embedding_matches_deepface():
+    pytest.importorskip("deepface")
+    pytest.importorskip("onnxruntime")
+    model_path = get_settings().FACE_ONNX_MODEL_PATH
+    if not os.path.exists(model_path):
+        pytest.skip(f"no exported model at {model_path} (python -m services.face_onnx export)")
+    
+    assert check_parity([FACE_IMAGE], model_path, min_similarity=0.999)
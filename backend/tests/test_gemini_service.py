@@ -0,0 +1,122 @@
+"""Gemini call policy: circuit breaker, deadline fallback and hedging, against FakeGeminiModel."""
+import asyncio
+import time
+import pytest
+from services import gemini_service as gemini_module
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from services.gemini_service import FakeGeminiModel, GeminiService
+
+
+class ScriptedModel(FakeGeminiModel):
+    """FakeGeminiModel whose n-th call takes latencies[n] seconds (the last one repeats) and counts calls."""
+    def __init__(self, latencies, error_rate: float = 0.0):
+        super().__init__(0, error_rate)
+        self.latencies = list(latencies)
+        self.calls = 0
+    
+    async def generate_content_async(self, prompt, request_options=None):
+        latency = self.latencies[min(self.calls, len(self.latencies) - 1)]
+        self.calls += 1
+        await asyncio.sleep(latency)
+        return await super().generate_content_async(prompt, request_options)
+
+
+def _service(model, failures: int = 3, reset_seconds: float = 60.0) -> GeminiService:
+    service = GeminiService()
+    service.model = model
+    service.breaker = CircuitBreaker("gemini-test", failures, reset_seconds)
+    return service
+
+
+@pytest.fixture(autouse=True)
+def no_hedging(monkeypatch):
+    monkeypatch.setattr(gemini_module.settings, "GEMINI_HEDGE_AFTER_SECONDS", 0)
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_consecutive_failures():
+    model = ScriptedModel([0], error_rate=1.0)
+    service = _service(model, failures=3)
+    
+    for _ in range(3):
+        assert await service._generate("summary", "prompt", 1.0) is None
+    assert service.breaker.state == OPEN
+    
+    assert await service._generate("summary", "prompt", 1.0) is None
+    assert model.calls == 3  # short-circuited, Gemini not called
+    assert service.breaker.short_circuited == 1
+
+
+@pytest.mark.asyncio
+async def test_half_open_breaker_lets_exactly_one_probe_through():
+    model = ScriptedModel([0, 0, 0.1])
+    service = _service(model, failures=2, reset_seconds=0.05)
+    model.error_rate = 1.0
+    for _ in range(2):
+        await service._generate("summary", "prompt", 1.0)
+    assert service.breaker.state == OPEN
+    
+    model.error_rate = 0.0
+    await asyncio.sleep(0.06)
+    results = await asyncio.gather(*(service._generate("summary", "prompt", 1.0) for _ in range(5)))
+    
+    assert model.calls == 3  # the two failures, then a single probe
+    assert sum(result is not None for result in results) == 1
+    assert service.breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_failed_probe_reopens_the_breaker():
+    model = ScriptedModel([0], error_rate=1.0)
+    service = _service(model, failures=1, reset_seconds=0.05)
+    await service._generate("summary", "prompt", 1.0)
+    await asyncio.sleep(0.06)
+    assert service.breaker.allow() and service.breaker.state == HALF_OPEN
+    service.breaker.release()
+    
+    await service._generate("summary", "prompt", 1.0)
+    
+    assert service.breaker.state == OPEN
+    assert not service.breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_greeting_falls_back_to_the_template_within_the_deadline(monkeypatch):
+    monkeypatch.setattr(gemini_module.settings, "GEMINI_GREETING_DEADLINE_SECONDS", 0.1)
+    service = _service(ScriptedModel([5.0]))
+    
+    started = time.monotonic()
+    greeting = await service.generate_recognition_greeting("Anna", "daughter", "the garden")
+    elapsed = time.monotonic() - started
+    
+    assert greeting == "This is Anna, your daughter. Last time you talked about: the garden"
+    assert elapsed < 0.5
+    assert service.counters["timeouts"] == 1
+    assert service.counters["fallbacks"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_when_the_first_request_stalls(monkeypatch):
+    monkeypatch.setattr(gemini_module.settings, "GEMINI_HEDGE_AFTER_SECONDS", 0.05)
+    model = ScriptedModel([5.0, 0])
+    service = _service(model)
+    
+    started = time.monotonic()
+    text = await service._generate("greeting", "prompt", 1.0)
+    
+    assert text is not None
+    assert time.monotonic() - started < 0.5
+    assert model.calls == 2
+    assert service.counters["hedges"] == 1
+    assert service.counters["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_when_the_first_request_answers_in_time(monkeypatch):
+    monkeypatch.setattr(gemini_module.settings, "GEMINI_HEDGE_AFTER_SECONDS", 0.2)
+    model = ScriptedModel([0])
+    service = _service(model)
+    
+    assert await service._generate("greeting", "prompt", 1.0) is not None
+    assert model.calls == 1
+    assert service.counters["hedges"] == 0
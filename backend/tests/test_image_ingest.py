@@ -0,0 +1,95 @@
+"""Face localization on reduced decodes: small faces in large photos must still be found."""
+from pathlib import Path
+import io
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+from config import get_settings
+from services import image_ingest
+from services.quality_gate import check_image
+
+settings = get_settings()
+
+FACE = cv2.imread(str(Path(__file__).parent / "data" / "face.jpg"))
+FACE_WIDTH = 97  # of the face the cascade finds in face.jpg
+
+
+def _canvas(width: int, height: int, face_pixels: int) -> np.ndarray:
+    """Textured background with face.jpg scaled so its face is face_pixels wide."""
+    rng = np.random.default_rng(0)
+    canvas = cv2.GaussianBlur(rng.integers(60, 200, (height, width, 3), dtype=np.uint8), (0, 0), 2)
+    factor = face_pixels / FACE_WIDTH
+    face = cv2.resize(FACE, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    y, x = height // 3, width // 2
+    canvas[y:y + face.shape[0], x:x + face.shape[1]] = face
+    return canvas
+
+
+def _photo(width: int, height: int, face_pixels: int) -> bytes:
+    ok, encoded = cv2.imencode(".jpg", _canvas(width, height, face_pixels), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    assert ok
+    return encoded.tobytes()
+
+
+def _rotated_phone_photo(width: int, height: int, face_pixels: int) -> bytes:
+    """Portrait photo as phones store it: pixels turned on their side, EXIF orientation 6 to turn them upright."""
+    stored = cv2.rotate(_canvas(width, height, face_pixels), cv2.ROTATE_90_COUNTERCLOCKWISE)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    out = io.BytesIO()
+    Image.fromarray(stored[:, :, ::-1]).save(out, "JPEG", quality=90, exif=exif)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("width, height, face_pixels", [
+    (1024, 768, 55),
+    (2048, 1536, 100),
+    (4032, 3024, 60),
+    (4032, 3024, 187),
+])
+def test_small_face_in_large_photo_is_located(width, height, face_pixels):
+    located = image_ingest.locate(_photo(width, height, face_pixels))
+    
+    assert located.face_box is not None
+    x, y, w, h = located.face_box
+    assert abs(x - width // 2) < face_pixels * 2 and abs(y - height // 3) < face_pixels * 2
+    assert max(located.gray.shape) <= settings.FACE_INGEST_DETECT_MAX_DIMENSION
+    check_image(located)
+
+
+def test_crop_keeps_small_face_wide_enough():
+    data = _photo(4032, 3024, 60)
+    crop, scale = image_ingest.crop_face(data, image_ingest.locate(data))
+    
+    # Full resolution was needed: the crop is the face plus margins, not the whole frame
+    assert scale == pytest.approx(1.0)
+    assert max(crop.shape[:2]) < 4 * 60
+
+
+def test_no_face_falls_back_to_whole_image():
+    rng = np.random.default_rng(1)
+    blank = cv2.GaussianBlur(rng.integers(60, 200, (1536, 2048, 3), dtype=np.uint8), (0, 0), 2)
+    data = cv2.imencode(".jpg", blank)[1].tobytes()
+    located = image_ingest.locate(data)
+    
+    assert located.face_box is None
+    crop, scale = image_ingest.crop_face(data, located)
+    assert max(crop.shape[:2]) == settings.FACE_INGEST_EMBED_MAX_DIMENSION
+
+
+def test_exif_rotated_photo_is_measured_upright():
+    data = _rotated_phone_photo(1200, 1600, 100)
+    located = image_ingest.locate(data)
+    
+    assert (located.width, located.height) == (1200, 1600)
+    assert located.gray.shape[1] * located.scale == pytest.approx(1200, rel=0.01)
+    assert located.face_box is not None
+    x, y, w, h = located.face_box
+    assert abs(x - 600) < 100 and abs(y - 1600 // 3) < 100
+    assert w == pytest.approx(100, rel=0.2)
+    
+    crop, scale = image_ingest.crop_face(data, located)
+    # The crop keeps the face at FACE_INGEST_MIN_FACE_PIXELS or as much as the photo has
+    assert w / scale >= min(w, settings.FACE_INGEST_MIN_FACE_PIXELS) * 0.95
+    assert scale == pytest.approx(1.0)
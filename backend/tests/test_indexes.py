@@ -0,0 +1,86 @@
+"""ensure_indexes: per-collection failures and TTL changes applied with collMod."""
+import logging
+import pytest
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+import database
+from database import INDEX_OPTIONS_CONFLICT, ensure_indexes
+
+
+class FakeCollection:
+    """Index bookkeeping of a Motor collection: name -> options."""
+    def __init__(self, db, name):
+        self.database = db
+        self.name = name
+        self.indexes = {}
+    
+    async def create_indexes(self, models):
+        for model in models:
+            document = dict(model.document)
+            name = document.pop("name")
+            if self.database.broken == self.name:
+                raise OperationFailure("not authorized", code=13)
+            if name in self.indexes and self.indexes[name] != document:
+                raise OperationFailure("Index with name %s already exists with different options" % name,
+                                       code=INDEX_OPTIONS_CONFLICT)
+            self.indexes[name] = document
+        return [model.document["name"] for model in models]
+    
+    async def index_information(self):
+        return {"_id_": {}, **self.indexes}
+
+
+class FakeDatabase:
+    def __init__(self, broken=None):
+        self.broken = broken
+        self.collections = {}
+        self.commands = []
+    
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection(self, name))
+    
+    async def command(self, name, collection, index):
+        self.commands.append((name, collection, index))
+        for document in self[collection].indexes.values():
+            if document["key"] == index["keyPattern"]:
+                document["expireAfterSeconds"] = index["expireAfterSeconds"]
+
+
+@pytest.mark.asyncio
+async def test_changed_ttl_is_applied_with_coll_mod(monkeypatch):
+    db = FakeDatabase()
+    monkeypatch.setattr(database, "INDEXES", {"jobs": [IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=86400)]})
+    await ensure_indexes(db)
+    
+    monkeypatch.setattr(database, "INDEXES", {"jobs": [IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=7 * 86400)]})
+    await ensure_indexes(db)
+    
+    assert [command[:2] for command in db.commands] == [("collMod", "jobs")]
+    assert db["jobs"].indexes["finished_at_1"]["expireAfterSeconds"] == 7 * 86400
+
+
+@pytest.mark.asyncio
+async def test_other_option_conflicts_are_not_coll_modded(monkeypatch, caplog):
+    db = FakeDatabase()
+    monkeypatch.setattr(database, "INDEXES", {"patients": [IndexModel([("firebase_uid", ASCENDING)])]})
+    await ensure_indexes(db)
+    
+    monkeypatch.setattr(database, "INDEXES", {"patients": [IndexModel([("firebase_uid", ASCENDING)], unique=True)]})
+    with caplog.at_level(logging.ERROR, logger="database"):
+        await ensure_indexes(db)
+    
+    assert db.commands == []
+    assert "Could not ensure indexes on patients" in caplog.text
+    assert "different options" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_a_failing_collection_does_not_stop_the_others(caplog):
+    db = FakeDatabase(broken="family_members")
+    with caplog.at_level(logging.ERROR, logger="database"):
+        await ensure_indexes(db)
+    
+    assert "Could not ensure indexes on family_members" in caplog.text
+    assert "whitelist" not in caplog.text
+    assert "finished_at_1" in db["jobs"].indexes
+    assert db["family_members"].indexes == {}
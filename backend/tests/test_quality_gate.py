@@ -0,0 +1,37 @@
+"""Quality gate decisions on located images."""
+import numpy as np
+import pytest
+from services.image_ingest import LocatedImage
+from services.quality_gate import IMAGE_OVEREXPOSED, IMAGE_UNDEREXPOSED, QualityRejected, check_image
+
+
+def _located(gray: np.ndarray, face_box=None) -> LocatedImage:
+    return LocatedImage(gray.shape[1] * 2, gray.shape[0] * 2, gray, 2.0, face_box, False)
+
+
+def _textured(low: int, high: int, shape=(480, 640)) -> np.ndarray:
+    return np.random.default_rng(0).integers(low, high, shape, dtype=np.uint8)
+
+
+def test_missed_face_is_not_rejected():
+    check_image(_located(_textured(60, 200)))
+
+
+def test_backlit_face_is_underexposed():
+    gray = _textured(150, 250)
+    gray[100:300, 200:400] = np.random.default_rng(1).integers(0, 12, (200, 200), dtype=np.uint8)
+    
+    # The frame as a whole is bright enough; the face is not
+    check_image(_located(gray))
+    with pytest.raises(QualityRejected) as rejected:
+        check_image(_located(gray, face_box=(400, 200, 400, 400)))
+    assert rejected.value.reason == IMAGE_UNDEREXPOSED
+
+
+def test_blown_highlights_are_overexposed():
+    gray = _textured(60, 200)
+    gray[:, :320] = 255
+    
+    with pytest.raises(QualityRejected) as rejected:
+        check_image(_located(gray))
+    assert rejected.value.reason == IMAGE_OVEREXPOSED
@@ -0,0 +1,37 @@
+"""Fusing face and voice scores per family member."""
+import pytest
+from services.similarity import fuse_scores
+
+FACE_THRESHOLD, VOICE_THRESHOLD, FUSED_THRESHOLD = 0.6, 0.8, 0.75
+
+
+def _fuse(face: dict, voice: dict) -> dict:
+    return fuse_scores([(face, 0.5, FACE_THRESHOLD), (voice, 0.5, VOICE_THRESHOLD)], FUSED_THRESHOLD)
+
+
+def test_each_modality_is_scored_against_its_own_threshold():
+    # Both just over their own thresholds: a match, though the raw face score is under the fused threshold
+    fused = _fuse({"anna": 0.65}, {"anna": 0.85})
+    
+    assert fused["anna"] == pytest.approx(0.80)
+    assert fused["anna"] >= FUSED_THRESHOLD
+
+
+def test_member_at_every_threshold_fuses_to_the_fused_threshold():
+    assert _fuse({"anna": FACE_THRESHOLD}, {"anna": VOICE_THRESHOLD})["anna"] == pytest.approx(FUSED_THRESHOLD)
+
+
+def test_member_missing_from_a_modality_scores_a_miss_there():
+    fused = _fuse({"anna": 0.9, "ben": 0.9}, {"anna": 0.82})
+    
+    assert fused["ben"] < FUSED_THRESHOLD < fused["anna"]
+
+
+def test_single_modality_keeps_its_scores_relative_to_its_threshold():
+    fused = fuse_scores([({"anna": 0.7}, 0.6, FACE_THRESHOLD)], FUSED_THRESHOLD)
+    
+    assert fused == {"anna": pytest.approx(0.85)}
+
+
+def test_nothing_to_fuse():
+    assert fuse_scores([], FUSED_THRESHOLD) == {}
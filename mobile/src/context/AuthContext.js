@@ -1,6 +1,6 @@
 import React, { createContext, useState, useEffect, useContext } from 'react';
 import { onAuthChange, logOut } from '../services/firebase';
-import { getPatientProfile, getFamilyMemberProfile } from '../services/api';
+import { getBootstrap } from '../services/api';
 
 const AuthContext = createContext({});
 
@@ -8,28 +8,32 @@ export const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [userProfile, setUserProfile] = useState(null);
   const [userType, setUserType] = useState(null);
+  const [bootstrap, setBootstrap] = useState(null);
   const [loading, setLoading] = useState(true);
 
+  // One /bootstrap round-trip resolves the role and profile and preloads
+  // what the home screens show; lists continue from bootstrap.next_cursors
+  const loadBootstrap = async () => {
+    try {
+      const data = await getBootstrap();
+      setBootstrap(data);
+      setUserProfile(data.profile || null);
+      setUserType(data.role);
+    } catch (e) {
+      setBootstrap(null);
+      setUserProfile(null);
+      setUserType(null);
+    }
+  };
+
   useEffect(() => {
     const unsubscribe = onAuthChange(async (firebaseUser) => {
       setUser(firebaseUser);
       
       if (firebaseUser) {
-        try {
-          const patientProfile = await getPatientProfile();
-          setUserProfile(patientProfile);
-          setUserType('patient');
-        } catch (e) {
-          try {
-            const familyProfile = await getFamilyMemberProfile();
-            setUserProfile(familyProfile);
-            setUserType('family_member');
-          } catch (e2) {
-            setUserProfile(null);
-            setUserType(null);
-          }
-        }
+        await loadBootstrap();
       } else {
+        setBootstrap(null);
         setUserProfile(null);
         setUserType(null);
       }
@@ -42,27 +46,14 @@ export const AuthProvider = ({ children }) => {
 
   const refreshProfile = async () => {
     if (!user) return;
-    
-    try {
-      const patientProfile = await getPatientProfile();
-      setUserProfile(patientProfile);
-      setUserType('patient');
-    } catch (e) {
-      try {
-        const familyProfile = await getFamilyMemberProfile();
-        setUserProfile(familyProfile);
-        setUserType('family_member');
-      } catch (e2) {
-        setUserProfile(null);
-        setUserType(null);
-      }
-    }
+    await loadBootstrap();
   };
 
   const logout = async () => {
     try {
       await logOut();
       setUser(null);
+      setBootstrap(null);
       setUserProfile(null);
       setUserType(null);
     } catch (error) {
@@ -76,6 +67,7 @@ export const AuthProvider = ({ children }) => {
       user,
       userProfile,
       userType,
+      bootstrap,
       loading,
       refreshProfile,
       logout,
@@ -65,18 +65,21 @@ export default function LoginScreen({ navigation }) {
     try {
       const photo = await cameraRef.current.takePictureAsync({
         quality: 0.4,
-        base64: true,
+        base64: false,
         skipProcessing: true,
       });
 
-      const response = await fetch(`${API_URL}/auth/patient-face-login`, {
+      // Upload the photo file as is instead of base64 inside JSON
+      const formData = new FormData();
+      formData.append('image', {
+        uri: photo.uri,
+        type: 'image/jpeg',
+        name: 'face.jpg',
+      });
+
+      const response = await fetch(`${API_URL}/auth/patient-face-login/image`, {
         method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          image_base64: photo.base64,
-        }),
+        body: formData,
       });
 
       const data = await response.json();
@@ -14,7 +14,7 @@ import { getPatientLocation, getPatientHome } from '../../services/api';
 import { MAPBOX_ACCESS_TOKEN } from '../../config';
 
 export default function TrackPatientScreen({ navigation }) {
-  const { userProfile } = useAuth();
+  const { userProfile, bootstrap } = useAuth();
   const [patientLocation, setPatientLocation] = useState(null);
   const [homeLocation, setHomeLocation] = useState(null);
   const [myLocation, setMyLocation] = useState(null);
@@ -23,24 +23,27 @@ export default function TrackPatientScreen({ navigation }) {
   const [mapReady, setMapReady] = useState(false);
   const webViewRef = useRef(null);
 
+  const showHome = (home) => {
+    setHomeLocation({
+      latitude: home.home_latitude,
+      longitude: home.home_longitude,
+      address: home.home_address,
+    });
+  };
+
+  const showPatientLocation = (location) => {
+    setPatientLocation({
+      latitude: location.latitude,
+      longitude: location.longitude,
+    });
+    setLastUpdated(new Date(location.timestamp));
+  };
+
   const loadLocations = async () => {
     try {
-      // Get patient location and home
-      const [location, home] = await Promise.all([
-        getPatientLocation(userProfile.patient_id),
-        getPatientHome(userProfile.patient_id),
-      ]);
-
-      setPatientLocation({
-        latitude: location.latitude,
-        longitude: location.longitude,
-      });
-      setHomeLocation({
-        latitude: home.home_latitude,
-        longitude: home.home_longitude,
-        address: home.home_address,
-      });
-      setLastUpdated(new Date(location.timestamp));
+      // Home comes with bootstrap; it is only fetched here if bootstrap had none
+      showHome(bootstrap?.home || await getPatientHome(userProfile.patient_id));
+      showPatientLocation(await getPatientLocation(userProfile.patient_id));
 
       // Get family member's current location
       try {
@@ -74,7 +77,16 @@ export default function TrackPatientScreen({ navigation }) {
   }, []);
 
   useEffect(() => {
-    loadLocations();
+    // First paint from the bootstrap bundle, then poll
+    if (bootstrap?.home) {
+      showHome(bootstrap.home);
+    }
+    if (bootstrap?.location) {
+      showPatientLocation(bootstrap.location);
+      setLoading(false);
+    } else {
+      loadLocations();
+    }
     // Poll every 3 seconds for near-live tracking
     const interval = setInterval(loadLocations, 3000);
     return () => clearInterval(interval);
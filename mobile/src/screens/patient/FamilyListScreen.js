@@ -9,18 +9,35 @@ import {
   RefreshControl,
 } from 'react-native';
 import { useAuth } from '../../context/AuthContext';
-import { getFamilyMembersForPatient } from '../../services/api';
+import { getFamilyMembersPage } from '../../services/api';
 
 export default function FamilyListScreen({ navigation }) {
-  const { userProfile } = useAuth();
+  const { userProfile, bootstrap } = useAuth();
   const [familyMembers, setFamilyMembers] = useState([]);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
 
-  const loadFamilyMembers = async () => {
+  // Start from the page bootstrap already loaded (or fetch the first one) and follow the cursors
+  const loadFamilyMembers = async (useBootstrap) => {
     try {
-      const members = await getFamilyMembersForPatient(userProfile._id);
+      let members = [];
+      let cursor = null;
+      if (useBootstrap && bootstrap?.family_members) {
+        members = bootstrap.family_members;
+        cursor = bootstrap.next_cursors?.family_members;
+      } else {
+        const page = await getFamilyMembersPage(userProfile._id);
+        members = page.items;
+        cursor = page.nextCursor;
+      }
       setFamilyMembers(members);
+      setLoading(false);
+      while (cursor) {
+        const page = await getFamilyMembersPage(userProfile._id, cursor);
+        members = [...members, ...page.items];
+        cursor = page.nextCursor;
+        setFamilyMembers(members);
+      }
     } catch (error) {
       console.log('Error loading family members:', error);
     } finally {
@@ -30,12 +47,12 @@ export default function FamilyListScreen({ navigation }) {
   };
 
   useEffect(() => {
-    loadFamilyMembers();
+    loadFamilyMembers(true);
   }, []);
 
   const onRefresh = () => {
     setRefreshing(true);
-    loadFamilyMembers();
+    loadFamilyMembers(false);
   };
 
   const getRelationshipEmoji = (relationship) => {
@@ -31,6 +31,20 @@ export const backendLogin = async (email, password) => {
   return response.data;
 };
 
+// Everything the home screens need on launch, in one request: role, profile,
+// home, location and the first page of family members and conversations;
+// listings continue from next_cursors
+export const getBootstrap = async () => {
+  const response = await api.get('/bootstrap');
+  return response.data;
+};
+
+// One page of a listing; pass nextCursor back until it is null
+const getPage = async (path, cursor) => {
+  const response = await api.get(path, { params: cursor ? { cursor } : {} });
+  return { items: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+};
+
 // Patient APIs
 export const registerPatient = async (patientData) => {
   const response = await api.post('/patients/register', patientData);
@@ -55,6 +69,12 @@ export const getPatientLocation = async (patientId) => {
   return response.data;
 };
 
+// Latest locations of every patient the caller can see, e.g. { outside_home: true }
+export const getPatientLocations = async (filters = {}) => {
+  const response = await api.get('/patients/locations', { params: filters });
+  return response.data.locations;
+};
+
 export const getPatientHome = async (patientId) => {
   const response = await api.get(`/patients/${patientId}/home`);
   return response.data;
@@ -76,6 +96,9 @@ export const getFamilyMembersForPatient = async (patientId) => {
   return response.data;
 };
 
+export const getFamilyMembersPage = (patientId, cursor) =>
+  getPage(`/family-members/patient/${patientId}`, cursor);
+
 // Recognition APIs
 export const registerFace = async (imageUri, familyMemberId) => {
   const formData = new FormData();
@@ -191,6 +214,17 @@ export const createConversation = async (conversationData) => {
   return response.data;
 };
 
+// Summarized in the background; poll getJob(job_id) for the recorded conversation
+export const createConversationFromTranscript = async (conversationData) => {
+  const response = await api.post('/conversations/transcript', conversationData);
+  return response.data;
+};
+
+export const getJob = async (jobId) => {
+  const response = await api.get(`/jobs/${jobId}`);
+  return response.data;
+};
+
 export const getPatientConversations = async (patientId) => {
   const response = await api.get(`/conversations/patient/${patientId}`);
   return response.data;